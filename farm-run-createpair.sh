@@ -55,6 +55,11 @@ LOG_FILE=$OUT_FOLDER$NAME".log"
 echo $IN_FILE
 cp $IN_FILE $OUT_FOLDER
 cp $sup_file $OUT_FOLDER
+#modules NEBTools imports
+for m in LammpsIO StructCache Topology ReaxBonds NEBResults PBCGeometry SpatialIndex BondAngles RingStats LocalEnv PairEngine PairCost NEBLog Ledger Interstitial Pinhole
+do
+    cp $CWD"/py/"$m".py" $OUT_FOLDER
+done
 
 
 
@@ -65,5 +70,7 @@ export OMP_NUM_THREADS=1
 
 SF=/home/agoga/sandbox/topcon/slurm-output/j-$j.txt
 
-#                       Creates a variable in lammps ${output_folder}
-srun /home/agoga/anaconda3/envs/lmp/bin/python $OUT_FOLDER$FILENAME
+#batch mode: sbatch farm-run-createpair.sh <structure folder or manifest> [distDir] [set ...] [--split=N --history=<results glob> --output=<neb output folder>]
+#every task takes its share of the structures with its own serial LAMMPS for bond perception
+#no arguments runs the hard coded __main__ file loop as before
+srun /home/agoga/anaconda3/envs/lmp/bin/python $OUT_FOLDER$FILENAME "$@"
@@ -55,6 +55,13 @@ mkdir -v -p $nebfolder
 
 pairsfile=${data_file%.*}"-pairlist.txt"
 echo $pairsfile
+
+#completion ledger (py/Ledger.py) next to the data file: only pairs that are not done or
+#running elsewhere are run, every pair is marked running/done/failed as it goes
+python_bin=/home/agoga/anaconda3/envs/lmp/bin/python
+ledger_py=/home/agoga/sandbox/topcon/py/Ledger.py
+runpairs=$nebfolder"pairs-to-run.txt"
+$python_bin $ledger_py filter $data_file $pairsfile $runpairs
  
 
 #styles of NEB avail
@@ -63,6 +70,7 @@ multi_zap="multi_zap"
 multi_jump="multi_jump"
 single_jump="single_jump"
 boomerang="boomerang"
+interstitial="interstitial"
 
 
 ########################################################
@@ -73,7 +81,7 @@ style=$boomerang
 
 cyclelen=1
 
-mapfile -t pairs < $pairsfile
+mapfile -t pairs < $runpairs
 
 for pair in "${pairs[@]}" # #"5976 5979" #
 do
@@ -131,6 +139,20 @@ do
         echo_string="to jump "$run_id" to BC of "$atomF1"-"$atomF2
         create_gif=true 
 
+    #O placed on a precomputed interstitial site (CreatePairList.create_interstitial_pair_list)
+    elif [[ $style == $interstitial ]];then
+        atom_id=${pairarray[0]} 
+        fPosx=${pairarray[1]}
+        fPosy=${pairarray[2]}
+        fPosz=${pairarray[3]}
+        
+        atomF1=${pairarray[4]}
+        atomF2=${pairarray[5]}
+
+        run_id="site$atom_id"
+        echo_string="to place O on interstitial site "$atom_id" next to BC of "$atomF1"-"$atomF2
+        create_gif=false
+
     elif [[ $style == $boomerang ]];then
         cyclelen=2
         atom_id=${pairarray[0]} 
@@ -149,6 +171,8 @@ do
 
     fi
     
+    $python_bin $ledger_py mark $data_file running "$pair"
+    pairfail=""
 
     for etol in 7e-6 #7e-6  #3e-7 1e-7 # 1e-5 #3e-6 1e-6 7e-7 5e-7 3e-7 1e-7  #7e-5 5e-5 3e-5 1e-5 
     do 
@@ -174,6 +198,11 @@ do
             
             cp /home/agoga/sandbox/topcon/py/PrepNEB.py $out_folder
             cp /home/agoga/sandbox/topcon/py/Process-NEB.py $out_folder 
+            #helper modules PrepNEB/Process-NEB import, NEBTools (interstitial style) and its imports
+            for m in NEBTools LammpsIO StructCache Topology ReaxBonds NEBResults PBCGeometry SpatialIndex BondAngles RingStats LocalEnv PairEngine PairCost NEBLog Ledger Interstitial Pinhole
+            do
+                cp /home/agoga/sandbox/topcon/py/$m".py" $out_folder
+            done
             cp $neb_file $out_folder
 
             s=$out_folder$NAME"_SLURM.txt"
@@ -185,7 +214,8 @@ do
             echo "----------------Prepping NEB "$echo_string" ----------------"
             srun /home/agoga/anaconda3/envs/lmp/bin/python $out_folder"PrepNEB.py" \
             --out=$out_folder --etol=$etol --ts=$timestep --dfile=$data_file --plot=$plot --atomid=$atom_id --info=$neb_info_file \
-            --style=$style --fposx=$fPosx --fposy=$fPosy --fposz=$fPosz --bc1=$atomF1 --bc2=$atomF2 --bclist="$jumpPairs" --repeat=$num_repeat
+            --style=$style --fposx=$fPosx --fposy=$fPosy --fposz=$fPosz --bc1=$atomF1 --bc2=$atomF2 --bclist="$jumpPairs" --repeat=$num_repeat \
+            || pairfail="PrepNEB exited with "$?
             
             
             while read -u3 line
@@ -218,10 +248,17 @@ do
             srun /home/agoga/anaconda3/envs/lmp/bin/python $out_folder"Process-NEB.py" \
             --out=$out_folder --etol=$etol --ts=$timestep --nebfolder=$nebfolder --dfile=$data_file \
             --k=$springconst --plot=$plot --info=$neb_info_file --style=$style --gif=$create_gif --neblog=$log_file \
-            --atomid=$atom_id --cylen=$cyclelen 
+            --atomid=$atom_id --cylen=$cyclelen \
+            || pairfail="Process-NEB exited with "$?
         
         done
     done
+
+    if [[ -z $pairfail ]];then
+        $python_bin $ledger_py mark $data_file done "$pair"
+    else
+        $python_bin $ledger_py mark $data_file failed "$pair" --reason="$pairfail"
+    fi
 done
 
 end=`date +%s`
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+import numpy as np
+import json
+import os
+import shutil
+import sys
+import uuid
+
+import LammpsIO as lio
+
+#Compact columnar trajectory format. A trajectory is a folder <name>.traj/ holding
+#one .npy per column, all frames stacked along the first axis:
+#   frames.npy  timestep, start row, natoms and box of every frame
+#   id.npy (int32)  type.npy (int8)  pos.npy (n,3 float32)
+#   q.npy (float32) and image.npy (n,3 int16) when the dump had them
+#Columns are memory mapped on first use so a reader only touches what it asks for.
+
+framedtype=np.dtype([('timestep',np.int64),('start',np.int64),('natoms',np.int64),('box',np.float64,(3,2))])
+
+#dump column(s) -> (stored name, dtype, width)
+bincolumns={'id':(('id',),np.int32,1),
+            'type':(('type',),np.int8,1),
+            'pos':(('x','y','z'),np.float32,3),
+            'q':(('q',),np.float32,1),
+            'image':(('ix','iy','iz'),np.int16,3)}
+
+
+def traj_name(dumpfile):
+    return dumpfile.removesuffix('.dump')+'.traj'
+
+
+#atom count of every frame from the first bytes of each frame
+def frame_counts(reader):
+    counts=np.zeros(len(reader),dtype=np.int64)
+    with open(reader.file,'rb') as f:
+        for i, off in enumerate(reader.offsets):
+            f.seek(off)
+            head=f.read(256).split(b'\n')
+            counts[i]=int(head[3])
+    return counts
+
+
+#convert a text dump into the columnar format, returns the .traj folder
+def convert_dump(dumpfile,out=None,charges=True,images=True):
+    if out is None:
+        out=traj_name(dumpfile)
+    reader=lio.DumpReader(dumpfile)
+    counts=frame_counts(reader)
+    total=int(counts.sum())
+
+    first=reader.read_frame(0,columns=[])
+    if first['tilt'] is not None:
+        raise ValueError(f'{dumpfile} has a triclinic box, the binary trajectory only stores orthogonal boxes')
+    names=first['columns']
+    cmap=dict(bincolumns)
+    keep=['id','type','pos']
+    if charges and 'q' in names:
+        keep.append('q')
+    if images and 'ix' in names:
+        keep.append('image')
+    if 'x' not in names:
+        if 'xu' not in names:
+            print(f'{dumpfile} has no x y z columns')
+            return None
+        cmap['pos']=(('xu','yu','zu'),np.float32,3)
+
+    tmp=f'{out}.{uuid.uuid4().hex}.tmp'
+    os.makedirs(tmp)
+
+    frames=np.zeros(len(reader),dtype=framedtype)
+    frames['timestep']=reader.timesteps
+    frames['natoms']=counts
+    frames['start']=np.concatenate([[0],np.cumsum(counts)[:-1]])
+
+    cols={}
+    for c in keep:
+        (src,dt,width)=cmap[c]
+        shape=(total,) if width==1 else (total,width)
+        cols[c]=np.lib.format.open_memmap(os.path.join(tmp,c+'.npy'),mode='w+',dtype=dt,shape=shape)
+
+    readcols=[n for c in keep for n in cmap[c][0]]
+    if 'element' in names:
+        readcols.append('element')
+    typemap={}
+    for i, fr in enumerate(reader.frames(columns=readcols)):
+        s=frames['start'][i]
+        e=s+frames['natoms'][i]
+        frames['box'][i]=fr['box']
+        for c in keep:
+            src=cmap[c][0]
+            if len(src)==1:
+                cols[c][s:e]=fr[src[0]]
+            else:
+                cols[c][s:e]=np.stack([fr[n] for n in src],axis=1)
+        if 'element' in fr and len(typemap)==0:
+            t,first_i=np.unique(fr['type'],return_index=True)
+            typemap={str(int(a)):str(fr['element'][b]) for a, b in zip(t,first_i)}
+
+    for c in cols.values():
+        c.flush()
+    del cols
+    np.save(os.path.join(tmp,'frames.npy'),frames)
+    with open(os.path.join(tmp,'meta.json'),'w') as f:
+        json.dump({'source':os.path.abspath(dumpfile),'columns':keep,'typemap':typemap},f)
+
+    if os.path.exists(out):
+        shutil.rmtree(out)
+    os.rename(tmp,out)
+    return out
+
+
+class BinTrajectory:
+
+    def __init__(self,path):
+        self.path=path
+        with open(os.path.join(path,'meta.json'),'r') as f:
+            self.meta=json.load(f)
+        self.frames=np.load(os.path.join(path,'frames.npy'))
+        self.typemap={int(t):e for t, e in self.meta.get('typemap',{}).items()}
+        self._cols={}
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def timesteps(self):
+        return self.frames['timestep']
+
+    @property
+    def columns(self):
+        return self.meta['columns']
+
+    #memory mapped full column, opened the first time it is used
+    def column(self,name):
+        if name not in self._cols:
+            if name not in self.meta['columns']:
+                raise KeyError(f'{self.path} has no {name} column')
+            self._cols[name]=np.load(os.path.join(self.path,name+'.npy'),mmap_mode='r')
+        return self._cols[name]
+
+    def frame_index(self,timestep):
+        hits=np.nonzero(self.frames['timestep']==timestep)[0]
+        if len(hits)==0:
+            raise KeyError(f'Timestep {timestep} not in {self.path}')
+        return int(hits[0])
+
+    def box(self,i):
+        return self.frames['box'][i]
+
+    #rows of one column for frame i, a view into the memmap
+    def get(self,name,i):
+        s=self.frames['start'][i]
+        return self.column(name)[s:s+self.frames['natoms'][i]]
+
+    def positions(self,i):
+        return self.get('pos',i)
+
+    def types(self,i):
+        return self.get('type',i)
+
+    def ids(self,i):
+        return self.get('id',i)
+
+    def charges(self,i):
+        return self.get('q',i)
+
+    def elements(self,i):
+        t=self.types(i)
+        lookup=np.array([self.typemap.get(k,lio.typenames.get(k,str(k))) for k in range(int(t.max())+1)],dtype=object)
+        return lookup[t]
+
+    def frame(self,i,columns=('id','type','pos')):
+        fr={'timestep':int(self.frames['timestep'][i]),'natoms':int(self.frames['natoms'][i]),'box':self.box(i)}
+        for c in columns:
+            fr[c]=self.get(c,i)
+        return fr
+
+    def iter_frames(self,columns=('id','type','pos'),start=0,stop=None,step=1):
+        stop=len(self) if stop is None else min(stop,len(self))
+        for i in range(start,stop,step):
+            yield self.frame(i,columns)
+
+
+#use the converted trajectory when it is there and newer than the dump
+def open_trajectory(dumpfile,convert=True):
+    out=traj_name(dumpfile)
+    if os.path.exists(out) and os.path.getmtime(out)>=os.path.getmtime(dumpfile):
+        return BinTrajectory(out)
+    if not convert:
+        return None
+    conv=convert_dump(dumpfile,out)
+    if conv is None:
+        raise ValueError(f'{dumpfile} can not be converted to a binary trajectory (no x y z or xu yu zu columns)')
+    return BinTrajectory(conv)
+
+
+if __name__ == "__main__":
+    for f in sys.argv[1:]:
+        out=convert_dump(f)
+        if out is not None:
+            a=os.path.getsize(f)
+            b=sum(os.path.getsize(os.path.join(out,n)) for n in os.listdir(out))
+            print(f'{f} -> {out} ({a/1e6:.1f} MB -> {b/1e6:.1f} MB)')
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+import numpy as np
+
+import PBCGeometry as pg
+
+#Every type1-typeM-type2 bond angle of a structure in one pass over the CSR topology
+#(Topology.BondTopology). Triplets are generated per center atom from its bond slice,
+#angles use minimum image bond vectors so nothing has to be unwrapped by hand.
+
+angledtype=np.dtype([('center',np.int64),('end1',np.int64),('end2',np.int64),('angle',np.float64)])
+
+
+#(end1 rows, center rows, end2 rows) of every triplet, each unordered pair of ends once.
+#Only bonds with order >= bo_cut count, mask (bool over rows) limits which atoms may take part.
+def enumerate_triplets(topo,type1='O',typeM='Si',type2='O',bo_cut=None,mask=None):
+    (src,dst,bo)=topo.edges()
+    keep=topo.is_type(typeM)[src]&(topo.is_type(type1)[dst]|topo.is_type(type2)[dst])
+    if bo_cut is not None:
+        keep&=bo>=bo_cut
+    if mask is not None:
+        keep&=mask[src]&mask[dst]
+    src=src[keep]
+    dst=dst[keep]
+
+    #edges are grouped by center already (CSR order), pair every edge with every edge of its group
+    nedge=len(src)
+    if nedge==0:
+        z=np.zeros(0,dtype=np.int64)
+        return (z,z,z)
+    newgroup=np.ones(nedge,dtype=bool)
+    newgroup[1:]=src[1:]!=src[:-1]
+    gstart=np.nonzero(newgroup)[0]
+    gsize=np.diff(np.append(gstart,nedge))
+    gof=np.cumsum(newgroup)-1
+
+    cnt=gsize[gof]
+    first=np.repeat(np.arange(nedge),cnt)
+    within=np.arange(len(first))-np.repeat(np.cumsum(cnt)-cnt,cnt)
+    second=gstart[gof[first]]+within
+
+    a=dst[first]
+    b=dst[second]
+    ok=topo.is_type(type1)[a]&topo.is_type(type2)[b]&(a!=b)
+    if type1==type2:
+        ok&=a<b
+    return (a[ok],src[first[ok]],b[ok])
+
+
+#angle (degrees) at every center for rows (a,m,b) of pos
+def triplet_angles(pos,simbox,a,m,b):
+    v1=pg.pbc_vectors(simbox,pos[m],pos[a])
+    v2=pg.pbc_vectors(simbox,pos[m],pos[b])
+    c=np.einsum('ij,ij->i',v1,v2)/(np.linalg.norm(v1,axis=1)*np.linalg.norm(v2,axis=1))
+    return np.degrees(np.arccos(np.clip(c,-1,1)))
+
+
+#typed table (center id, end ids, angle) of every type1-typeM-type2 angle, pos in topology row order
+def bond_angles(topo,pos,simbox,type1='O',typeM='Si',type2='O',bo_cut=None,mask=None):
+    pos=np.asarray(pos,dtype=np.float64)
+    (a,m,b)=enumerate_triplets(topo,type1,typeM,type2,bo_cut,mask)
+    table=np.zeros(len(m),dtype=angledtype)
+    table['center']=topo.ids[m]
+    table['end1']=topo.ids[a]
+    table['end2']=topo.ids[b]
+    table['angle']=triplet_angles(pos,simbox,a,m,b)
+    return table
@@ -15,6 +15,8 @@ from ovito.modifiers import *
 from ovito.vis import Viewport
 import matplotlib.gridspec as gridspec
 import matplotlib as mpl
+
+import LammpsIO as lio
  
 
 comm = MPI.COMM_WORLD
@@ -41,7 +43,8 @@ def NEB_min(L=None):
         return lstr
     
 
-def create_lmp_file(file,out,dumpstep=0):
+#framefile is the single frame dump to read instead of file (see create_dat)
+def create_lmp_file(file,out,dumpstep=0,framefile=None):
     lammps_str=f'''
         clear
         units         real
@@ -65,6 +68,8 @@ def create_lmp_file(file,out,dumpstep=0):
         '''
     print(f"Loading file with path: {file}")
     if  file.endswith(".dump"):
+        if framefile is None:
+            framefile=file
         lammps_str+=f'''
         region sim block 0 1 0 1 0 1
         
@@ -73,7 +78,7 @@ def create_lmp_file(file,out,dumpstep=0):
 
         create_box 3 sim
 
-        read_dump {file} {dumpstep} x y z box yes add keep
+        read_dump {framefile} {dumpstep} x y z box yes add keep
         '''
     elif file.endswith(".data") or file.endswith(".dat"):
         lammps_str+=f'''
@@ -193,10 +198,21 @@ def recenter_sim(L,atom_id=2370):
 def create_dat(file,out,dumpstep=0):
     #Initialize and load the dump file
     
-    lstr=create_lmp_file(file,out,dumpstep)
+    #only hand LAMMPS the one frame we want instead of the whole trajectory
+    framefile=None
+    if file.endswith(".dump"):
+        if rank==0:
+            framefile=lio.dump_frame_file(file,dumpstep)
+        framefile=comm.bcast(framefile,root=0)
+
+    try:
+        lstr=create_lmp_file(file,out,dumpstep,framefile)
 
-    L = lammps('mpi',cmdargs=["-var","infile",file,'-var',"outfile",out])
-    L.commands_string(lstr)
+        L = lammps('mpi',cmdargs=["-var","infile",file,'-var',"outfile",out])
+        L.commands_string(lstr)
+    finally:
+        if rank==0 and framefile is not None and framefile!=file:
+            os.remove(framefile)
     
     # recenter_sim(L)
     
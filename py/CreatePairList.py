@@ -15,8 +15,21 @@ from pathlib import Path
 
 
 import string 
+import time
+import glob
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 import NEBTools as nt
+import PBCGeometry as pg
+import Topology as tp
+import PairEngine as pe
+import ReaxBonds as rb
+import StructCache as sc
+import PairCost as pcost
+import LocalEnv as le
+import Interstitial as ist
+import Pinhole as ph
 
 me = MPI.COMM_WORLD.Get_rank()
 numproc=MPI.COMM_WORLD.Get_size()
@@ -79,1058 +92,283 @@ def closer_pair(apos,bpos):
     
         
 
-def create_all_zap_pair_list(datapath, dfile, distDir,writefile=False,split=1):
-    
-    SiRad=10
-    
-    zlowrange=[18,20]
-    zhighrange=[28,30]
-    zlowrange=[18,20]
-    zhighrange=[28,30]
-    
-    SiOBondOrder=nt.SiOBondOrder
-    SiOBondOrder=nt.SiOBondOrder
 
-    zmin=19
-    zmin=19
-    zmax=28
-    filename=dfile.removesuffix('.dat').removesuffix('.data').removesuffix('.dump')
-
-    #create_bond_file(datapath,dfile,bondfile)
-    #atoms=read_bonds(datapath+'/scratchfolder/'+bondfile)
-    (atoms, simbox) = nt.read_file_data_bonds(datapath,dfile)
-    numAtoms=len(atoms.index)
-
-    #create_bond_file(datapath,dfile,bondfile)
-    #atoms=read_bonds(datapath+'/scratchfolder/'+bondfile)
-    (atoms, simbox) = nt.read_file_data_bonds(datapath,dfile)
-    numAtoms=len(atoms.index)
-
-
-    print(f'--------Running file: {dfile} with {numAtoms} atoms--------')
-
-    pairs=[]
-    counts=np.zeros(numAtoms+1)
-    counts=np.zeros(numAtoms+1)
-    hClose=[]
-    badO=[]
-
-    Oatoms=atoms[atoms['type']=='O']
-
-    numoh=0
-    #first run through and make a list of all O atoms that are bonded to a H or at too close to the interface
-    for i, row in Oatoms.iterrows():
-        curpos=row['pos']
-        nindices = row['bonds']#[0] take only the indexes of the bonds not bond order
-        hn=[]
-        on=[]
-        sin=[]
-        zpos=curpos[2]
-        
-        if len(nindices)==0:
-            print(f"O atom {i} has no neighbors!")
-        #find all the H neighbors
-        for ni in nindices:
-            n=ni[0]
-            bo=ni[1]
-            neitype=atoms.at[n,'type']
-            
-            
-            
-            if neitype =='H':
-                hn.append(n)
-            elif neitype =='O':
-                
-                on.append(n)
-            elif neitype =='Si':
-                sin.append(n)
-                
-                
-        if len(sin)==1 and len(hn)==1:
-            # print(f"O atom - {i} is bonded to a Si AND H.")  
-            numoh+=1
-            
-              
+#Per pair cost estimates for splitting pair lists into balanced farm jobs (PairCost).
+#history is (features, costs) of earlier NEB runs from load_cost_history, without it the
+#hop length is the cost.
 
-        # if len(sin)==0:
-        #     print(f"Oxygen atom {i} has no Si neighbors!")
-            
-        #if there are any H neighbors
-        if len(hn) > 0:
-            #print(f"atom {i+1} has H too close")
-            hClose.append(i)
-            badO.append(i)
+#costs of the pairs of the NEB results stores, the structures they came from are
+#datafolder/<structure>.dat
+def load_cost_history(stores,output_root,datafolder,columns=pcost.default_features):
+    hist=pcost.history_table(stores,output_root)
+    descs={}
+    for s in hist['structure'].unique():
+        dfile=s+'.dat'
+        if not os.path.exists(datafolder+dfile):
+            print(f'No data file for the NEB history of {s}, skipped')
             continue
-        
-        # if (zpos<zlowrange[0] or zpos>zhighrange[1]): #not ((zpos>zlowrange[0] and zpos<zlowrange[1]) or (zpos>zhighrange[0] and zpos<zhighrange[1]))
-        #     badO.append(i)
-        #     continue
-    print(numoh)
-        
-    #run through
-    for i, row in Oatoms.iterrows():
-        cpos=row['pos']
-        nbonds = row['bonds']
-        dprint(i,f'Debug - zpos:{cpos[2]}')
-        
-        #if this oxygen is a bad then skip
-        if i in badO:
-            continue
-
-        on=[]
-        sin=[]
-
-        
-        #create the list of Si neighbors to run through
-        for n in nbonds:
-            ni=n[0]
-            bo=n[1]
-            
-            if bo < SiOBondOrder:
-                continue
-            
-            neitype=atoms.at[ni,'type']
-            if neitype =='Si':
-                sin.append(ni)
-        
-        dprint(i,f"debug - {on}")
-        
-        #run through the silicon bonds and fill a list with any oxygen 
-        for si in sin:
-            neibonds = atoms.at[si,'bonds']
-            
-            for neib in neibonds:
-                nei=neib[0]
-                neibo=neib[1]
-                
-                if neibo < SiOBondOrder:
-                    continue
-            
-                #skip if the oxygen is bad or if this is the current oxygen already looking at
-                if nei in badO or nei == i:
-                    continue
-                
-                neitype = atoms.at[nei,'type']
-                if neitype != 'O':
-                    continue
-        
-        
-                dprint(i,f"debug testing {n}")
-                    
-                    
-                neipos= atoms.at[nei,'pos']
-                
-                
-                #check if the pair vector is along the current direction we're picking pairs along
-                # if not perp_interface(cpos,neipos):
-                # if not parallel_interface(cpos,neipos):
-                #     continue
-                
-                p1=(i,nei)
-                p2=(nei,i)
-                
-                #good pair if it got this far
-                #add this pair to the pair list              
-                if p1 not in pairs and p2 not in pairs:
-                    dprint(i,f"debug {nei} - success")
-                    counts[i]+=1
-                    counts[nei]+=1
-                    if closer_pair(cpos,neipos):
-                        pairs.append(p1)
-                    else:
-                        pairs.append(p2)
-                    #print(f"Thats a good one {str(p1)}")
-
-
-    # print(f"{len(hClose)} Oxygen have H that are too close")
-    # ids = [j+1 for j in range(numAtoms) if counts[j]>6]
-    # if len(ids)>0:
-    #     print(f"Ids with greater than 6 pairs: {str(ids)}")
-    # ids = [j+1 for j in range(numAtoms) if counts[j]==6]
-    # if len(ids)>0:
-    #     print(f"Ids with 6 pairs: {str(ids)}")
-    # ids = [j+1 for j in range(numAtoms) if counts[j]==5]
-    # if len(ids)>0:
-    #     print(f"Number of ids with 5 pairs: {str(len(ids))}")
-
-    npairs=np.array(pairs)
-
-
+        (atoms,simbox,topo)=nt.read_file_data_topology(datafolder,dfile)
+        descs[s]=le.get_descriptors(datafolder+dfile,topo,atoms[['x','y','z']].to_numpy(),simbox)
+    feat=pcost.history_features(hist,descs,columns)
+    print(f'NEB cost history: {len(hist)} pairs from {len(descs)} structures')
+    return (feat,hist['cost'].to_numpy())
+
+
+def pair_costs(ctx,file,pairs,history=None,split=1):
+    if split<=1 or len(pairs)==0:
+        return None
+    hop=pe.hop_lengths(ctx,pairs)
+    if history is None or history[0] is None:
+        return hop
+    desc=le.get_descriptors(file,ctx.topo,ctx.pos,ctx.simbox)
+    feat=pcost.pair_features(desc,pairs['mover'],pairs['zapped'])
+    return pcost.fill_costs(pcost.estimate_costs(feat,*history),hop)
+
+
+#read a structure once into a pair generation context (topology, positions, box)
+def pair_context(datapath,dfile):
+    (atoms, simbox, topo) = nt.read_file_data_topology(datapath,dfile)
+    ctx=pe.PairContext(topo,atoms[['x','y','z']].to_numpy(),simbox,nt.SiOBondOrder)
+    print(f'--------Running file: {dfile} with {topo.natoms} atoms--------')
+    return ctx
+
+
+#center of the largest pinhole through the oxide, found from the composition (Pinhole.py)
+def detect_pinhole_center(ctx):
+    (channels,atomlabel)=ph.find_pinholes(ctx.pos,ctx.topo.elements,ctx.simbox)
+    through=channels[channels['through']]
+    if len(through)==0:
+        raise ValueError('No pinhole through the oxide found, give the pinhole center')
+    c=through[0]
+    print(f"Pinhole at {c['center']} with radius {c['radius']:.3g}, {len(through)} through the oxide")
+    return c['center']
+
+
+#O atoms without neighbors and the number of O bonded to exactly one Si and one H
+def report_o_bonding(ctx):
+    topo=ctx.topo
+    orows=np.nonzero(topo.is_type('O'))[0]
+    for i in topo.ids[orows[topo.degree[orows]==0]]:
+        print(f"O atom {i} has no neighbors!")
+    cnt=ctx.counts[orows]
+    print(int(np.sum((cnt[:,0]==1)&(cnt[:,2]==1))))
+
+
+#several pair sets of one structure from a single read, each set written to distDir+name/
+def create_pair_sets(datapath, dfile, distDir, sets, writefile=False,split=1,history=None,ledger=None):
+    ctx=pair_context(datapath,dfile)
+    ret=pe.generate(ctx,sets)
     if writefile and me==0:
-        
-        if not os.path.exists(datapath+distDir):
-            os.mkdir(datapath+distDir)
-
+        for s in sets:
+            pe.write_pair_files(datapath,dfile,distDir+s.name+'/',ret[s.name],s.fields,split,
+                                 pair_costs(ctx,datapath+dfile,ret[s.name],history,split),ledger)
+    return ret
 
-        pairlists=np.array_split(npairs,split)
 
-        for i in range(split):
-            curlen=len(pairlists[i])
-            
-            
-            presplit=""
-            if split>1:
-                presplit=lowerletters[i]
-                
-            pairname=presplit+filename+"-pairlist.txt"
-            
-            pairfile=datapath+distDir+pairname
+#Batch mode. Structures come from a directory (glob) or a manifest file with one path per
+#line. Under srun with several ranks every rank takes its share of the files, otherwise a
+#pool of spawned worker processes does. Each rank/worker keeps one BondPerceiver (its own
+#serial LAMMPS) for all its structures. Pair lists go to <structure folder>/distDir/<set>/
+#and one summary row per structure is written to a csv.
 
-            shutil.copyfile(datapath+dfile, datapath+distDir+presplit+dfile)
-            
-            with open(pairfile,"w") as tf:
-                for p in pairlists[i]:
-                    tf.write(f"{p[0]} {p[1]}\n")
+def structure_files(src,pattern='*.dat'):
+    if os.path.isdir(src):
+        files=[str(f) for f in Path(src).glob(pattern)]
+    else:
+        base=os.path.dirname(os.path.abspath(src))
+        files=[]
+        with open(src) as f:
+            for line in f:
+                line=line.split('#')[0].strip()
+                if line:
+                    files.append(line if os.path.isabs(line) else os.path.join(base,line))
+    #largest first so the last structures handed out are the quick ones
+    return sorted(files,key=lambda f: -os.path.getsize(f))
+
+
+#own serial LAMMPS for this process, used by nt.read_file_data_topology
+def init_batch_worker():
+    rb.perceiver=rb.BondPerceiver(comm=MPI.COMM_SELF)
+
+
+#pair lists of one structure, all sets from one read. Returns the summary row.
+def structure_pair_lists(file,distDir,sets,split=1,history=None,ledger=None):
+    datapath=os.path.dirname(os.path.abspath(file))+'/'
+    dfile=os.path.basename(file)
+    row={'file':file,'hash':'','natoms':0,'status':'done','error':'','seconds':0.0}
+    t0=time.time()
+    try:
+        row['hash']=sc.file_key(file)
+        ctx=pair_context(datapath,dfile)
+        auto=any(isinstance(s,str) and s.endswith('@auto') for s in sets)
+        sets=pe.make_sets(sets,detect_pinhole_center(ctx) if auto else None)
+        row['natoms']=ctx.topo.natoms
+        ret=pe.generate(ctx,sets)
+        for s in sets:
+            pe.write_pair_files(datapath,dfile,distDir+s.name+'/',ret[s.name],s.fields,split,
+                                 pair_costs(ctx,datapath+dfile,ret[s.name],history,split),ledger)
+            row['n_'+s.name]=len(ret[s.name])
+    except Exception as e:
+        print(f'Pair generation failed for {file}: {e}')
+        row['status']='failed'
+        row['error']=str(e)
+    row['seconds']=time.time()-t0
+    return row
+
+
+def batch_pair_lists(src,distDir,sets=('all_zap',),split=1,nproc=None,pattern='*.dat',summary=None,history=None,ledger=None):
+    files=structure_files(src,pattern)
+    n=len(files)
+    if numproc>1:
+        init_batch_worker()
+        rows=[structure_pair_lists(f,distDir,sets,split,history,ledger) for f in files[me::numproc]]
+        rows=MPI.COMM_WORLD.gather(rows,root=0)
+        rows=[] if me!=0 else [r for part in rows for r in part]
+    else:
+        if nproc is None:
+            nproc=min(n,os.cpu_count() or 1)
+        if nproc<=1 or n<=1:
+            rows=[structure_pair_lists(f,distDir,sets,split,history,ledger) for f in files]
+        else:
+            with ProcessPoolExecutor(max_workers=nproc,mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=init_batch_worker) as ex:
+                rows=list(ex.map(structure_pair_lists,files,[distDir]*n,[list(sets)]*n,[split]*n,[history]*n,[ledger]*n))
+    if me!=0:
+        return None
+
+    df=pd.DataFrame(rows)
+    if summary is None:
+        summary=os.path.join(src if os.path.isdir(src) else os.path.dirname(os.path.abspath(src)),'pair-summary.csv')
+    df.to_csv(summary,index=False)
+    print(f"{int(np.sum(df['status']=='done'))}/{n} structures done, summary in {summary}")
+    return df
+
+
+def create_all_zap_pair_list(datapath, dfile, distDir,writefile=False,split=1,history=None,ledger=None):
+    ctx=pair_context(datapath,dfile)
+    report_o_bonding(ctx)
+    s=pe.all_zap_set()
+    pairs=pe.generate(ctx,[s])[s.name]
 
-            print(f"{curlen} total pairs added to the file {pairname}.")
-    
+    if writefile and me==0:
+        pe.write_pair_files(datapath,dfile,distDir,pairs,s.fields,split,pair_costs(ctx,datapath+dfile,pairs,history,split),ledger)
     return pairs
 
-def create_pinhole_zap_pair_list(datapath, dfile, distDir,pinholeCenter,writefile=False,split=1):
-    #pinatoms=[3032,3041,3053,3087,3091,3041,3091,3105,2985,2984,3087,3101,2985,3396,2985,2984,2984,3530,3521,1535,3530,3521,3434,3434,3323,3529,3482,3410,3434,3434,3478,3482,3573,3581,3493,3921,4021,3933,4024,4029,4025,4139,4141,4139,4106,6089,3445,3101,3445,3437,3439,3445,3434,3437,3434,3437,3491,3487,3491,3410,3411,3410,3491,3487,3493,3494,3409,3411,3497,3493,3534,3546,3109,3162,5102,3163,3124,3162,3162,3163,5050,3029,3469,3564,3564,3370,3370,3635,3564,3634,5533,3649,5578]
-        
-    SiRad=10
-    
-    zlowrange=[18,20]
-    zhighrange=[28,30]
-    zlowrange=[18,20]
-    zhighrange=[28,30]
-    
-    SiOBondOrder=nt.SiOBondOrder
-    SiOBondOrder=nt.SiOBondOrder
-
-    zmin=19
+def create_pinhole_zap_pair_list(datapath, dfile, distDir,pinholeCenter,writefile=False,split=1,history=None,ledger=None):
     zmin=19
     zmax=28
-    maxRad=12
-    filename=dfile.removesuffix('.dat').removesuffix('.data').removesuffix('.dump')
-
-    
-    (atoms, simbox) = nt.read_file_data_bonds(datapath,dfile)
-    numAtoms=len(atoms.index)
-
-    si_si_bond=0
-#temp
-    Siatoms=atoms[atoms['type']=='Si']
-    for i, row in Siatoms.iterrows():
-        curpos=row['pos']
-        nindices = row['bonds']#
-        
-        if curpos[2]<zmin or curpos[2]>zmax:
-            continue
-        
-        o_yes=False
-        si_yes=False
-        for ni in nindices:
-            n=ni[0]
-            bo=ni[1]
-            neitype=atoms.at[n,'type']
-            
-            
-            if neitype =='O':
-                o_yes=True
-            if neitype =='Si':
-                si_yes=True
-                
-        if o_yes and si_yes:
-            si_si_bond+=1
-        
-    print(f'Num Si_Si bonds {si_si_bond}')
-#temp testing
-
-    print(f'--------Running file: {dfile} with {numAtoms} atoms--------')
-
-    pairs=[]
-    counts=np.zeros(numAtoms+1)
-    counts=np.zeros(numAtoms+1)
-    hClose=[]
-    badO=[]
-
-    Oatoms=atoms[atoms['type']=='O']
-
-    numoh=0
-    #first run through and make a list of all O atoms that are bonded to a H or at too close to the interface
-    for i, row in Oatoms.iterrows():
-        curpos=row['pos']
-        nindices = row['bonds']#[0] take only the indexes of the bonds not bond order
-        hn=[]
-        on=[]
-        sin=[]
-        zpos=curpos[2]
-        
-
-        curpos=row['pos']
-        nindices = row['bonds']#[0] take only the indexes of the bonds not bond order
-        
-        sepVec=nt.pbc_vec_subtract(simbox,pinholeCenter,curpos)
-        
-        
-        #distance from pinhole center
-        dist=nt.pbc_dist(simbox,pinholeCenter,curpos)
-
-        
-        # sepVecN=sepVec/np.linalg.norm(sepVec)
-            
-        # if dist > maxRad or not (curpos[2]>17 and curpos[2]<30):
-        #     badO.append(i)
-        #     continue
-            
-        
-        #find all the H neighbors
-        for ni in nindices:
-            n=ni[0]
-            bo=ni[1]
-            neitype=atoms.at[n,'type']
-            
-            
-            
-            if neitype =='H':
-                hn.append(n)
-            elif neitype =='O':
-                
-                on.append(n)
-            elif neitype =='Si':
-                sin.append(n)
-                
-                
-        if len(sin)==1 and len(hn)==1:
-            # print(f"O atom - {i} is bonded to a Si AND H.")  
-            numoh+=1
-  
-        #if there are any H neighbors
-        if len(hn) > 0:
-            #print(f"atom {i+1} has H too close")
-            hClose.append(i)
-            badO.append(i)
-            continue
-
-    print(numoh)
-        
-    #run through
-    for i, row in Oatoms.iterrows():
-        cpos=row['pos']
-        nbonds = row['bonds']
-        dprint(i,f'Debug - zpos:{cpos[2]}')
-        
-        #if this oxygen is a bad then skip
-        if i in badO:
-            continue
-
-        on=[]
-        sin=[]
 
-        
-        #create the list of Si neighbors to run through
-        for n in nbonds:
-            ni=n[0]
-            bo=n[1]
-            
-            if bo < SiOBondOrder:
-                continue
-            
-            neitype=atoms.at[ni,'type']
-            if neitype =='Si':
-                sin.append(ni)
-        
-        dprint(i,f"debug - {on}")
-        
-        #run through the silicon bonds and fill a list with any oxygen 
-        for si in sin:
-            neibonds = atoms.at[si,'bonds']
-            
-            for neib in neibonds:
-                nei=neib[0]
-                neibo=neib[1]
-                
-                if neibo < SiOBondOrder:
-                    continue
-            
-                #skip if the oxygen is bad or if this is the current oxygen already looking at
-                if nei in badO or nei == i:
-                    continue
-                
-                neitype = atoms.at[nei,'type']
-                if neitype != 'O':
-                    continue
-        
-        
-                dprint(i,f"debug testing {n}")
-                    
-                    
-                neipos= atoms.at[nei,'pos']
-                
-                p1=(i,nei)
-                p2=(nei,i)
-                
-                # if i not in pinatoms and nei not in pinatoms:
-                #     continue
-                #good pair if it got this far
-                
-                #add this pair to the pair list       
-                   
-                if p1 not in pairs and p2 not in pairs:
-                    dprint(i,f"debug {nei} - success")
-                    counts[i]+=1
-                    counts[nei]+=1
-                    if closer_pair(cpos,neipos):
-                        pairs.append(p1)
-                    else:
-                        pairs.append(p2)
-                    #print(f"Thats a good one {str(p1)}")
+    ctx=pair_context(datapath,dfile)
+    topo=ctx.topo
 
-    npairs=np.array(pairs)
+    #Si atoms in the pinhole z range bonded to both O and Si
+    z=ctx.pos[:,2]
+    si=topo.is_type('Si')&(z>=zmin)&(z<=zmax)&(ctx.counts[:,0]>0)&(ctx.counts[:,1]>0)
+    print(f'Num Si_Si bonds {int(si.sum())}')
 
+    cnt=ctx.counts[topo.is_type('O')]
+    print(int(np.sum((cnt[:,0]==1)&(cnt[:,2]==1))))
+    s=pe.all_zap_set()
+    pairs=pe.generate(ctx,[s])[s.name]
 
     if writefile and me==0:
-        
-        if not os.path.exists(datapath+distDir):
-            os.mkdir(datapath+distDir)
-
-
-        pairlists=np.array_split(npairs,split)
-
-        for i in range(split):
-            curlen=len(pairlists[i])
-            
-            
-            presplit=""
-            if split>1:
-                presplit=lowerletters[i]
-                
-            pairname=presplit+filename+"-pairlist.txt"
-            
-            pairfile=datapath+distDir+pairname
-
-            shutil.copyfile(datapath+dfile, datapath+distDir+presplit+dfile)
-            
-            with open(pairfile,"w") as tf:
-                for p in pairlists[i]:
-                    tf.write(f"{p[0]} {p[1]}\n")
-
-            print(f"{curlen} total pairs added to the file {pairname}.")
-    
+        pe.write_pair_files(datapath,dfile,distDir,pairs,s.fields,split,pair_costs(ctx,datapath+dfile,pairs,history,split),ledger)
     return pairs
 
-def create_oh_pair_list(datapath, dfile, distDir,writefile=False,split=1):
-    
-    SiRad=10
-    
-    zlowrange=[18,20]
-    zhighrange=[28,30]
-    
-    SiOBondOrder=nt.SiOBondOrder
-
-    zmin=19
-    zmax=28
-    filename=dfile.removesuffix('.dat').removesuffix('.data').removesuffix('.dump')
-
-    
-    # with open(datapath+dfile) as lammps_dump_fl_obj:
-    #     apos = ase.io.read(lammps_dump_fl_obj,format="lammps-data",style='charge',units='real',sort_by_id=True)#, format="lammps-data", index=0)
-    
-    #create_bond_file(datapath,dfile,bondfile)
-    #atoms=read_bonds(datapath+'/scratchfolder/'+bondfile)
-    (atoms, simbox) = nt.read_file_data_bonds(datapath,dfile)
-    numAtoms=len(atoms.index)
-
-
-    print(f'--------Running file: {dfile} with {numAtoms} atoms--------')
-
-    pairs=[]
-    counts=np.zeros(numAtoms+1)
-    hClose=[]
-    badO=[]
-
-    Oatoms=atoms[atoms['type']=='O']
-
-    numoh=0
-    #first run through and make a list of all O atoms that are bonded to a H or at too close to the interface
-    for i, row in Oatoms.iterrows():
-        curpos=row['pos']
-        nindices = row['bonds']#[0] take only the indexes of the bonds not bond order
-        hn=[]
-        on=[]
-        sin=[]
-        zpos=curpos[2]
-        
-        if len(nindices)==0:
-            print(f"O atom {i} has no neighbors!")
-        #find all the H neighbors
-        for ni in nindices:
-            n=ni[0]
-            bo=ni[1]
-            neitype=atoms.at[n,'type']
-            
-            
-            
-            if neitype =='H':
-                hn.append(n)
-            elif neitype =='O':
-                
-                on.append(n)
-            elif neitype =='Si':
-                sin.append(n)
-                
-                
-        if len(sin)==1 and len(hn)==1:
-            print(f"O atom - {i} is bonded to a Si AND H.")  
-            numoh+=1
-        else:
-            badO.append(i)
-            
-    print(f"Number of viable OH: {numoh}")
-        
-    #run through
-    for i, row in Oatoms.iterrows():
-        cpos=row['pos']
-        nbonds = row['bonds']
-        dprint(i,f'Debug - zpos:{cpos[2]}')
-        
-        #if this oxygen is a bad then skip
-        if i in badO:
-            continue
-        
-
-        on=[]
-        sin=[]
-        hi=None
-
-        
-        #create the list of Si and H neighbors to run through
-        for n in nbonds:
-            ni=n[0]
-            bo=n[1]
-            
-    
-            neitype=atoms.at[ni,'type']
-            if neitype =='H':
-                if hi == None:
-                    hi=ni
-                else:
-                    print("WARNING FOUND TWO H WHEN THERE SHOULD ONLY BE ONE ")
-            if neitype =='Si':
-                if bo < SiOBondOrder:
-                    continue
-                sin.append(ni)
-        
-        dprint(i,f"debug - {on}")
-        
-        #run through the silicon bonds and fill a list with any oxygen 
-        for si in sin:
-            neibonds = atoms.at[si,'bonds']
-            
-            for neib in neibonds:
-                nei=neib[0]
-                neibo=neib[1]
-                
-                if neibo < SiOBondOrder:
-                    continue
-            for neib in neibonds:
-                nei=neib[0]
-                neibo=neib[1]
-                
-                if neibo < SiOBondOrder:
-                    continue
-            
-                #skip if the oxygen is bad or if this is the current oxygen already looking at
-                # if nei in badO or nei == i:
-                #     continue
-                
-                if nei ==i:
-                    continue
-                
-                neitype = atoms.at[nei,'type']
-                if neitype != 'O':
-                    continue
-        
-        
-                dprint(i,f"debug testing {n}")
-                    
-                    
-                neipos= atoms.at[nei,'pos']
-                    
-                neipos= atoms.at[nei,'pos']
-                
-  
-                p1=(i, nei, hi)
-
-                
-                #good pair if it got this far
-                #add this pair to the pair list              
-                if p1 not in pairs:
-                    dprint(i,f"debug {nei} - success")
-                    counts[i]+=1
-                    counts[nei]+=1
-                    
-                    pairs.append(p1)
-
-
-    npairs=np.array(pairs)
+def create_oh_pair_list(datapath, dfile, distDir,writefile=False,split=1,history=None,ledger=None):
+    ctx=pair_context(datapath,dfile)
+    topo=ctx.topo
+    orows=np.nonzero(topo.is_type('O'))[0]
+    for i in topo.ids[orows[topo.degree[orows]==0]]:
+        print(f"O atom {i} has no neighbors!")
+    cnt=ctx.counts[orows]
+    print(f"Number of viable OH: {int(np.sum((cnt[:,0]==1)&(cnt[:,2]==1)))}")
+    s=pe.oh_set()
+    pairs=pe.generate(ctx,[s])[s.name]
 
     if writefile and me==0:
-        
-        if not os.path.exists(datapath+distDir):
-            os.mkdir(datapath+distDir)
-
-        pairlists=np.array_split(npairs,split)
-
-        for i in range(split):
-            curlen=len(pairlists[i])
-            
-            
-            presplit=""
-            if split>1:
-                presplit=lowerletters[i]
-                
-            pairname=presplit+filename+"-pairlist.txt"
-            
-            pairfile=datapath+distDir+pairname
-
-            shutil.copyfile(datapath+dfile, datapath+distDir+presplit+dfile)
-            
-            with open(pairfile,"w") as tf:
-                for p in pairlists[i]:
-                    tf.write(f"{p[0]} {p[1]} {p[2]}\n")
-
-            print(f"{curlen} total pairs added to the file {pairname}.")
-    
+        pe.write_pair_files(datapath,dfile,distDir,pairs,s.fields,split,pair_costs(ctx,datapath+dfile,pairs,history,split),ledger)
     return pairs
 
-def place_random_O(L,zlims,seed):
-    L.commands_string(f''' 
-                    region r_randO block EDGE EDGE EDGE EDGE {zlims[0]} {zlims[1]}
-                    # #   create_atoms 2 random 1 12345 r_randO overlap 1.0 maxtry 1000
-                    # group new_atom empty
-                    fix fdep all deposit 1 2 1 {seed} region r_randO id max near 2
-                    run 1
-                      ''')
-
-# def create_interstitial_list(datapath, dfile, total_runs, distDir, pinholeCenter, writefile=False,split=1):
-
-#     z_max=29
-#     z_min=18
-
-#     general_outfolder="/home/adam/code/topcon-md/output/"
-    
-    
-#     for i in range(total_runs):
-#     filename=dfile.removesuffix('.dat').removesuffix('.data').removesuffix('.dump')
-
-
-#     (atoms, simbox) = nt.read_file_data_bonds(datapath,dfile)
-#     numAtoms=len(atoms.index)
-    
-    
-#     print(f'--------Running file: {datapath+dfile} with {numAtoms} atoms--------')
-#     atom_loc=[]
-    
-    
-#     L1 = nt.get_lammps(f'{outfolder}/logs/PrepNEB-I.log')
-    
-#     fileIdent=f'{seed}'
-
-#     reset1=outfolder+f'{fileIdent}-NEBI.dump'
-#     reset2=outfolder+f'{fileIdent}-NEBF.dump'
-#     nebI=outfolder+f'{fileIdent}-NEBI.data'
-#     nebF=outfolder+f'{fileIdent}-NEBF.data'
-#     full= outfolder+ f'{fileIdent}-Full.data'
-    
-#     PESimage=outfolder+f"PES({fileIdent}).png"
-#     ovitoFig=outfolder+f"{fileIdent}-Ovito.png"
-    
-#     # selection=[atomI,atomF]
-    
-    
-#     #initilize the data files 
-#     if file.endswith(".dump"):
-#         LT = get_lammps(f'{outfolder}/logs/PrepNEB-LT.log')
-#         #do this first initialize to get around reaxff issues(charge stuff I think)
-#         init_dump(LT,file,dumpstep)
-#         LT.commands_string(f'''
-#             write_data {full}
-#             ''')
-#         #
-#         init_dat(L1,full)
-#         # init_dat(L2,full)
-        
-#     elif file.endswith(".data") or file.endswith(".dat"):
-#         init_dat(L1,file)
-#         # init_dat(L2,file)
-#     else:
-#         print("File is not a .data or .dump")
-#         return
-    
-#     # place_random_O(L1,[bulk_low_z,bulk_high_z],seed)
-    
-#     atomI=L1.get_natoms()
-    
-    
-    
-
-
-def create_pinhole_pair_list_edge(datapath, dfile, distDir, pinholeCenter, writefile=False,split=1):
-    
-    #togeather with the pinhole center, these define a shell which we can pick Oxygen's from
-    minRad=7
-    maxRad=12
-    
-    #how far to move the O atoms
-    movedist=3
-    SiOBondOrder=nt.SiOBondOrder
-
-    ifacez=15
-    maxz=27
-    zmin=5
-
-    filename=dfile.removesuffix('.dat').removesuffix('.data').removesuffix('.dump')
-
-    (atoms, simbox) = nt.read_file_data_bonds(datapath,dfile)
-    numAtoms=len(atoms.index)
-    
-
-    print(f'--------Running file: {datapath+dfile} with {numAtoms} atoms--------')
-
-    pairs=[]
-
-
-
-    Oatoms=atoms[atoms['type']=='O']
-
-    numoh=0
-    #first run through and make a list of all O atoms that are bonded to a H or at too close to the interface
-    for i, row in Oatoms.iterrows():
-        curpos=row['pos']
-        nindices = row['bonds']#[0] take only the indexes of the bonds not bond order
-        
-        zp=curpos[2]
-    
-        if zp < ifacez+movedist or zp > maxz :
-            continue
-        
-        pinholeCenterCurZ=pinholeCenter
-        pinholeCenterCurZ[2]=zp
-        sepVec=nt.pbc_vec_subtract(simbox,pinholeCenterCurZ,curpos)
-        
-        
-    
-        dist=nt.pbc_dist(simbox,pinholeCenterCurZ,curpos)
-
-            
-        sepVecN=sepVec/np.linalg.norm(sepVec)
-
-        if dist > minRad and dist < maxRad:
-            
-        
-            hn=[]
-            on=[]
-            sin=[]
-            
-            #find all the H neighbors
-            for ni in nindices:
-                n=ni[0]
-                
-                neitype=atoms.at[n,'type']
-                
-                
-                if neitype =='H':
-                    hn.append(n)
-                elif neitype =='O':
-                    on.append(n)
-                elif neitype =='Si':
-                    sin.append(n)
-            
-            if len(hn) > 0:
-                continue
-            
-            fpos=curpos+ sepVecN*movedist
-            
-            neighvac=find_neighboring_sibc(atoms,i)
-            
-            
-            
-            if len(neighvac) ==0:
-                continue
-            
-            mindist=100
-            minpos=None
-            minvac=None
-            minsep=None
-            for vac in neighvac:
-                p1=atoms.at[vac[0],'pos']
-                p2=atoms.at[vac[1],'pos']
-
-                #get the midpoint of the neighboring vacancy
-                midpt=p1+np.array(nt.pbc_vec_subtract(simbox,p1,p2))/2
-            
-                #get the seperation vector between the vacancy and the attempted positon
-                sep=nt.pbc_vec_subtract(simbox,midpt,fpos)
-                
-                vacdist=np.linalg.norm(sep)
-                #print(f"       poslist for {vac}: {curpos} {p1} {p2}\n       mid:{midpt} dist from guess:{vacdist}")
-                if vacdist < mindist:
-                    minvac=vac
-                    minpos=midpt
-                    mindist=vacdist
-                    minsep=sep
-            
-            
-            
-            
-            
-            #now check if the vacancy is on the 'get out of pinhole' path
-            
-            
-            
-            ang=nt.angle_between_pts(simbox,fpos,minpos,curpos)[0][0]
-            if ang > 50:
-                #print(f"-----FAILED Atom {i} with ang={ang}, pos: {curpos}------\n------Best vacancy: {minvac} with dist={mindist}-----")
-                continue
-            
-            #pos=nt.find_bond_preference(datapath+dfile,i,minpos,minsep)
-            pl=[i,minpos]
-            print(f"-----Atom {i} with ang={ang}, pos: {curpos} dist to pinhole:{dist}------\n------Best vacancy: {minvac} with dist={mindist}, adding {pl}------")
-            pairs.append(pl)
-            
-
-    npairs=np.array(pairs,dtype=object)
+#Interstitial O sites of the whole structure from one free volume analysis (Interstitial.py),
+#ranked by empty sphere radius, each paired with its nearest unbridged Si-Si bond center.
+#Lines are "site x y z si1 si2", the single_jump layout PrepNEB's interstitial style reads.
+def create_interstitial_pair_list(datapath, dfile, distDir, zlims=(18,29), nsites=None, writefile=False,split=1,ledger=None):
+    ctx=pair_context(datapath,dfile)
+    (sites,bcs)=ist.interstitial_sites(ctx.topo,ctx.pos,ctx.simbox,zlims[0],zlims[1],nsites=nsites)
+    bc=ist.nearest_bond_centers(bcs)
+    print(f'{len(sites)} interstitial sites, {len(bc)} with a Si-Si bond center next to them')
+
+    pairs=np.zeros(len(bc),dtype=pe.pairdtype)
+    pairs['zapped']=-1
+    pairs['h']=-1
+    pairs['mover']=bc['site']
+    pairs['target']=sites['pos'][bc['site']]
+    pairs['si1']=bc['si1']
+    pairs['si2']=bc['si2']
 
     if writefile and me==0:
-        
-        if not os.path.exists(datapath+distDir):
-            os.mkdir(datapath+distDir)
-        
-        numpairs=len(pairs)
+        pe.write_pair_files(datapath,dfile,distDir,pairs,('mover','target','si1','si2'),split,None,ledger)
+    return (pairs,sites,bcs)
 
-        pairlists=np.array_split(npairs,split)
 
-        for i in range(split):
-            curlen=len(pairlists[i])
-            
-            
-            presplit=""
-            if split>1:
-                presplit=lowerletters[i]
-                
-            pairname=presplit+filename+"-pairlist.txt"
-            
-            pairfile=datapath+distDir+pairname
+def create_pinhole_pair_list_edge(datapath, dfile, distDir, pinholeCenter, writefile=False,split=1,history=None,ledger=None):
+    #O atoms in a shell around the pinhole axis moved to the Si-Si bond center nearest to the
+    #point movedist further out, if that bond center is within 50 degrees of the way out
+    ctx=pair_context(datapath,dfile)
+    if pinholeCenter is None:
+        pinholeCenter=detect_pinhole_center(ctx)
+    s=pe.pinhole_edge_set(pinholeCenter)
+    pairs=pe.generate(ctx,[s])[s.name]
+    for p in pairs:
+        print(f"-----Atom {p['mover']} adding bond center {p['target']} of Si {p['si1']}-{p['si2']}------")
 
-            shutil.copyfile(datapath+dfile, datapath+distDir+presplit+dfile)
-            
-            with open(pairfile,"w") as tf:
-                for p in pairlists[i]:
-                    #tf.write(f"{p[0]} {p[1]}\n")#[0]} {p[1][1]} {p[1][2]}\n")
-                    tf.write(f"{p[0]} {p[1][0]} {p[1][1]} {p[1][2]}\n")
-            print(f"{curlen} total pairs added to the file {pairname}.")
-    
+    if writefile and me==0:
+        pe.write_pair_files(datapath,dfile,distDir,pairs,s.fields,split,pair_costs(ctx,datapath+dfile,pairs,history,split),ledger)
     return pairs
 
-def create_pinhole_center_out_pair_list(datapath, dfile, distDir, pinholeCenter, writefile=False,split=1):
+def create_pinhole_center_out_pair_list(datapath, dfile, distDir, pinholeCenter, writefile=False,split=1,history=None,ledger=None):
     #create pairlist to move O atoms from the inner pinhole to the outer pinhole with multiple jumps
-    
-    #togeather with the pinhole center, these define a shell which we can pick Oxygen's from
-    minRad=7
-    maxRad=12
-    
-    #how far to move the O atoms
-    movedist=3
-    SiOBondOrder=nt.SiOBondOrder
-
-    ifacez=15
-    zmin=5
-
-    filename=dfile.removesuffix('.dat').removesuffix('.data').removesuffix('.dump')
-
-    (atoms, simbox) = nt.read_file_data_bonds(datapath,dfile)
-    numAtoms=len(atoms.index)
-    
-
-    print(f'--------Running file: {datapath+dfile} with {numAtoms} atoms--------')
-
-    pairs=[]
-
-
-
-    Oatoms=atoms[atoms['type']=='O']
-
-    numoh=0
-    #first run through and make a list of all O atoms that are bonded to a H or at too close to the interface
-    for i, row in Oatoms.iterrows():
-        curpos=row['pos']
-        nindices = row['bonds']#[0] take only the indexes of the bonds not bond order
-        
-        zp=curpos[2]
-    
-        if zp < ifacez+movedist:
-            continue
-        
-        sepVec=nt.pbc_vec_subtract(simbox,pinholeCenter,curpos)
-        
-        
-        #distance from pinhole center
-        dist=nt.pbc_dist(simbox,pinholeCenter,curpos)
-
-        
-        sepVecN=sepVec/np.linalg.norm(sepVec)
-            
-        if dist > minRad and dist < maxRad:
-            
-        
-            hn=[]
-            on=[]
-            sin=[]
-            
-            #find all the neighbors
-            for ni in nindices:
-                n=ni[0]
-                
-                neitype=atoms.at[n,'type']
-                
-                
-                if neitype =='H':
-                    hn.append(n)
-                elif neitype =='O':
-                    on.append(n)
-                elif neitype =='Si':
-                    sin.append(n)
-            
-            if len(hn) > 0:
-                continue
-            
-            
-            neisibc=find_neighboring_sibc(atoms,i)
-            print(neisibc)
-            fpos=curpos+ sepVecN*movedist
-            print(i)
-            #pos=nt.find_local_minima_position(datapath+dfile,i,fpos)
-            #pl=[i,pos]
-            
-            
-            # print(pl)
-            # pairs.append(pl)
-
-
-    npairs=np.array(pairs,dtype=object)
+    #only the candidate bond centers are listed so far, no pairs are added
+    ctx=pair_context(datapath,dfile)
+    if pinholeCenter is None:
+        pinholeCenter=detect_pinhole_center(ctx)
+    s=pe.pinhole_center_out_set(pinholeCenter)
+    cand=pe.generate(ctx,[s])[s.name]
+    for m in np.unique(cand['mover']):
+        c=cand[cand['mover']==m]
+        print([[int(a),int(b)] for a, b in zip(c['si1'],c['si2'])])
+        print(m)
+    pairs=cand[:0]
 
     if writefile and me==0:
-        
-        if not os.path.exists(datapath+distDir):
-            os.mkdir(datapath+distDir)
-        
-        numpairs=len(pairs)
-
-        pairlists=np.array_split(npairs,split)
-
-        for i in range(split):
-            curlen=len(pairlists[i])#double counts cause pairs
-            
-            
-            presplit=""
-            if split>1:
-                presplit=lowerletters[i]
-                
-            pairname=presplit+filename+"-pairlist.txt"
-            
-            pairfile=datapath+distDir+pairname
-
-            shutil.copyfile(datapath+dfile, datapath+distDir+presplit+dfile)
-            
-            with open(pairfile,"w") as tf:
-                for p in pairlists[i]:
-                    #tf.write(f"{p[0]} {p[1]}\n")#[0]} {p[1][1]} {p[1][2]}\n")
-                    tf.write(f"{p[0]} {p[1][0]} {p[1][1]} {p[1][2]}\n")
-            print(f"{curlen} total pairs added to the file {pairname}.")
-    
+        pe.write_pair_files(datapath,dfile,distDir,pairs,('mover','target'),split,pair_costs(ctx,datapath+dfile,pairs,history,split),ledger)
     return pairs
 
 
-def create_all_O_neighbors_pair_list(datapath, dfile, distDir, pinholeCenter, writefile=False,split=1):
-#create pairlist to move any O atoms within the pinhole to neighboring Si-Si BC
-    
-    maxRad=12#from center of pinhole
-    
-    #how far to move the O atoms
-    SiOBondOrder=nt.SiOBondOrder
-
-
-    filename=dfile.removesuffix('.dat').removesuffix('.data').removesuffix('.dump')
-
-    (atoms, simbox) = nt.read_file_data_bonds(datapath,dfile)
-    numAtoms=len(atoms.index)
-    
-
-    print(f'--------Running file: {datapath+dfile} with {numAtoms} atoms--------')
-
-    pairs=[]
+def create_all_O_neighbors_pair_list(datapath, dfile, distDir, pinholeCenter, writefile=False,split=1,history=None,ledger=None):
+    #create pairlist to move any O atoms within the pinhole to neighboring Si-Si BC
+    ctx=pair_context(datapath,dfile)
+    if pinholeCenter is None:
+        pinholeCenter=detect_pinhole_center(ctx)
+    s=pe.all_O_neighbors_set(pinholeCenter)
+    pairs=pe.generate(ctx,[s])[s.name]
 
-    Oatoms=atoms[atoms['type']=='O']
-    numadded=0
-    #first run through and make a list of all O atoms that are bonded to a H or at too close to the interface
-    for i, row in Oatoms.iterrows():
-        # if numadded > 10:
-        #     break
-        curpos=row['pos']
-        nindices = row['bonds']#[0] take only the indexes of the bonds not bond order
-        
-        sepVec=nt.pbc_vec_subtract(simbox,pinholeCenter,curpos)
-        
-        
-        #distance from pinhole center
-        dist=nt.pbc_dist(simbox,pinholeCenter,curpos)
-
-        
-        sepVecN=sepVec/np.linalg.norm(sepVec)
-            
-        if dist < maxRad and curpos[2]>17 and curpos[2]<30:
-            neisibc=find_neighboring_sibc(atoms,i) #get all neighboring Si BC vacancies
-            for sis in neisibc:
-                a1=sis[0]
-                a2=sis[1]
-                p1=atoms.at[a1,'pos']
-                p2=atoms.at[a2,'pos']
-                midpt=nt.pbc_midpoint(simbox,p1,p2)
-
-                sepv=nt.pbc_vec_subtract(simbox,p1,p2)
-                pos=nt.find_bond_preference(simbox,datapath+dfile,i,midpt,sepv)
-                pairs.append([i,pos,a1,a2])
-                numadded+=1
-
-
-
-    npairs=np.array(pairs,dtype=object)
+    #bond center refined to the bond's preferred O position
+    simbox=ctx.simbox
+    for k, p in enumerate(pairs):
+        p1=ctx.pos[ctx.topo.row(p['si1'])]
+        p2=ctx.pos[ctx.topo.row(p['si2'])]
+        midpt=pg.pbc_midpoints(simbox,p1,p2)
+        sepv=pg.pbc_vectors(simbox,p1,p2)
+        pairs['target'][k]=nt.find_bond_preference(simbox,datapath+dfile,p['mover'],midpt,sepv,orig=ctx.pos[ctx.topo.row(p['mover'])])
 
     if writefile and me==0:
-        
-        if not os.path.exists(datapath+distDir):
-            os.mkdir(datapath+distDir)
-        
-        numpairs=len(pairs)
-        pairlists=np.array_split(npairs,split)
-
-        for i in range(split):
-            curlen=len(pairlists[i])#double counts cause pairs
-            
-            
-            presplit=""
-            if split>1:
-                presplit=lowerletters[i]
-                
-            pairname=presplit+filename+"-pairlist.txt"
-            
-            pairfile=datapath+distDir+pairname
-
-            shutil.copyfile(datapath+dfile, datapath+distDir+presplit+dfile)
-            
-            with open(pairfile,"w") as tf:
-                for p in pairlists[i]:
-                    tf.write(f"{p[0]} {p[1][0]} {p[1][1]} {p[1][2]} {p[2]} {p[3]}\n")
-                    
-                    
-            print(f"{curlen} total pairs added to the file {pairname}.")
-    
+        pe.write_pair_files(datapath,dfile,distDir,pairs,s.fields,split,pair_costs(ctx,datapath+dfile,pairs,history,split),ledger)
     return pairs
 
 
+
 def find_nearby_O():
     distdf=nt.apply_dist_from_pos(atoms,simbox,fpos,"O")         
     # mdv2=movedist*.75
@@ -1186,66 +424,13 @@ def find_nearby_O():
     
 def find_neighboring_sibc(atoms,oi):
     #start with an Oxygen and find all neighboring Si with BC vacancies
-    nindices=atoms.at[oi,'bonds']
-    #look to see if this atom has any neighboring SI with vacancies
-
-    si_bc_vac=[]
-    badsi=[]
-    for n in nindices:
-        
-        ni=n[0]
-        neitype=atoms.at[ni,'type']
-        if neitype=='Si':
-
-            sibonds=atoms.at[ni,'bonds']
-                    
-            badsi=[]  
-            for b in sibonds:
-                bi=b[0]
-                btype=atoms.at[bi,'type']
-                if btype=='H' or btype=='O':
-                    bb=atoms.at[bi,'bonds']
-                    for bn in bb:
-                        bni=bn[0]
-                        bntype=atoms.at[bni,'type']
-                        if bntype=='Si' and bni !=ni:
-                            badsi.append(bni)
-        
-            
-            for nnn in sibonds:
-                nnni=nnn[0]
-                nnntype=atoms.at[nnni,'type']
-                if nnntype=='Si'and nnni not in badsi:
-                    si_bc_vac.append([ni,nnni])
-    
-    return si_bc_vac
+    return tp.find_neighboring_sibc(tp.topology_of(atoms),oi)
           
 def find_neighboring_sibc_recursion(atoms,si):          
-    #start with a silicon and find all bc vacancies chains it has recursively
-    si_bc_vac=[]
-    sibonds=atoms.at[si,'bonds']
-            
-    badsi=[]  
-    for b in sibonds:
-        bi=b[0]
-        btype=atoms.at[bi,'type']
-        if btype=='H' or btype=='O':
-            bb=atoms.at[bi,'bonds']
-            for bn in bb:
-                bni=bn[0]
-                bntype=atoms.at[bni,'type']
-                if bntype=='Si' and bni !=si:
-                    badsi.append(bni)
-                    
-                
-    
-    for nnn in sibonds:
-        nnni=nnn[0]
-        nnntype=atoms.at[nnni,'type']
-        if nnntype=='Si'and nnni not in badsi:
-            si_bc_vac.append([si,nnni])
-    
-    return si_bc_vac
+    #start with a silicon and find all bc vacancies chains it has
+    topo=tp.topology_of(atoms)
+    (owner,nsi)=tp.unbridged_si_neighbors(topo,[si])
+    return [[si,int(b)] for b in nsi]
 
 def find_neighboring_bc_chains(atoms,curatom):
     #start with an Oxygen and find all neighboring Si with BC vacancies
@@ -1281,6 +466,29 @@ def find_neighboring_bc_chains(atoms,curatom):
 
 if __name__=='__main__':
 
+    #batch mode: CreatePairList.py <structure folder or manifest> [distDir] [set ...]
+    #sets are all_zap, oh, pinhole_edge@x,y,z, pinhole_center_out@x,y,z, all_O_neighbors@x,y,z
+    #(@auto for the detected pinhole)
+    #--split=N balances N chunks per set on the estimated NEB cost, from the history of the
+    #--history=<results store glob> runs (logs under --output=<neb output folder>, data files
+    #in the structure folder) when given, otherwise from the hop lengths
+    args=[a for a in sys.argv[1:] if not a.startswith('--')]
+    opts=dict((a[2:].split('=',1)+[''])[:2] for a in sys.argv[1:] if a.startswith('--'))
+    if len(args)>0:
+        distDir=args[1] if len(args)>1 else 'pairs/'
+        sets=args[2:] if len(args)>2 else ['all_zap']
+        split=int(opts.get('split',1))
+        history=None
+        if 'history' in opts and split>1:
+            src=args[0] if os.path.isdir(args[0]) else os.path.dirname(os.path.abspath(args[0]))
+            history=load_cost_history(sorted(glob.glob(opts['history'])),opts.get('output','.'),src.rstrip('/')+'/')
+        #--ledger skips pairs that are done/running and records the rest as pending
+        ledger=opts.get('ledger')
+        if ledger=='':
+            ledger=True
+        batch_pair_lists(args[0],distDir,sets,split,history=history,ledger=ledger)
+        sys.exit(0)
+
     #current run defines
     debugatom=-1
     farmpath="/home/agoga/sandbox/topcon/data/neb/"
@@ -1,4 +1,4 @@
-import ReadLAMMPS_2 as rl
+import LammpsIO as lio
 import sys
 import os
 import re
@@ -63,28 +63,16 @@ def generate_pairs(OHdists,hindval,timesteps):
 
 dirname="/home/agoga/documents/code/topcon-md/data/SiOxNEB-NOH.dump"
 
-dir = os.fsencode(dirname)
-
-sim = rl.Read_Dump(dir)
-numsteps = 0
-flag = True
+#frame index is built (or reused) once, no need to read the whole dump to count the timesteps
+sim = lio.DumpReader(dirname)
 dt = 1.5 * 10**-6 #ns
 dumpdt = 10000 #num of timesteps between dump writes
 
-timesteplist=[]
-while flag==True:
-    
-	try:
-
-		sim.Update('next')
-		numsteps+=1
-		timesteplist.append(sim.timestep)
-	except:
-		flag=False
+timesteplist=list(sim.timesteps)
 
 print('here')
-f1=rl.Read_Dump(dir)
-dims=[f1.box[0][1]-f1.box[0][0], f1.box[1][1]-f1.box[1][0], f1.box[2][1]-f1.box[2][0]]
+first=sim.read_frame(0,columns=[])
+dims=first['box'][:,1]-first['box'][:,0]
 flag=0
 
 
@@ -99,24 +87,22 @@ targetTS=1
 
 
 numsteps=5
-for i in range(0,numsteps):
-	for at in f1.atoms:
-		if at.type == 2:
-			x1,y1,z1=at.coords
+for i, f1 in enumerate(sim.frames(stop=numsteps,columns=['id','type','x','y','z'])):
+	coords=np.stack([f1['x'],f1['y'],f1['z']],axis=1)
+	sel=np.nonzero(f1['type'] == 2)[0]
+	for a1 in sel:
+		x1,y1,z1=coords[a1]
 
-			for at2 in f1.atoms:
-				if at2.type == 2:
-					x2,y2,z2=at2.coords
-					tempdist=distform(at.coords,at2.coords,dims)
-					if tempdist<OHcutoff:
-						OHdists.append([at.id, at2.id, tempdist, x1, y1, z1, f1.timestep])
+		for a2 in sel:
+			tempdist=distform(coords[a1],coords[a2],dims)
+			if tempdist<OHcutoff:
+				OHdists.append([f1['id'][a1], f1['id'][a2], tempdist, x1, y1, z1, f1['timestep']])
 
 
 	print('{} out of {} timesteps'.format(str(i),len(timesteplist)))
-	print(f1.timestep)
-	if f1.timestep == targetTS:
+	print(f1['timestep'])
+	if f1['timestep'] == targetTS:
 		break
-	f1.Update('next')
  
 now = datetime.now()
 dt_string = now.strftime("%d-%m-%Y-%H-%M-%S")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+import numpy as np
+from scipy.ndimage import maximum_filter
+from scipy.spatial import cKDTree
+
+import PBCGeometry as pg
+import SpatialIndex as si
+import Topology as tp
+
+#Interstitial O sites of a whole structure in one pass, instead of one fix deposit / minimize
+#/ bond perception round per seed. The free volume is sampled on a periodic grid inside a z
+#window: every grid point gets the distance to its nearest atom, local maxima of that field
+#(wrapping in x,y) are the centers of the largest empty spheres. Sites closer than mindist to
+#a larger one are dropped and the rest ranked by empty sphere radius. Each site comes with
+#the unbridged Si-Si bond centers within bcradius, nearest first, the bonds an O placed
+#there would go into.
+
+sitedtype=np.dtype([('site',np.int64),('pos',np.float64,(3,)),('radius',np.float64),('nbc',np.int64)])
+bcdtype=np.dtype([('site',np.int64),('si1',np.int64),('si2',np.int64),('center',np.float64,(3,)),('dist',np.float64)])
+
+
+#grid axes of the box (x,y full, z only within [zlo,zhi]) with about spacing between points
+def grid_axes(simbox,spacing=0.5,zlo=None,zhi=None):
+    simbox=np.asarray(simbox,dtype=np.float64)
+    L=pg.box_lengths(simbox)
+    axes=[]
+    for d in range(3):
+        n=max(int(np.ceil(L[d]/spacing)),1)
+        axes.append(simbox[d,0]+np.arange(n)*L[d]/n)
+    full=zlo is None and zhi is None
+    z=axes[2]
+    if zlo is not None:
+        z=z[z>=zlo]
+    if zhi is not None:
+        z=z[z<=zhi]
+    axes[2]=z
+    return (axes,full)
+
+
+#distance from every grid point to the nearest atom, shape (nx,ny,nz)
+def free_volume_grid(pos,simbox,spacing=0.5,zlo=None,zhi=None):
+    (axes,full)=grid_axes(simbox,spacing,zlo,zhi)
+    g=np.stack(np.meshgrid(*axes,indexing='ij'),axis=-1).reshape(-1,3)
+    idx=si.PeriodicIndex(pos,simbox)
+    d=idx.query_knn(g,1)[0][:,0]
+    return (d.reshape(len(axes[0]),len(axes[1]),len(axes[2])),axes,full)
+
+
+#local maxima of the free volume field at least rmin from every atom, (points, radii)
+def empty_sphere_centers(dist,axes,full,rmin=1.0):
+    mode=['wrap','wrap','wrap' if full else 'nearest']
+    peak=(dist==maximum_filter(dist,size=3,mode=mode))&(dist>=rmin)
+    (i,j,k)=np.nonzero(peak)
+    pts=np.stack([axes[0][i],axes[1][j],axes[2][k]],axis=1)
+    return (pts,dist[i,j,k])
+
+
+#indexes of the points kept, largest radius first, dropping any within mindist of a kept one
+def suppress(points,radii,simbox,mindist):
+    if len(points)==0:
+        return np.zeros(0,dtype=np.int64)
+    simbox=np.asarray(simbox,dtype=np.float64)
+    L=pg.box_lengths(simbox)
+    p=np.mod(points-simbox[:,0],L)
+    p[p>=L]=0
+    t=cKDTree(p,boxsize=L)
+    order=np.argsort(-radii,kind='stable')
+    dropped=np.zeros(len(points),dtype=bool)
+    keep=[]
+    for i in order:
+        if dropped[i]:
+            continue
+        keep.append(i)
+        dropped[t.query_ball_point(p[i],mindist)]=True
+    return np.array(keep,dtype=np.int64)
+
+
+#unbridged Si-Si bonds as (si1 rows, si2 rows, bond centers)
+def si_bond_centers(topo,pos,simbox,bo_cut=None):
+    (src,dst,bo)=topo.edges()
+    issi=topo.is_type('Si')
+    k=(src<dst)&issi[src]&issi[dst]
+    if bo_cut is not None:
+        k&=bo>=bo_cut
+    (a,b)=(src[k],dst[k])
+    k=~tp.bridged(topo,a,b)
+    (a,b)=(a[k],b[k])
+    c=pos[a]+pg.pbc_vectors(simbox,pos[a],pos[b])/2
+    return (a,b,c)
+
+
+#ranked interstitial sites of a structure (pos in topology row order) in the z window and
+#their adjacent Si-Si bond centers. Returns (sites, bond centers) structured arrays, sites
+#numbered from 0 by rank.
+def interstitial_sites(topo,pos,simbox,zlo=None,zhi=None,spacing=0.5,rmin=1.0,mindist=1.5,
+                       bcradius=3.0,bo_cut=None,nsites=None):
+    pos=np.asarray(pos,dtype=np.float64)
+    simbox=np.asarray(simbox,dtype=np.float64)
+    (dist,axes,full)=free_volume_grid(pos,simbox,spacing,zlo,zhi)
+    (pts,rad)=empty_sphere_centers(dist,axes,full,rmin)
+    keep=suppress(pts,rad,simbox,mindist)
+    if nsites is not None:
+        keep=keep[:nsites]
+    pts=pts[keep]
+    rad=rad[keep]
+
+    (a,b,c)=si_bond_centers(topo,pos,simbox,bo_cut)
+    bcs=np.zeros(0,dtype=bcdtype)
+    if len(c)>0 and len(pts)>0:
+        hits=si.PeriodicIndex(c,simbox).query_radius(pts,bcradius)
+        owner=np.repeat(np.arange(len(pts)),[len(h) for h in hits])
+        bond=np.concatenate(hits).astype(np.int64)
+        d=pg.pbc_distances(simbox,pts[owner],c[bond])
+        order=np.lexsort((d,owner))
+        bcs=np.zeros(len(order),dtype=bcdtype)
+        bcs['site']=owner[order]
+        bcs['si1']=topo.ids[a[bond[order]]]
+        bcs['si2']=topo.ids[b[bond[order]]]
+        bcs['center']=c[bond[order]]
+        bcs['dist']=d[order]
+
+    sites=np.zeros(len(pts),dtype=sitedtype)
+    sites['site']=np.arange(len(pts))
+    sites['pos']=pts
+    sites['radius']=rad
+    sites['nbc']=np.bincount(bcs['site'],minlength=len(pts))
+    return (sites,bcs)
+
+
+#nearest bond center of every site that has one, one row per site
+def nearest_bond_centers(bcs):
+    if len(bcs)==0:
+        return bcs
+    first=np.ones(len(bcs),dtype=bool)
+    first[1:]=bcs['site'][1:]!=bcs['site'][:-1]
+    return bcs[first]
@@ -0,0 +1,464 @@
+#!/usr/bin/env python
+import numpy as np
+import os
+import tempfile
+
+#default lammps type -> element map used by all of our reaxff inputs (pair_coeff * * Si O H)
+typenames={1:'Si',2:'O',3:'H'}
+
+#masses used to identify the element of a type when a data file has a Masses block
+elementmasses={'Si':28.0855,'O':15.9994,'H':1.008}
+
+
+def element_from_mass(mass,tol=0.5):
+    for el, m in elementmasses.items():
+        if abs(m-mass)<tol:
+            return el
+    return None
+
+
+#header counts and box bounds of a data file, stops at the first section keyword
+def read_data_header(lines):
+    header={'natoms':0,'ntypes':0,'box':np.zeros((3,2)),'tilt':None}
+    #first line is always the title
+    i=1
+    for i in range(1,len(lines)):
+        line=lines[i]
+        l=line.split('#')[0].split()
+        if len(l)==0:
+            continue
+        if l[-1]=='atoms':
+            header['natoms']=int(l[0])
+        elif l[-1]=='types' and l[-2]=='atom':
+            header['ntypes']=int(l[0])
+        elif l[-1]=='xhi':
+            header['box'][0]=[float(l[0]),float(l[1])]
+        elif l[-1]=='yhi':
+            header['box'][1]=[float(l[0]),float(l[1])]
+        elif l[-1]=='zhi':
+            header['box'][2]=[float(l[0]),float(l[1])]
+        elif l[-1]=='yz':
+            header['tilt']=np.array(l[:3],dtype=float)
+        elif l[0][0].isalpha():
+            break
+    return header,i
+
+
+#index of every section keyword line ('Masses', 'Atoms # charge', 'Velocities', ...)
+def find_sections(lines,start=0):
+    sections={}
+    for i in range(start,len(lines)):
+        l=lines[i].split()
+        if len(l)>0 and l[0][0].isalpha():
+            sections[l[0]]=i
+    return sections
+
+
+#read the first n non-blank lines following a section keyword into a 2d float array
+def read_section(lines,start,n):
+    i=start+1
+    while i<len(lines) and lines[i].strip()=='':
+        i+=1
+    block=' '.join(l.split('#')[0] for l in lines[i:i+n])
+    vals=np.array(block.split(),dtype=np.float64)
+    if n==0 or vals.size%n!=0:
+        raise ValueError(f'Malformed section at line {start+1}, expected {n} rows')
+    return vals.reshape(n,-1)
+
+
+#Read a lammps atom_style charge data file of any header length.
+#returns (atoms,simbox) where atoms is a dict of typed arrays:
+#   id (int64), type (int32 lammps type), q (float64), pos (n,3 float64),
+#   image (n,3 int32) and element (str array), simbox is [[xlo,xhi],[ylo,yhi],[zlo,zhi]]
+def read_data_file(file,typemap=None):
+    with open(file,'r') as f:
+        lines=f.read().splitlines()
+
+    header,hend=read_data_header(lines)
+    sections=find_sections(lines,hend)
+    if 'Atoms' not in sections:
+        raise ValueError(f'No Atoms section found in {file}')
+
+    style=lines[sections['Atoms']].partition('#')[2].strip()
+    if style not in ('','charge'):
+        raise ValueError(f'Only atom_style charge is supported, {file} is "{style}"')
+
+    n=header['natoms']
+    data=read_section(lines,sections['Atoms'],n)
+
+    atoms={}
+    atoms['id']=data[:,0].astype(np.int64)
+    atoms['type']=data[:,1].astype(np.int32)
+    atoms['q']=data[:,2].copy()
+    atoms['pos']=np.ascontiguousarray(data[:,3:6])
+    if data.shape[1]>=9:
+        atoms['image']=data[:,6:9].astype(np.int32)
+    else:
+        atoms['image']=np.zeros((n,3),dtype=np.int32)
+
+    masses={}
+    if 'Masses' in sections:
+        mdata=read_section(lines,sections['Masses'],header['ntypes'])
+        masses={int(t):float(m) for t, m in mdata[:,:2]}
+
+    #use the masses to name the types if we can, otherwise fall back to the usual Si O H ordering
+    if typemap is None:
+        typemap=dict(typenames)
+        named={t:element_from_mass(m) for t, m in masses.items()}
+        if len(named)>0 and None not in named.values():
+            typemap=named
+
+    lookup=np.array([typemap.get(t,str(t)) for t in range(atoms['type'].max()+1)],dtype=object)
+    atoms['element']=lookup[atoms['type']]
+    atoms['masses']=masses
+
+    return (atoms,header['box'])
+
+
+#masses our lammps inputs set for Si O H (mass 1 $(v_massSi) ...), used when writing data files
+datamasses={'Si':28.0855,'O':15.9991,'H':1.00784}
+
+
+#Write an atom_style charge data file straight from the atoms dict, no lammps needed.
+#The layout follows lammps write_data so read_data, read_data_file and ovito all take it.
+#Missing q/image columns are written as zeros, masses default to datamasses by typemap.
+def write_data_file(file,atoms,simbox,masses=None,ntypes=None,typemap=None,title=None):
+    n=len(atoms['id'])
+    simbox=np.asarray(simbox,dtype=np.float64)
+    q=atoms['q'] if 'q' in atoms else np.zeros(n)
+    image=atoms['image'] if 'image' in atoms else np.zeros((n,3),dtype=np.int32)
+
+    if typemap is None:
+        typemap=typenames
+    if masses is None:
+        masses=atoms.get('masses') or {}
+    if ntypes is None:
+        ntypes=max(int(np.max(atoms['type'],initial=0)),max(masses,default=0),len(typenames))
+    masses={t:masses[t] if t in masses else datamasses.get(typemap.get(t),1.0) for t in range(1,ntypes+1)}
+    if title is None:
+        title=f'LAMMPS data file written by LammpsIO from {n} atoms, units = real'
+
+    head=f'''{title}
+
+{n} atoms
+{ntypes} atom types
+
+{simbox[0][0]:.16g} {simbox[0][1]:.16g} xlo xhi
+{simbox[1][0]:.16g} {simbox[1][1]:.16g} ylo yhi
+{simbox[2][0]:.16g} {simbox[2][1]:.16g} zlo zhi
+
+Masses
+
+'''+'\n'.join(f'{t} {m}' for t, m in masses.items())+'''
+
+Atoms # charge
+
+'''
+    order=np.argsort(atoms['id'],kind='stable')
+    table=np.empty((n,9),dtype=object)
+    table[:,0]=np.asarray(atoms['id'])[order]
+    table[:,1]=np.asarray(atoms['type'])[order]
+    table[:,2]=np.asarray(q)[order]
+    table[:,3:6]=np.asarray(atoms['pos'])[order]
+    table[:,6:9]=np.asarray(image)[order]
+
+    #write next to the target and rename so readers never see a partial file
+    tmp=f'{file}.{os.getpid()}.tmp'
+    with open(tmp,'w') as f:
+        f.write(head)
+        np.savetxt(f,table,fmt='%d %d %.16g %.16g %.16g %.16g %d %d %d')
+    os.replace(tmp,file)
+    return file
+
+
+#positions wrapped into the periodic box with the image flags carried along
+def wrap_atoms(atoms,simbox):
+    simbox=np.asarray(simbox,dtype=np.float64)
+    lo=simbox[:,0]
+    L=simbox[:,1]-simbox[:,0]
+    shift=np.floor((atoms['pos']-lo)/L).astype(np.int32)
+    out=dict(atoms)
+    out['pos']=atoms['pos']-shift*L
+    out['image']=(atoms['image'] if 'image' in atoms else 0)+shift
+    return out
+
+
+#copy of the atoms dict with only the rows in mask (bool mask or row indices)
+def select_atoms(atoms,mask):
+    out={}
+    for k, v in atoms.items():
+        out[k]=v[mask] if isinstance(v,np.ndarray) else v
+    return out
+
+
+#stack structures along z, each one shifted up by the height of the ones below plus its buffer,
+#ids are renumbered 1..n in order
+def merge_atoms(structs,buffers=None,axis=2):
+    if buffers is None:
+        buffers=[0.2]*len(structs)
+    parts=[]
+    simbox=np.array(structs[0][1],dtype=np.float64)
+    shift=0
+    for i, (atoms,box) in enumerate(structs):
+        box=np.asarray(box,dtype=np.float64)
+        a=dict(atoms)
+        a['pos']=atoms['pos'].copy()
+        a['pos'][:,axis]+=simbox[axis][0]+shift-box[axis][0]
+        parts.append(a)
+        shift+=box[axis][1]-box[axis][0]+buffers[i]
+    simbox[axis][1]=simbox[axis][0]+shift
+
+    merged={}
+    for k in ('type','q','pos','image'):
+        merged[k]=np.concatenate([np.asarray(p[k]) if k in p else np.zeros((len(p['id']),3) if k=='image' else len(p['id'])) for p in parts])
+    merged['id']=np.arange(1,len(merged['type'])+1,dtype=np.int64)
+    merged['element']=np.concatenate([p['element'] for p in parts])
+    merged['masses']=structs[0][0].get('masses',{})
+    return (merged,simbox)
+
+
+#one dump frame straight into a data file, the same file the read_dump + write_data
+#lammps pass produced: positions wrapped into the box and zero charges unless charges=True
+def dump_to_data(dumpfile,dumpstep,out,charges=False,typemap=None):
+    r=DumpReader(dumpfile)
+    frame=r.frame(dumpstep) if len(r)>1 else r.read_frame(0)
+    if frame['timestep']!=dumpstep:
+        raise ValueError(f'{dumpfile} has timestep {frame["timestep"]}, not the requested {dumpstep}')
+    (atoms,simbox)=frame_to_atoms(frame,typemap)
+    if not charges:
+        atoms['q']=np.zeros(len(atoms['id']))
+    atoms=wrap_atoms(atoms,simbox)
+    return write_data_file(out,atoms,simbox,typemap=typemap)
+
+
+#the coords file neb reads for the final replica: count then 'id x y z' lines
+def write_neb_coords(file,ids,pos):
+    pos=np.asarray(pos,dtype=np.float64).reshape(-1,3)
+    lines=[f'{int(i)} {p[0]} {p[1]} {p[2]}' for i, p in zip(np.atleast_1d(ids),pos)]
+    with open(file,'w+') as f:
+        f.write(f'{len(lines)}\n'+'\n'.join(lines))
+    return file
+
+
+#dump columns that hold integers, everything else except element is read as float
+intcolumns=('id','type','ix','iy','iz','mol','proc','procp1')
+
+#Streaming reader for (multi frame) lammps text dump files. On first open the byte
+#offset of every 'ITEM: TIMESTEP' is recorded and saved next to the dump as
+#<file>.index.npz, later opens reuse it (and only scan the new tail if the dump grew).
+class DumpReader:
+
+    def __init__(self,file,save_index=True):
+        self.file=file
+        self.indexfile=file+'.index.npz'
+        self.save_index=save_index
+        self.timesteps=np.zeros(0,dtype=np.int64)
+        self.offsets=np.zeros(0,dtype=np.int64)
+        self.load_index()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        return self.frames()
+
+    def load_index(self):
+        st=os.stat(self.file)
+        start=0
+        try:
+            idx=np.load(self.indexfile)
+            if int(idx['size'])==st.st_size and int(idx['mtime_ns'])==st.st_mtime_ns:
+                self.timesteps=idx['timesteps']
+                self.offsets=idx['offsets']
+                return
+            #dump was appended to, rescan from its last indexed frame
+            if int(idx['size'])<st.st_size and len(idx['offsets'])>0:
+                self.timesteps=idx['timesteps'][:-1]
+                self.offsets=idx['offsets'][:-1]
+                start=int(idx['offsets'][-1])
+        except (OSError,ValueError,KeyError):
+            pass
+
+        (ts,offs)=scan_dump(self.file,start)
+        self.timesteps=np.concatenate([self.timesteps,ts]).astype(np.int64)
+        self.offsets=np.concatenate([self.offsets,offs]).astype(np.int64)
+
+        #single frame dumps (write_dump output) are not worth an index file
+        if self.save_index and len(self.offsets)>1:
+            tmp=self.indexfile+f'.{os.getpid()}.tmp.npz'
+            try:
+                np.savez(tmp,timesteps=self.timesteps,offsets=self.offsets,
+                         size=st.st_size,mtime_ns=st.st_mtime_ns)
+                os.replace(tmp,self.indexfile)
+            except OSError as e:
+                print(f'Could not save dump index {self.indexfile}: {e}')
+
+    #(start,end) byte range of frame i
+    def frame_range(self,i):
+        end=self.offsets[i+1] if i+1<len(self.offsets) else os.path.getsize(self.file)
+        return (int(self.offsets[i]),int(end))
+
+    def frame_index(self,timestep):
+        i=np.searchsorted(self.timesteps,timestep)
+        if i>=len(self.timesteps) or self.timesteps[i]!=timestep:
+            #timesteps are not always sorted (restarted runs), fall back to a scan of the index
+            hits=np.nonzero(self.timesteps==timestep)[0]
+            if len(hits)==0:
+                raise KeyError(f'Timestep {timestep} not in {self.file}')
+            i=hits[0]
+        return int(i)
+
+    def raw_frame(self,i):
+        (s,e)=self.frame_range(i)
+        with open(self.file,'rb') as f:
+            f.seek(s)
+            return f.read(e-s)
+
+    def read_frame(self,i,columns=None,sort=True):
+        return parse_dump_frame(self.raw_frame(i).decode(),columns,sort)
+
+    def frame(self,timestep,columns=None,sort=True):
+        return self.read_frame(self.frame_index(timestep),columns,sort)
+
+    #generator of frames, only parses the frames asked for
+    def frames(self,start=0,stop=None,step=1,columns=None,sort=True):
+        stop=len(self) if stop is None else min(stop,len(self))
+        with open(self.file,'rb') as f:
+            for i in range(start,stop,step):
+                (s,e)=self.frame_range(i)
+                f.seek(s)
+                yield parse_dump_frame(f.read(e-s).decode(),columns,sort)
+
+    #copy one frame byte for byte into its own dump file (for LAMMPS read_dump)
+    def extract_frame(self,timestep,out):
+        with open(out,'wb') as f:
+            f.write(self.raw_frame(self.frame_index(timestep)))
+        return out
+
+
+#one frame of a trajectory as its own small dump file so LAMMPS read_dump does not
+#have to scan the whole trajectory, single frame dumps are returned as they are
+def dump_frame_file(file,dumpstep,folder=None):
+    r=DumpReader(file)
+    if len(r)<=1:
+        return file
+    if folder is None:
+        folder=tempfile.gettempdir()
+    name=os.path.basename(file).removesuffix('.dump')
+    return r.extract_frame(dumpstep,os.path.join(folder,f'{name}-{dumpstep}-{os.getpid()}.dump'))
+
+
+#byte offsets and timesteps of every frame, read in large blocks
+def scan_dump(file,start=0,blocksize=1<<24):
+    key=b'ITEM: TIMESTEP'
+    timesteps=[]
+    offsets=[]
+    with open(file,'rb') as f:
+        f.seek(start)
+        pos=start
+        carry=b''
+        while True:
+            block=f.read(blocksize)
+            if not block:
+                break
+            buf=carry+block
+            base=pos-len(carry)
+            j=buf.find(key)
+            last=0
+            while j>=0:
+                nl=buf.find(b'\n',j+len(key)+1)
+                if nl<0:
+                    #timestep number is cut off by the block end
+                    break
+                offsets.append(base+j)
+                timesteps.append(int(buf[j+len(key):nl].split()[0]))
+                last=nl
+                j=buf.find(key,nl)
+            if j>=0:
+                carry=buf[j:]
+            else:
+                carry=buf[max(last,len(buf)-len(key)):]
+            pos+=len(block)
+    return (np.array(timesteps,dtype=np.int64),np.array(offsets,dtype=np.int64))
+
+
+#one text frame into {'timestep','natoms','box','tilt','boundary','columns', <column>:array}.
+#Triclinic frames get the box itself (not the bounding box the dump lists) and tilt (xy,xz,yz),
+#tilt is None for orthogonal boxes.
+def parse_dump_frame(text,columns=None,sort=True):
+    #header items (UNITS, TIME, ...) until the ATOMS line, the atom rows follow it
+    a=text.find('ITEM: ATOMS')
+    nl=text.find('\n',a)
+    lines=text[:nl if nl>=0 else len(text)].split('\n')
+    body=text[nl+1:] if nl>=0 else ''
+    frame={'tilt':None}
+    bounds=np.zeros((3,3))
+    names=[]
+    for i, l in enumerate(lines):
+        if l.startswith('ITEM: TIMESTEP'):
+            frame['timestep']=int(lines[i+1])
+        elif l.startswith('ITEM: NUMBER OF ATOMS'):
+            frame['natoms']=int(lines[i+1])
+        elif l.startswith('ITEM: BOX BOUNDS'):
+            items=l.split()[3:]
+            tri=len(items)>=3 and items[:3]==['xy','xz','yz']
+            frame['boundary']=items[3:] if tri else items
+            for d in range(3):
+                b=lines[i+1+d].split()
+                bounds[d,:len(b[:3])]=[float(v) for v in b[:3]]
+            if tri:
+                frame['tilt']=bounds[:,2].copy()
+        elif l.startswith('ITEM: ATOMS'):
+            names=l.split()[2:]
+    box=bounds[:,:2].copy()
+    if frame['tilt'] is not None:
+        (xy,xz,yz)=frame['tilt']
+        box[0]-=[min(0,xy,xz,xy+xz),max(0,xy,xz,xy+xz)]
+        box[1]-=[min(0,yz),max(0,yz)]
+    frame['box']=box
+    n=frame['natoms']
+    frame['columns']=names
+
+    tok=np.array(body.split()[:n*len(names)]).reshape(n,len(names))
+    if columns is None:
+        columns=names
+    order=None
+    if sort and 'id' in names:
+        ids=tok[:,names.index('id')].astype(np.int64)
+        order=np.argsort(ids,kind='stable')
+    for c in columns:
+        if c not in names:
+            continue
+        col=tok[:,names.index(c)]
+        if c in intcolumns:
+            col=col.astype(np.int64)
+        elif c!='element':
+            col=col.astype(np.float64)
+        frame[c]=col[order] if order is not None else col
+    return frame
+
+
+#frame as the atoms dict used by read_data_file, orthogonal boxes only
+def frame_to_atoms(frame,typemap=None):
+    if frame.get('tilt') is not None:
+        raise ValueError(f'Timestep {frame["timestep"]} has a triclinic box, only orthogonal boxes are supported')
+    if typemap is None:
+        typemap=typenames
+    n=frame['natoms']
+    atoms={}
+    atoms['id']=frame['id'] if 'id' in frame else np.arange(1,n+1,dtype=np.int64)
+    atoms['type']=frame['type'].astype(np.int32)
+    atoms['q']=frame['q'] if 'q' in frame else np.zeros(n)
+    s='' if 'x' in frame else 'u'
+    atoms['pos']=np.stack([frame['x'+s],frame['y'+s],frame['z'+s]],axis=1)
+    if 'ix' in frame:
+        atoms['image']=np.stack([frame['ix'],frame['iy'],frame['iz']],axis=1).astype(np.int32)
+    else:
+        atoms['image']=np.zeros((n,3),dtype=np.int32)
+    if 'element' in frame:
+        atoms['element']=frame['element'].astype(object)
+    else:
+        lookup=np.array([typemap.get(t,str(t)) for t in range(atoms['type'].max()+1)],dtype=object)
+        atoms['element']=lookup[atoms['type']]
+    atoms['masses']={}
+    return (atoms,frame['box'])
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+import numpy as np
+import pandas as pd
+import glob
+import os
+import socket
+import sys
+import time
+import uuid
+
+import StructCache as sc
+
+#Completion ledger of NEB pairs. Every pair of a structure has a state
+#    pending - written to a pair list
+#    running - a farm job started it
+#    done    - Process-NEB finished it (converged or not, the result is in the csv/store)
+#    failed  - the job died on it, reason says why
+#keyed by the content hash of the data file (so the a-, b-, ... split copies share it) and
+#the pair key of its pair list line. The ledger is a folder of event files, each written
+#to a temp name and renamed into place, so any number of jobs can record at once without
+#locks. compact() folds the events into one snapshot. The latest event of a pair wins.
+
+states=('pending','running','done','failed')
+columns=['hash','pair','state','time','host','reason']
+
+#a running pair older than this (s) is taken as dead, the farm time limit is 4 days
+stale_running=4*24*3600
+
+
+def ledger_path(datafile):
+    return os.path.join(os.path.dirname(os.path.abspath(datafile)),'ledger')
+
+
+#pair key of a pair list line: its integer fields joined by '-', so 'mover zapped' is
+#'mover-zapped' like the csv pair column and 'mover x y z si1 si2' is 'mover-si1-si2'
+def pair_key(line):
+    if not isinstance(line,str):
+        line=' '.join(str(v) for v in line)
+    return '-'.join(t for t in line.split() if t.lstrip('-').isdigit())
+
+
+def write_events(path,rows,prefix='ev'):
+    os.makedirs(path,exist_ok=True)
+    name=f'{prefix}-{time.strftime("%Y%m%d%H%M%S")}-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    tmp=os.path.join(path,'.'+name+'.tmp')
+    with open(tmp,'w') as f:
+        for r in rows:
+            f.write('\t'.join(str(v) for v in r)+'\n')
+    final=os.path.join(path,name+'.tsv')
+    os.replace(tmp,final)
+    return final
+
+
+#record one state for pairs (keys or pair list lines) of the structure with hash key
+def record(path,key,pairs,state,reason=''):
+    if state not in states:
+        raise ValueError(f'Unknown ledger state {state}, expected one of {states}')
+    now=time.time()
+    host=socket.gethostname()
+    reason=' '.join(str(reason).split())
+    rows=[(key,pair_key(p),state,repr(now),host,reason) for p in pairs]
+    if len(rows)==0:
+        return None
+    return write_events(path,rows)
+
+
+def event_files(path):
+    return sorted(glob.glob(os.path.join(path,'snap-*.tsv')))+sorted(glob.glob(os.path.join(path,'ev-*.tsv')))
+
+
+def read_events(files):
+    parts=[]
+    for f in files:
+        try:
+            parts.append(pd.read_csv(f,sep='\t',names=columns,dtype={'hash':str,'pair':str,'state':str,'host':str,'reason':str},
+                                     keep_default_na=False))
+        except FileNotFoundError:
+            #compacted away by someone else after the glob, its events are in a snapshot now
+            continue
+    if len(parts)==0:
+        return pd.DataFrame({c:pd.Series(dtype=np.float64 if c=='time' else str) for c in columns})
+    return pd.concat(parts,ignore_index=True)
+
+
+#latest event of every (hash, pair), optionally of one structure only
+def load_status(path,key=None):
+    ev=read_events(event_files(path))
+    if key is not None:
+        ev=ev[ev['hash']==key]
+    ev=ev.sort_values('time',kind='stable')
+    return ev.drop_duplicates(['hash','pair'],keep='last').reset_index(drop=True)
+
+
+#fold every event into one snapshot, the folded files are removed only after the snapshot
+#is in place so a concurrent reader or compactor never loses an event
+def compact(path):
+    files=event_files(path)
+    if len(files)<=1:
+        return None
+    status=load_status(path)
+    snap=write_events(path,status[columns].itertuples(index=False,name=None),prefix='snap')
+    for f in files:
+        try:
+            os.remove(f)
+        except FileNotFoundError:
+            pass
+    return snap
+
+
+#True for the pairs that still have to run: never recorded, pending, failed (with
+#retry_failed) or running for longer than stale seconds
+def unfinished(path,key,pairs,retry_failed=True,stale=stale_running):
+    keys=np.array([pair_key(p) for p in pairs],dtype=object)
+    status=load_status(path,key)
+    if len(status)==0:
+        return np.ones(len(keys),dtype=bool)
+    now=time.time()
+    status=status.set_index('pair')
+    st=status['state'].reindex(keys).to_numpy()
+    age=now-status['time'].reindex(keys).to_numpy(dtype=np.float64)
+    finished=(st=='done')|((st=='running')&(age<stale))
+    if not retry_failed:
+        finished|=st=='failed'
+    return ~finished
+
+
+#rewrite a pair list with only its unfinished lines (to out, default in place)
+def filter_pairfile(path,datafile,pairfile,out=None,retry_failed=True):
+    with open(pairfile) as f:
+        lines=[l for l in f if l.strip()]
+    keep=unfinished(path,sc.file_key(datafile),lines,retry_failed)
+    if out is None:
+        out=pairfile
+    tmp=f'{out}.{uuid.uuid4().hex}.tmp'
+    with open(tmp,'w') as f:
+        f.writelines(l for l, k in zip(lines,keep) if k)
+    os.replace(tmp,out)
+    print(f'{len(lines)-int(keep.sum())} pairs already finished, {int(keep.sum())} left in {out}')
+    return int(keep.sum())
+
+
+#seed the ledger from a results store (NEBResults): every stored pair is done
+def import_results(path,datafile,store):
+    import NEBResults as nr
+    arr=nr.load_arrays(store)
+    pairs=np.unique(arr['pair'].astype(str))
+    record(path,sc.file_key(datafile),pairs,'done','imported from results')
+    return len(pairs)
+
+
+def state_counts(path,key=None):
+    status=load_status(path,key)
+    return {s:int(np.sum(status['state']==s)) for s in states}
+
+
+#python Ledger.py <command> <datafile> [args] [--ledger=<folder>] [--reason=<text>] [--keep-failed]
+#    status <datafile>
+#    mark <datafile> <state> <pair line or key> ...
+#    filter <datafile> <pairfile> [out]
+#    import <datafile> <results store>
+#    compact <datafile>
+if __name__ == "__main__":
+    args=[a for a in sys.argv[1:] if not a.startswith('--')]
+    opts=dict((a[2:].split('=',1)+[''])[:2] for a in sys.argv[1:] if a.startswith('--'))
+    (cmd,datafile)=args[:2]
+    path=opts.get('ledger') or ledger_path(datafile)
+
+    if cmd=='status':
+        print(state_counts(path,sc.file_key(datafile)))
+    elif cmd=='mark':
+        record(path,sc.file_key(datafile),args[3:],args[2],opts.get('reason',''))
+    elif cmd=='filter':
+        filter_pairfile(path,datafile,args[2],args[3] if len(args)>3 else None,'keep-failed' not in opts)
+    elif cmd=='import':
+        print(f'{import_results(path,datafile,args[2])} pairs marked done')
+    elif cmd=='compact':
+        compact(path)
+    else:
+        print(f'Unknown ledger command {cmd}')
+        sys.exit(1)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+from scipy.ndimage import uniform_filter1d
+
+import PBCGeometry as pg
+import SpatialIndex as si
+import BondAngles as ba
+import StructCache as sc
+
+#Per atom local environment descriptors of a whole structure in one vectorized pass:
+#bonded coordination by species, mean bonded Si-O length, mean O-Si-O angle (Si atoms),
+#atom counts within a few radii by species and the depth from the nearest SiOx/Si
+#interface. The table is indexed by atom id and cached next to the structure cache so
+#pair results pick their environments up with a join (join_pairs) instead of walking
+#bonds pair by pair.
+
+species=('Si','O','H')
+default_radii=(3,4,5)
+
+
+#z of the oxide/Si interfaces: where the smoothed O fraction of thin z slabs crosses
+#half way between its bulk Si and oxide values. Returns (interfaces, O fraction per slab,
+#threshold), no interfaces when the profile is flat.
+def find_interfaces(z,elements,simbox,binwidth=1.0,smooth=3,mincontrast=0.2):
+    simbox=np.asarray(simbox,dtype=np.float64)
+    zlo=simbox[2,0]
+    L=simbox[2,1]-simbox[2,0]
+    nbins=max(int(round(L/binwidth)),1)
+    bw=L/nbins
+    b=np.minimum((np.mod(np.asarray(z)-zlo,L)/bw).astype(np.int64),nbins-1)
+    tot=np.bincount(b,minlength=nbins)
+    nO=np.bincount(b[np.asarray(elements)=='O'],minlength=nbins)
+    frac=uniform_filter1d(nO/np.maximum(tot,1),smooth,mode='wrap')
+    thr=(frac.max()+frac.min())/2
+    if frac.max()-frac.min()<mincontrast:
+        return (np.zeros(0),frac,thr)
+
+    #crossings between slab centers i-1 and i, periodic in z
+    prev=np.roll(frac,1)
+    i=np.nonzero((frac>thr)!=(prev>thr))[0]
+    t=(thr-prev[i])/(frac[i]-prev[i])
+    zc=zlo+np.mod((i-0.5+t)*bw,L)
+    return (np.sort(zc),frac,thr)
+
+
+#distance along z to the nearest interface, positive on the oxide side, nan without interfaces
+def interface_depth(z,simbox,interfaces,frac,thr):
+    z=np.asarray(z,dtype=np.float64)
+    if len(interfaces)==0:
+        return np.full(len(z),np.nan)
+    simbox=np.asarray(simbox,dtype=np.float64)
+    zlo=simbox[2,0]
+    L=simbox[2,1]-simbox[2,0]
+    d=z[:,None]-np.asarray(interfaces)[None,:]
+    d=np.min(np.abs(d-L*np.round(d/L)),axis=1)
+    bw=L/len(frac)
+    b=np.minimum((np.mod(z-zlo,L)/bw).astype(np.int64),len(frac)-1)
+    return np.where(frac[b]>thr,d,-d)
+
+
+#mean over the bonds of each row (nan for rows without any), values per (src) edge
+def per_row_mean(src,vals,n):
+    num=np.bincount(src,minlength=n)
+    s=np.bincount(src,weights=vals,minlength=n)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        return np.where(num>0,s/num,np.nan)
+
+
+#descriptor table of every atom, pos in topology row order
+def descriptor_table(topo,pos,simbox,radii=default_radii,bo_cut=None,binwidth=1.0):
+    pos=np.asarray(pos,dtype=np.float64)
+    n=topo.natoms
+    cols={}
+    cols['z']=pos[:,2]
+
+    (src,dst,bo)=topo.edges()
+    keep=np.ones(len(src),dtype=bool) if bo_cut is None else bo>=bo_cut
+    for el in species:
+        e=keep&topo.is_type(el)[dst]
+        cols['n'+el]=np.bincount(src[e],minlength=n)
+
+    #Si-O bonds seen from both ends, so Si atoms get their mean to O and O atoms to Si
+    e=keep&((topo.is_type('Si')[src]&topo.is_type('O')[dst])|(topo.is_type('O')[src]&topo.is_type('Si')[dst]))
+    cols['SiO_len']=per_row_mean(src[e],pg.pbc_distances(simbox,pos[src[e]],pos[dst[e]]),n)
+
+    angles=ba.bond_angles(topo,pos,simbox,'O','Si','O',bo_cut)
+    cols['OSiO_ang']=per_row_mean(topo.rows(angles['center']),angles['angle'],n)
+
+    #neighbors in range by species, the atom itself not counted
+    idx=si.PeriodicIndex(pos,simbox,labels=topo.ids,types=topo.elements)
+    radii=np.atleast_1d(radii)
+    total=np.zeros((n,len(radii)),dtype=np.int64)
+    for el in species:
+        c=idx.count_within(pos,radii,el)-topo.is_type(el)[:,None]
+        total+=c
+        for j, r in enumerate(radii):
+            cols[f'{el}range{r}']=c[:,j]
+    for j, r in enumerate(radii):
+        cols[f'Atomsrange{r}']=total[:,j]
+
+    (interfaces,frac,thr)=find_interfaces(pos[:,2],topo.elements,simbox,binwidth)
+    cols['depth']=interface_depth(pos[:,2],simbox,interfaces,frac,thr)
+
+    df=pd.DataFrame(cols,index=pd.Index(topo.ids,name='id'))
+    df.insert(0,'type',topo.elements)
+    df.attrs['interfaces']=interfaces
+    return df
+
+
+def cache_kind(radii,bo_cut,binwidth):
+    p=json.dumps([[float(r) for r in np.atleast_1d(radii)],bo_cut,binwidth])
+    return 'localenv-'+hashlib.sha1(p.encode()).hexdigest()[:12]
+
+
+#descriptor table of a data file, computed once per file/parameter set and cached
+def get_descriptors(file,topo,pos,simbox,radii=default_radii,bo_cut=None,binwidth=1.0,use_cache=True):
+    kind=cache_kind(radii,bo_cut,binwidth)
+    if use_cache:
+        ret=sc.load_entry(file,kind=kind)
+        if ret is not None:
+            (arrays,meta)=ret
+            df=pd.DataFrame({c:np.array(arrays[c]) for c in meta['columns']},index=pd.Index(np.array(arrays['id']),name='id'))
+            df.insert(0,'type',topo.elements[topo.rows(df.index.to_numpy())])
+            df.attrs['interfaces']=np.array(arrays['interfaces'])
+            return df
+
+    df=descriptor_table(topo,pos,simbox,radii,bo_cut,binwidth)
+    if use_cache:
+        columns=[c for c in df.columns if c!='type']
+        arrays={c:df[c].to_numpy() for c in columns}
+        arrays['id']=df.index.to_numpy()
+        arrays['interfaces']=df.attrs['interfaces']
+        sc.store_entry(file,arrays,{'columns':columns},kind=kind)
+    return df
+
+
+#pairs frame ('mover-zapped' ids in idcol) with the descriptors of both atoms joined on,
+#columns prefixed per atom
+def join_pairs(pairs,desc,idcol='id',prefixes=('m_','z_'),columns=None):
+    ids=pairs[idcol].str.split('-',expand=True).astype(np.int64)
+    if columns is None:
+        columns=list(desc.columns)
+    out=pairs.copy()
+    for k, p in enumerate(prefixes):
+        d=desc[columns].reindex(ids[k].to_numpy())
+        d.columns=[p+c for c in columns]
+        d.index=out.index
+        out=pd.concat([out,d],axis=1)
+    return out
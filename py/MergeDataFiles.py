@@ -8,6 +8,8 @@ import numpy as np
 from mpi4py import MPI
 from matplotlib import pyplot as plt
 
+import LammpsIO as lio
+
 def findZDim(file):
     with open(file,'r') as f:
             lines = [line.rstrip() for line in f]
@@ -92,30 +94,25 @@ def lmpReduceSystemSize(file,a):
         ''')
 
 
-def mergeDataFiles(dfiles,buffers=[]):
-    zdims = []
-    zextent=0
+#merged is the stacked (not yet minimized) structure, written next to the minimized output
+def mergeDataFiles(dfiles,buffers=[],merged='topcon/py/SiOGrad-merged.data'):
     default_buffer = .2
-    fileOG = dfiles[0]
     
     if len(buffers) == 0:
         for i in range(len(dfiles)):
             buffers.append(default_buffer)
     
-    for f in dfiles:
-        zdims.append(findZDim(f))
-        
-    #print(zdims)          
-    for i in range(len(zdims)):
-        z=zdims[i]
-        zextent = zextent + (z[1]-z[0]) + buffers[i]
-    
-
-    #print(zextent)
-
-    #finial z dimensions
-    zf_lo = zdims[0][0]
-    zf_hi = zf_lo + zextent
+    #stack the slices in numpy and hand lammps one file, only the overlap removal and
+    #minimization below need a lammps instance
+    me = MPI.COMM_WORLD.Get_rank()
+    #absolute, the lammps script below changes directory before reading it
+    merged=os.path.abspath(merged)
+    if me == 0:
+        os.makedirs(os.path.dirname(merged),exist_ok=True)
+        structs=[lio.read_data_file(f,typemap={1:'H',2:'O',3:'Si'}) for f in dfiles]
+        (atoms,simbox)=lio.merge_atoms(structs,buffers)
+        lio.write_data_file(merged,atoms,simbox,typemap={1:'H',2:'O',3:'Si'})
+    MPI.COMM_WORLD.Barrier()
 
     
     
@@ -151,25 +148,7 @@ def mergeDataFiles(dfiles,buffers=[]):
         
         ''')
     
-    L.commands_string(f'''
-        read_data {fileOG}
-        
-        change_box all z final {zf_lo} {zf_hi}
-                    ''')
-    
-    shift=-zf_lo
-    for i in range(len(dfiles)):#skip 1st
-
-        cz=zdims[i]
-        zsize=cz[1]-cz[0]
-        if i == 0:
-            shift = shift + zsize + buffers[i]
-            continue
-        
-        f= dfiles[i]
-        L.command(f'read_data {f} add append shift 0 0 {shift}')
-
-        shift = shift + zsize + buffers[i]
+    L.command(f'read_data {merged}')
         
     L.commands_string(f'''
                       
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+import numpy as np
+import os
+
+#conversion from kcal/mol to eV
+conv=0.043361254529175
+
+#Parser for the master log of a LAMMPS NEB run. The log holds a regular NEB table,
+#a 'Climbing replica = N' line and then the climbing image table, e.g.
+#    Step MaxReplicaForce MaxAtomForce GradV0 GradV1 GradVc EBF EBR RDT RD1 PE1 ... RDN PEN
+#    3000    57.299944    1038.8458.......
+#    Climbing replica = 6
+#    Step MaxReplicaForce MaxAtomForce.....
+#    3000    57.295123........
+class NEBLog:
+
+    def __init__(self,file):
+        self.file=file
+        self.columns=[]
+        #per iteration table (rows of the regular stage then the climbing stage)
+        self.table=np.zeros((0,0))
+        self.climbing_stage=np.zeros(0,dtype=bool)
+        self.climbing=None
+        #last regular NEB step, the climbing stage starts from it
+        self.nebiter=None
+        #True when only the tail of the file was read (regular stage cut short)
+        self.partial=False
+
+    @property
+    def steps(self):
+        return self.table[:,0].astype(np.int64)
+
+    @property
+    def final(self):
+        return self.table[-1] if len(self.table)>0 else None
+
+    @property
+    def final_step(self):
+        return int(self.table[-1,0]) if len(self.table)>0 else None
+
+    @property
+    def climbing_start(self):
+        return self.nebiter
+
+    @property
+    def nreplica(self):
+        return (len(self.columns)-9)//2
+
+    #column of the table by name ('EBF', 'RD3', 'PE13', ...)
+    def col(self,name):
+        return self.table[:,self.columns.index(name)]
+
+    #reaction coordinates of every replica at the end of the run
+    @property
+    def R(self):
+        return self.final[9::2]
+
+    #replica energies (eV) at the end of the run
+    @property
+    def PE(self):
+        return self.final[10::2]*conv
+
+    @property
+    def EBF(self):
+        return self.final[6]*conv
+
+    @property
+    def EBR(self):
+        return self.final[7]*conv
+
+    @property
+    def RD(self):
+        return self.final[8]
+
+    #same return as the old Process-NEB MEP(file): R, normalized MEP, forward/reverse barrier, RD
+    def mep(self):
+        pe=self.PE
+        return (self.R,pe-np.min(pe),self.EBF,self.EBR,self.RD)
+
+    def converged(self,maxneb,maxclimbing,numpart=None,verbose=True):
+        if numpart is None:
+            numpart=self.nreplica
+        msg=None
+        ok=False
+        if self.climbing is None or self.nebiter is None or len(self.table)==0:
+            msg=f'Could not find the climbing stage in {self.file}'
+        elif self.climbing==numpart or self.climbing==0:
+            msg='NEB did not converge because the climbing replica was the first or last replica.'
+        elif self.nebiter == maxneb:
+            msg='NEB did not converge because the maximum NEB iterations were reached.'
+        elif (self.final_step-self.nebiter) == maxclimbing:
+            msg='NEB did not converge because the maximum climbing image iterations were reached.'
+        else:
+            ok=True
+        if msg is not None and verbose:
+            print(msg)
+        return ok
+
+
+def parse_lines(log,lines):
+    rows=[]
+    stage=[]
+    climbing=False
+    #both tables share one header, take it up front so rows above a header still parse
+    if len(log.columns)==0:
+        for line in lines:
+            if line.startswith('Step'):
+                log.columns=line.split()
+                break
+    ncol=len(log.columns)
+    for line in lines:
+        if line.startswith('Step'):
+            log.columns=line.split()
+            ncol=len(log.columns)
+            continue
+        if line.startswith('Climbing'):
+            if len(rows)>0:
+                log.nebiter=int(rows[-1].split()[0])
+            log.climbing=int(line.split()[3])
+            climbing=True
+            continue
+        l=line.split()
+        if ncol>0 and len(l)==ncol and l[0].isdigit():
+            rows.append(line)
+            stage.append(climbing)
+
+    if len(rows)>0:
+        log.table=np.array(' '.join(rows).split(),dtype=np.float64).reshape(len(rows),ncol)
+    log.climbing_stage=np.array(stage,dtype=bool)
+    return log
+
+
+#Read a NEB log once. With full=False only the tail of the file is read: blocks are
+#read backwards from the end until the 'Climbing replica' line (and the last regular
+#iteration just before it) is found, which is all the final MEP and convergence need.
+def read_neb_log(file,full=True,blocksize=1<<18):
+    log=NEBLog(file)
+    if full:
+        with open(file,'r') as f:
+            return parse_lines(log,f.read().splitlines())
+
+    size=os.path.getsize(file)
+    with open(file,'rb') as f:
+        start=size
+        text=b''
+        while True:
+            start=max(0,start-blocksize)
+            f.seek(start)
+            text=f.read(size-start)
+            c=text.rfind(b'\nClimbing')
+            #need one whole regular row in front of the climbing line
+            if start==0 or (c>0 and text.count(b'\n',0,c)>=2):
+                break
+            blocksize*=2
+
+    lines=text.decode().splitlines()
+    if start>0:
+        #the first line is probably cut in half
+        lines=lines[1:]
+        #only the tail of the regular stage is in the table
+        log.partial=True
+    parse_lines(log,lines)
+
+    return log
+
+
+#everything Process-NEB takes from a nebinfo file in one pass
+class NEBInfo:
+
+    def __init__(self,file):
+        self.file=file
+        #'neb' lines: neb {i} {atomI} {identifier} {nebI} {nebF} {log} {h_id}
+        self.runs=[]
+        #pcsv_{identifier}_{name} {value} lines as [name,value,identifier]
+        self.fields=[]
+        self.images=[]
+
+    def fields_for(self,identifier):
+        return {f[0]:f[1] for f in self.fields if f[2]==identifier}
+
+
+def read_neb_info(file):
+    info=NEBInfo(file)
+    with open(file,'r') as f:
+        for line in f:
+            if line.startswith('neb'):
+                info.runs.append(line)
+            if "pcsv_" in line:
+                spt=line.split()
+                parts=spt[0].split('_')
+                info.fields.append([parts[-1],spt[1],'_'.join(parts[1:-1])])
+            if "image" in line:
+                info.images.append(line.split()[-1])
+    return info
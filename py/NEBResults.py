@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+import numpy as np
+import pandas as pd
+import glob
+import os
+import socket
+import sys
+import time
+import uuid
+
+#Typed results store for NEB outcomes. A store is a folder (<dataset>.results/ next
+#to the old csv) of partition files, one per batch of appended rows. Every batch is
+#written to a temp name and renamed into place so concurrent jobs never see or
+#clobber a half written partition and no locking is needed.
+
+nbarriers=4
+
+resultdtype=np.dtype([('pair','U32'),
+                      ('id','U64'),
+                      ('etol',np.float64),
+                      ('ts',np.float64),
+                      ('fail',np.bool_),
+                      ('dist',np.float64),
+                      ('FEB',np.float64),
+                      ('REB',np.float64),
+                      ('K',np.float64),
+                      ('iPos',np.float64,(3,)),
+                      ('fPos',np.float64,(3,)),
+                      ('box',np.float64,(3,2)),
+                      ('barriers',np.float64,(nbarriers,2)),
+                      ('run','U64')])
+
+#columns that come back from load_results as plain scalars
+scalarcolumns=[n for n in resultdtype.names if resultdtype[n].shape==() ]
+
+
+def store_path(csvfile):
+    return csvfile.removesuffix('.csv')+'.results'
+
+
+#one row as a structured record, missing vectors are left as nan
+def make_row(pair,id,etol,ts,fail,dist,FEB,REB,K,iPos=None,fPos=None,box=None,barriers=None,run=''):
+    row=np.zeros(1,dtype=resultdtype)[0]
+    row['pair']=pair
+    row['id']=id
+    row['etol']=etol
+    row['ts']=ts
+    row['fail']=fail
+    row['dist']=dist
+    row['FEB']=FEB
+    row['REB']=REB
+    row['K']=np.nan if K is None else float(K)
+    row['iPos']=np.nan if iPos is None else iPos
+    row['fPos']=np.nan if fPos is None else fPos
+    row['box']=np.nan if box is None else box
+    b=np.full((nbarriers,2),np.nan)
+    if barriers is not None and len(barriers)>0:
+        barriers=np.asarray(barriers,dtype=np.float64).reshape(-1,2)[:nbarriers]
+        b[:len(barriers)]=barriers
+    row['barriers']=b
+    row['run']=run
+    return row
+
+
+#append a batch of rows as one new partition
+def append_results(path,rows):
+    if len(rows)==0:
+        return None
+    arr=np.array(rows,dtype=resultdtype)
+    os.makedirs(path,exist_ok=True)
+    name=f'part-{time.strftime("%Y%m%d%H%M%S")}-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+    tmp=os.path.join(path,'.'+name+'.tmp.npy')
+    np.save(tmp,arr)
+    final=os.path.join(path,name+'.npy')
+    os.replace(tmp,final)
+    return final
+
+
+#all partitions of one or more stores as a single structured array
+def load_arrays(paths):
+    if isinstance(paths,str):
+        paths=[paths]
+    parts=[]
+    for p in paths:
+        for f in sorted(glob.glob(os.path.join(p,'part-*.npy'))):
+            parts.append(np.load(f))
+    if len(parts)==0:
+        return np.zeros(0,dtype=resultdtype)
+    return np.concatenate(parts)
+
+
+#DataFrame of a store, iPos/fPos/box/barriers columns hold float array views
+def load_results(paths,includebad=False):
+    arr=load_arrays(paths)
+    if not includebad:
+        arr=arr[~arr['fail']]
+    df=pd.DataFrame({n:arr[n] for n in scalarcolumns})
+    for n in ('iPos','fPos','box'):
+        df[n]=list(arr[n])
+    #old csv layout kept the extra barriers in A..H
+    for i, c in enumerate('ABCDEFGH'):
+        df[c]=arr['barriers'][:,i//2,i%2]
+    return df
+
+
+#"[1.0,2.0,3.0]" / "[[a,b],[c,d],[e,f]]" style pcsv strings without literal_eval
+def parse_vector(s,shape):
+    v=np.array(s.replace('[',' ').replace(']',' ').replace(',',' ').split(),dtype=np.float64)
+    return v.reshape(shape)
+
+
+#vector column of literal strings into an (n,*shape) float array in one parse,
+#rows that do not hold exactly one vector (nan, empty) come back as nan
+def parse_vector_column(col,shape):
+    n=len(col)
+    size=int(np.prod(shape))
+    out=np.full((n,size),np.nan)
+    s=pd.Series(col).astype(str).str.replace(r'[\[\],]',' ',regex=True)
+    ntok=s.str.split().str.len().fillna(0).to_numpy()
+    ok=ntok==size
+    if ok.any():
+        vals=np.array(' '.join(s[ok].tolist()).split(),dtype=np.float64)
+        out[ok]=vals.reshape(-1,size)
+    return out.reshape((n,)+tuple(shape))
+
+
+def stats_from_csv_name(csvname):
+    filename=csvname.removesuffix('.dat').removesuffix('.data').removesuffix('.dump').removesuffix('.csv')
+    ratio=filename.split('-')[0]
+    Hstr=filename.split('-')[1]
+    Hnum=Hstr.split('_')[0]
+    return (ratio,Hnum)
+
+
+#one result csv with the vector columns already parsed, used by NEBTools.csv_to_df/csvs_to_df
+#and kept in this light module so pool workers do not need to import the lammps/ovito stack
+def read_result_csv(csvpath,includebad=False):
+    csvname=csvpath.split('/')[-1]
+    (cratio,cHnum)=stats_from_csv_name(csvname)
+    df=pd.read_csv(csvpath)
+
+    if not includebad and "fail" in df.columns:
+        df=df[df["fail"]!=True]
+
+    df=df.assign(ratio=cratio,Hnum=cHnum,csvname=csvname)
+    for c, shape in (('iPos',(3,)),('fPos',(3,)),('box',(3,2))):
+        if c in df.columns:
+            df[c]=list(parse_vector_column(df[c].to_numpy(),shape))
+    return df
+
+
+#convert old csv results into a store, returns the number of rows written
+def import_csv(csvfile,path=None):
+    if path is None:
+        path=store_path(csvfile)
+    df=read_result_csv(csvfile,includebad=True)
+    rows=[]
+    for r in df.to_dict('records'):
+        barriers=[r.get(c,np.nan) for c in 'ABCDEFGH']
+        rows.append(make_row(r['pair'],r['id'],r['etol'],r['ts'],str(r['fail'])=='True',r['dist'],r['FEB'],r['REB'],r.get('K'),
+                             r.get('iPos'),r.get('fPos'),r.get('box'),barriers))
+    append_results(path,rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    for f in sys.argv[1:]:
+        n=import_csv(f)
+        print(f'{f}: {n} rows -> {store_path(f)}')
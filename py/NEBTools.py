@@ -9,7 +9,6 @@ from ovito.modifiers import AffineTransformationModifier
 from ovito.pipeline import ModifierInterface
 from traits.api import Range, observe
 import numpy as np
-from sympy import Point3D, Line3D, Plane
 
 import numpy as np
 import statistics
@@ -27,6 +26,8 @@ from ast import literal_eval
 import os
 from mpi4py import MPI
 import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 # import matplotlib.cm as cm
 # import matplotlib.colors as colors
 from ase.geometry import get_angles
@@ -36,6 +37,18 @@ from matplotlib.ticker import MaxNLocator
 from pandas.api.types import is_numeric_dtype
 from numpy.linalg import norm
 
+import LammpsIO as lio
+import StructCache as sc
+import Topology as tp
+import ReaxBonds as rb
+import NEBResults as nr
+import PBCGeometry as pg
+import SpatialIndex as si
+import BondAngles as ba
+import RingStats as rs
+import Pinhole as ph
+import LocalEnv as le
+
 jp=0
 
 
@@ -54,46 +67,15 @@ v=4.74e-20
 w=1.6e-7
 HNumToConcentration=w/v
 
+#single point versions of the PBCGeometry kernels
 def pbc_midpoint(simbox,p1,p2):
-    ret=[0,0,0]
-    for i, (a, b) in enumerate(zip(p1, p2)):
-        delta = abs(b - a)
-        dimension=simbox[i,1]-simbox[i,0]
-        
-        if delta > dimension/2:
-            if b>a:
-                b+=dimension
-            else:
-                a+=dimension
-            
-        ret[i]=(b+a)/2
-        
-    return ret
+    return pg.pbc_midpoints(simbox,p1,p2).tolist()
 
 def pbc_vec_subtract(simbox, posi,posf):
-    ret=[0,0,0]
-    for i, (a, b) in enumerate(zip(posi, posf)):
-        delta = abs(b - a)
-        dimension=simbox[i,1]-simbox[i,0]
-        if delta > dimension/2:
-            if b < a:
-                b+=dimension
-            else:
-                a+=dimension
-            
-        ret[i]=b-a
-        
-    return ret
+    return pg.pbc_vectors(simbox,posi,posf).tolist()
 
 def pbc_dist(simbox, pos1,pos2):
-    total = 0
-    for i, (a, b) in enumerate(zip(pos1, pos2)):
-        delta = abs(b - a)
-        dimension=simbox[i,1]-simbox[i,0]
-        if delta > dimension- delta:
-            delta = dimension - delta
-        total += delta ** 2
-    return total ** 0.5
+    return float(pg.pbc_distances(simbox,pos1,pos2))
 
 
 def vec_projection(v1,v2):
@@ -105,20 +87,11 @@ def vec_proj_to_plane(v1,v2):
     
 
 def pbc_dist_point_to_vec(simbox, p1,p2,distPoint):
-    
-    if np.array_equal(p1,p2) or np.array_equal(p1,distPoint) or np.array_equal(distPoint,p2) :
-        return None
-    vec1=pbc_vec_subtract(simbox,p1,p2)
-    vec2=pbc_vec_subtract(simbox,distPoint,p1)
-    try:
-        dist = norm(np.cross(vec1,vec2))/norm(vec1)
-    except:
-        print(f"pbc_dist_point_to_vec failed p1: {p1} p2: {p2} dp: {distPoint}")
-        
-    #print(f"pbc_dist_point_to_vec - {distPoint} to {p2}-{p1}={dist}")
-    return dist
+    dist=float(pg.pbc_point_line_distances(simbox,p1,p2,distPoint))
+    return None if np.isnan(dist) else dist
 
 
+#distance of every atom to the p1-p2 line (pvdcol) and its position t along p1->p2 ('pointvecT')
 def apply_point_vec_dist(df,simbox,p1,p2,atomtype=None,col='pos'):
     pvdcol='pointvecDist'
     if df.empty:
@@ -128,25 +101,30 @@ def apply_point_vec_dist(df,simbox,p1,p2,atomtype=None,col='pos'):
     if atomtype is not None:
         distdf=distdf[distdf["type"]==atomtype]
 
-    distdf[pvdcol]=distdf.apply(lambda row: pbc_dist_point_to_vec(simbox,p1,p2,row[col]),axis=1)
+    pos=pg.stack_positions(distdf[col])
+    (perp,t)=pg.pbc_point_segment(simbox,p1,p2,pos)
+    #nan on p1/p2 (or p1==p2) like pbc_point_line_distances
+    bad=np.all(pos==np.asarray(p1),axis=-1)|np.all(pos==np.asarray(p2),axis=-1)|np.all(np.asarray(p1)==np.asarray(p2))
+    distdf[pvdcol]=np.where(bad,np.nan,perp)
+    distdf['pointvecT']=t
 
     return (distdf,pvdcol)
+
+#atoms (of one type) inside the cylinder of the given radius around the p1->p2 path
+def atoms_near_path(df,simbox,p1,p2,radius,atomtype=None,tmin=0,tmax=1,col='pos'):
+    if atomtype is not None:
+        df=df[df["type"]==atomtype]
+    return df[pg.within_cylinder(simbox,p1,p2,pg.stack_positions(df[col]),radius,tmin,tmax)]
            
 
 def apply_dist_from_pos(df,simbox,pos,atomtype=None,col='pos'):
     distdf=df.copy()
-    #pos=df.at[atom,'pos']
     
     if atomtype is not None:
         distdf=distdf[distdf["type"]==atomtype]
-    #partdf=dd.from_pandas(distdf,npartitions=numproc)
-    # print(distdf.iloc[0].to_string())
-    #.swifter.progress_bar(False).allow_dask_on_strings(enable=True).apply
-    distdf['dist']=distdf.apply(lambda row: pbc_dist(simbox,row[col],pos),axis=1)
-    # print(distdf.iloc[0].to_string())
-    #distdf['dist']=partdf.map_partitions(lambda df: df.apply((lambda row: pbc_dist(simbox,row['pos'],pos)),axis=1),meta=('pos', object)).compute(scheduler='threads')
-
-    #distdf.drop(index=atom,inplace=True,errors='ignore')
+    #one minimum image call over every row instead of a per row apply
+    distdf['dist']=pg.pbc_distances(simbox,pg.stack_positions(distdf[col]),pos)
+
     return distdf #for now just return the number of atoms
 
 def unit_vector(vector):
@@ -158,12 +136,7 @@ def unit_vector(vector):
         print(vector)
 
 def stats_from_csv_name(csvname):
-    filename=csvname.removesuffix('.dat').removesuffix('.data').removesuffix('.dump').removesuffix('.csv')
-    ratio=filename.split('-')[0]
-    Hstr=filename.split('-')[1]
-    Hnum=Hstr.split('_')[0]
-    #print(f"ratio: {ratio}, Hnum:{Hnum}")
-    return (ratio,Hnum)
+    return nr.stats_from_csv_name(csvname)
 
 def angle_between_vec(box,v1,v2,debug=False):
     cell=ase.cell.Cell([[box[0,0],box[1,1],box[2,1]],[box[0,1],box[1,0],box[2,1]],[box[0,1],box[1,1],box[2,0]]])
@@ -173,52 +146,12 @@ def angle_between_vec(box,v1,v2,debug=False):
 
 
 def angle_between_pts(box,p1, p2,pm,debug=False):
-    # if v1 is None or v2 is None:
-    #     return 2*np.pi
+    #minimum image vectors from the middle point, same ([ang],[v1,v2]) return as before
+    v1=pg.pbc_vectors(box,pm,p1)
+    v2=pg.pbc_vectors(box,pm,p2)
+    ang=ba.triplet_angles(np.array([v1,[0,0,0],v2]),box,[0],[1],[2])
 
-  
-    cell=ase.cell.Cell([[box[0,0],box[1,1],box[2,1]],[box[0,1],box[1,0],box[2,1]],[box[0,1],box[1,1],box[2,0]]])
-
-            
-    # print(v1.dtype)
-    # print(f"{v1} {v2} {cell}")
-    
-    
-    print(f"--- angle_between_pts ---\np1{p1} p2{p2}\npm{pm}\nbox{box}") if debug else None
-    
-    lenlist=[(box[0,1]-box[0,0]),(box[1,1]-box[1,0]),(box[2,1]-box[2,0])]
-    #@TODO fix this for periodic boundary conditions, any atoms that have one or more over an  edge will produce low angles
-    imiddle=pm.copy()
-    fmiddle=pm.copy()
-    for k in range(len(p1)):#go through each dimension
-        
-        if abs(p1[k]-imiddle[k]) > lenlist[k]/2:
-            
-            if p1[k]<imiddle[k]:
-                p1[k]=p1[k]+lenlist[k]
-                print(f"{k}th dimension (a)") if debug else None
-            else:
-                imiddle[k]=imiddle[k]+lenlist[k]
-                print(f"{k}th dimension (b)") if debug else None
-                
-        if abs(p2[k]-fmiddle[k]) > lenlist[k]/2:
-            if p2[k]<fmiddle[k]:
-                p2[k]=p2[k]+lenlist[k]
-                print(f"{k}th dimension (c)") if debug else None
-            else:
-                fmiddle[k]=fmiddle[k]+lenlist[k]
-                print(f"{k}th dimension (d)") if debug else None
-                
-    
-    v1=p1-imiddle
-    v2=p2-fmiddle
-    
-    
-    
-    
-    ang=angle_between_vec(box,v1,v2)
-
-    print(f"--- post fixing ---\np1{p1} p2{p2}\nimiddle{imiddle} fmiddle{fmiddle}\nbox{box}\nang={ang}") if debug else None
+    print(f"--- angle_between_pts ---\np1{p1} p2{p2}\npm{pm}\nbox{box}\nang={ang}") if debug else None
     return (ang,[v1,v2])
 
 def find_atom_position(L,atomID):
@@ -237,58 +170,27 @@ def find_atom_position(L,atomID):
 def NEB_min(L,etol):
     L.commands_string(f'''minimize {etol} {etol} 10000 10000''')
 
-def find_bond_preference(box,file,atom,midpoint,sepvec):
-    from sympy.abc import u,v
-    
-    
-    
-    ti=time.time()
-    #Need two lammps instances so that when removing an atom and minimizing we don't increase time for final NEB image minimization
-    L = lammps('mpi',["-log",'none',"-screen",'none'])
-    init_dat(L,file)
-    
-    L.commands_string(f'''
-        variable x{atom} equal x[{atom}]
-        variable y{atom} equal y[{atom}]
-        variable z{atom} equal z[{atom}]
-        ''')
-    
-    x = L.extract_variable(f'x{atom}')
-    y = L.extract_variable(f'y{atom}')
-    z = L.extract_variable(f'z{atom}')
-    orig=np.array([x,y,z])
-    #(df, box) = read_data(file)
+#bond center position pushed radius off the Si-Si midpoint, in the plane normal to the Si-Si
+#separation and on the side the atom sits
+#(orig, the atom's position, is read from file when not given)
+def find_bond_preference(box,file,atom,midpoint,sepvec,radius=0.04,orig=None):
+    if orig is None:
+        (atoms,simbox)=lio.read_data_file(file)
+        orig=np.asarray(atoms['pos'])[np.asarray(atoms['id'])==atom][0]
 
-    
-    dplane=Plane(Point3D(midpoint),normal_vector=sepvec)
-    parametrizedpt=dplane.arbitrary_point(u,v)
-    zpoint_plane=np.array(parametrizedpt.subs({u:np.cos(0),v:np.sin(0)}).evalf(),dtype=float)-midpoint
-    
-    ang=angle_in_plane(box,midpoint,sepvec,orig,zpoint_plane)
+    ang=angle_in_plane(box,midpoint,sepvec,orig)
     
     rtot=2
     angtot=8
     twopi=2*np.pi
-    tstep=0
     tstart=ang
-    radius=0.04
-    pts=[]
     rmin=0.3
     rmax=0.6
-    parametrizedpt=dplane.arbitrary_point(u,v)
 
-    newpt=parametrizedpt.subs({u:radius*np.cos(ang),v:radius*np.sin(ang)}).evalf()
-    mpt=np.array(newpt)
+    mpt=pg.plane_points(midpoint,sepvec,radius,ang)[0,0]
     
-    #     for offset in [0]: #[-0.01,0,0.01]:
-    #     for radius in np.linspace(rmin,rmax,rtot):
-    #         for theta in np.linspace(tstart,tstart+twopi/2,angtot,endpoint=False):
-    #             newpt=parametrizedpt.subs({u:radius*np.cos(theta),v:radius*np.sin(theta)}).evalf()
-    #             newpt.translate(0,offset,0)
-    #             pts.append([newpt,theta,radius])
-    #         tstart+=tstep
-
-
+    #every candidate of the ring scan at once, shape (rtot,angtot,3)
+    # pts=pg.plane_points(midpoint,sepvec,np.linspace(rmin,rmax,rtot),np.linspace(tstart,tstart+twopi/2,angtot,endpoint=False))
 
     # tot=len(pts)
     # xi, yi, zi = midpoint[0], midpoint[1], midpoint[2]
@@ -337,48 +239,31 @@ def find_bond_preference(box,file,atom,midpoint,sepvec):
         
     return mpt
 
-def angle_in_plane(box,plane_point,plane_vec,orig_point,plane_zero_vec,ax=None):
-    # from sympy.abc import g,f
-    # dplane=Plane(Point3D(plane_point),normal_vector=plane_vec)
-    plane_point=np.array(plane_point,dtype=float)
-    plane_vec=np.array(plane_vec,dtype=float)
-    orig_point=np.array(orig_point,dtype=float)
-    orig_to_plane=pbc_vec_subtract(box,plane_point,orig_point)
-    # parametrizedpt=dplane.arbitrary_point(g,f)
-    # zpoint_plane=np.array(parametrizedpt.subs({g:np.cos(0),f:np.sin(0)}).evalf(),dtype=float)
-    # plane_zero_vec=zpoint_plane
-
-
-
-    orig_plane_proj=vec_proj_to_plane(orig_to_plane,plane_vec)
-    if all(t==0 for t in orig_plane_proj):
-        print("projection is [0,0,0]")
-        return 0
-
-    opp_vec=orig_plane_proj/np.linalg.norm(orig_plane_proj)
-
-
-    #find the angle between the two vecotrs IN THE PLANE
-    # n=sepvec/np.linalg.norm(sepvec)
-    angdeg=angle_between_vec(box,opp_vec,plane_zero_vec)[0][0]
-    anginplane_orig=np.radians(angdeg)#-np.dot(n,np.cross(opp_vec,plane_zero_vec))
-    #print(f"rad: {anginplane_orig} deg:{angdeg}")
-    dmat=[plane_zero_vec,plane_point+opp_vec,plane_vec]
-    sign=np.linalg.det(dmat)
-    anginplane_orig=anginplane_orig if sign > 0 else -anginplane_orig
+#signed angle (radians) of orig_point's projection in the plane through plane_point with normal
+#plane_vec, measured from plane_zero_vec (e1 of pg.plane_basis when None). orig_point may be
+#an (N,3) array, see pg.angle_in_plane
+def angle_in_plane(box,plane_point,plane_vec,orig_point,plane_zero_vec=None,ax=None):
+    ang=pg.angle_in_plane(box,plane_point,plane_vec,orig_point)
+    if plane_zero_vec is not None:
+        zero=pg.angle_in_plane(box,plane_point,plane_vec,np.asarray(plane_point,dtype=float)+plane_zero_vec)
+        ang=np.mod(ang-zero+np.pi,2*np.pi)-np.pi
+    if np.ndim(ang)==0:
+        if np.isnan(ang):
+            print("projection is [0,0,0]")
+            return 0
+        ang=float(ang)
     
     if ax is not None:
-        opp_pt=plane_point+orig_plane_proj
+        orig_to_plane=pg.pbc_vectors(box,plane_point,orig_point)
+        n=np.asarray(plane_vec,dtype=float)/np.linalg.norm(plane_vec)
+        opp_pt=np.asarray(plane_point)+orig_to_plane-np.outer(orig_to_plane@n,n).reshape(np.shape(orig_to_plane))
         plto=np.array([plane_point,opp_pt]).T
         ax.plot(plto[0],plto[1],plto[2],color='r')
         
         plto=np.array([orig_point,opp_pt]).T
         ax.plot(plto[0],plto[1],plto[2],color='r')
-
-        # zv=np.array([plane_point,plane_zero_vec]).T
-        # ax.plot(zv[0],zv[1],zv[2],color='blue')
         
-    return anginplane_orig
+    return ang
 
 def find_local_minima_position(file,atom,initial_guess):
     ti=time.time()
@@ -540,97 +425,25 @@ def create_bond_file(datapath, file,bondfile):
         ''')
     
 def read_bonds(df,file):
-    # alist=[]
-    #create new columns in the datafram
-    with open(file,'r') as f:
-
-        for line in f:
-            #skip the first 7 lines for header
-            ainfo=[]
-            l=line.split()
-            if l[0] == '#':
-                continue
-            i=0#the current item in the line we're on
-
-            id=int(l[0])
-            typ=int(l[1])
-            nb=int(l[2])
-            if typ == 1:
-                typ='Si'
-            elif typ==2:
-                typ='O'
-            elif typ==3:
-                typ='H'
-            if df.at[id,'type']!=typ:
-                print(f'Big bombad making bonds - Atom{id} doesnt match types')
-                
-            df.at[id,'nb']=nb
-            i=3
-            blist=[]
-           
-           #run through each bond and grab the id and bond order(index offset by the number of bonds)
-            for j in range(nb):
-                blist.append([int(l[i+j]),float(l[i+j+nb+1])])
-            #print(blist)
-            df.at[id,"bonds"]=""
-            df.at[id,"bonds"]=blist
-
+    #bulk parse into a CSR topology and hand back the old nb/bonds columns
+    topo=tp.topology_from_bond_file(file,df.index.to_numpy(),df['type'].to_numpy())
+    df['nb']=topo.degree.astype(float)
+    df['bonds']=topo.to_bond_lists()
     return df
 
-def read_data(file):
-    dlist=[]
-    skipindex=0
-    simbox=np.zeros((3,2))
-
-    with open(file,'r') as f:
-
-        
-        for line in f:
-            l=line.split()
-            
-            if "xlo" in line:
-                simbox[0,0]=l[0]
-                simbox[0,1]=l[1]
-            if "ylo" in line:
-                simbox[1,0]=l[0]
-                simbox[1,1]=l[1]
-            if "zlo" in line:
-                simbox[2,0]=l[0]
-                simbox[2,1]=l[1]
-            #skip the first 17 lines for header
-            if skipindex<17:
-                skipindex+=1
-                continue
-            
-            dinfo=[]
-            
-            if len(l)<6:
-                continue
-            #example line 
-            #1 1 0.03793783944547108 1.2804479390923988 1.2230759130866515 1.8085851741085164 0 0 0
-            id=int(l[0])
-            typ=int(l[1])
-            if typ == 1:
-                typ='Si'
-            elif typ==2:
-                typ='O'
-            elif typ==3:
-                typ='H'
-                
-            q=float(l[2])#charge
-            x=float(l[3])
-            y=float(l[4])
-            z=float(l[5])
-            pos=np.array([x,y,z])
-            dinfo=[id,typ,q,x,y,z,pos]
-            
-            #add this row to the dataframe
-            dlist.append(dinfo)
+def atoms_to_df(atoms):
+    pos=np.array(atoms['pos'])
 
-    df = pd.DataFrame(dlist,columns=['id','type','q','x','y','z','pos'])
+    df = pd.DataFrame({'id':np.array(atoms['id']),'type':atoms['element'],'q':np.array(atoms['q']),
+                       'x':pos[:,0],'y':pos[:,1],'z':pos[:,2]})
+    #pos column keeps per-row views into the single position array
+    df['pos']=list(pos)
     df.set_index('id',inplace=True,drop=True)
+    return df
 
-    return (df,simbox)
+def read_data(file):
+    (atoms,simbox)=lio.read_data_file(file)
+    return (atoms_to_df(atoms),simbox)
 
 def get_lammps(log):
     return lammps('mpi',["-log",log,'-screen','none'])
@@ -689,79 +502,59 @@ def init_dat(L,file):
         ''')
 
 
-def get_pinhole_pairs(basedf,pinhole_loc,pin_rad=12,inside_pinhole=True):
-    df=basedf.copy()
-    csvlist=df["csvname"].unique()
-    colranges=[0,1.8,2.8,3.8,10]
+#pinhole atoms of the structure a result csv came from, found from its composition
+#(Pinhole.py) instead of a hand made id list. Returns (ids, channels, simbox).
+def pinhole_atoms_from_csv(csvname,through_only=True):
+    global datafolder
+    datafile=csvname.removesuffix('.dat').removesuffix('.data').removesuffix('.dump').removesuffix('.csv')+'.dat'
+    (atoms,simbox)=lio.read_data_file(datafolder+datafile)
+    (channels,atomlabel)=ph.find_pinholes(atoms['pos'],atoms['element'],simbox)
+    return (ph.pinhole_atoms(channels,atomlabel,atoms['id'],through_only),channels,simbox)
+
+
+#True for the result rows ('mover-zapped' in id) in a pinhole: mover or zapped is one of
+#the pinhole atoms (detected per csv unless pinatoms is given) or, with pinhole_loc, the
+#initial position is inside the detected channel nearest pinhole_loc (within its radius,
+#or pin_rad when given, of the channel axis)
+def pinhole_mask(basedf,pinhole_loc=None,pin_rad=None,pinatoms=None):
+    mask=np.zeros(len(basedf),dtype=bool)
+    ids=basedf['id'].astype(str).str.split('-',expand=True)
+    mover=pd.to_numeric(ids[0],errors='coerce').to_numpy()
+    zapped=pd.to_numeric(ids[1],errors='coerce').to_numpy() if ids.shape[1]>1 else np.full(len(basedf),np.nan)
+    csvnames=basedf['csvname'].to_numpy()
+    for csvfile in pd.unique(csvnames):
+        c=csvnames==csvfile
+        if pinhole_loc is not None:
+            (_,channels,simbox)=pinhole_atoms_from_csv(csvfile)
+            loc=np.asarray(pinhole_loc,dtype=np.float64)
+            if len(channels)==0:
+                if pin_rad is None:
+                    raise ValueError(f'No pinhole channel found in {csvfile} and no pin_rad given')
+                #nothing detected, a vertical axis through pinhole_loc
+                channel=np.zeros(1,dtype=ph.channeldtype)[0]
+                channel['center']=loc
+                channel['axis']=(0,0,1)
+            else:
+                dist=[ph.axis_distance(simbox,ch,loc[None,:])[0] for ch in channels]
+                channel=channels[int(np.argmin(dist))]
+            rad=channel['radius'] if pin_rad is None else pin_rad
+            ipos=np.stack(basedf['iPos'].to_numpy()[c])
+            mask[c]=ph.axis_distance(simbox,channel,ipos)<rad
+        else:
+            atoms=pinatoms if pinatoms is not None else pinhole_atoms_from_csv(csvfile)[0]
+            mask[c]=np.isin(mover[c],atoms)|np.isin(zapped[c],atoms)
+    return mask
 
-    for csvfile in csvlist:
-        dfc=df[df["csvname"]==csvfile]
 
-        #print(dfc.to_string())
-        pinatoms=[3032,3041,3053,3087,3091,3041,3091,3105,2985,2984,3087,3101,2985,3396,2985,2984,2984,3530,3521,1535,3530,3521,3434,3434,3323,3529,3482,3410,3434,3434,3478,3482,3573,3581,3493,3921,4021,3933,4024,4029,4025,4139,4141,4139,4106,6089,3445,3101,3445,3437,3439,3445,3434,3437,3434,3437,3491,3487,3491,3410,3411,3410,3491,3487,3493,3494,3409,3411,3497,3493,3534,3546,3109,3162,5102,3163,3124,3162,3162,3163,5050,3029,3469,3564,3564,3370,3370,3635,3564,3634,5533,3649,5578]
-        # (ratio,Hnum)=stats_from_csv_name(csvfile)
-        
-        # (posdf,box)=load_data_from_csv(csvfile)
-        # dfc['pin_dist']=dfc.apply(lambda row: pbc_dist(box,row['iPos'],pinhole_loc),axis=1)
-        retdf=pd.DataFrame(columns=dfc.columns)
-        
-        for index,row in dfc.iterrows():
-            pair=row['id']
-            mover=int(pair.split('-')[0])
-            zapped=int(pair.split('-')[1])
-            
-            if mover in pinatoms or zapped in pinatoms:
-                retdf.loc[len(retdf)]=row
-        
-        
-        # print(dfc.to_string())
-        # for index,row in dfc.iterrows():
-        #     mover_pos=row['iPos']
-            
-        #     dist=pbc_dist(box,mover_pos,pinhole_loc)
-            
-        #     row['pin_dist']=dist
-            
-    return retdf
-                
-                
-            
-def get_out_pinhole_pairs(basedf,pinhole_loc,pin_rad=12,inside_pinhole=True):
-    df=basedf.copy()
-    csvlist=df["csvname"].unique()
-    colranges=[0,1.8,2.8,3.8,10]
+def get_pinhole_pairs(basedf,pinhole_loc=None,pin_rad=None,inside_pinhole=True,pinatoms=None):
+    m=pinhole_mask(basedf,pinhole_loc,pin_rad,pinatoms)
+    return basedf[m if inside_pinhole else ~m]
+
+
+def get_out_pinhole_pairs(basedf,pinhole_loc=None,pin_rad=None,inside_pinhole=True,pinatoms=None):
+    return get_pinhole_pairs(basedf,pinhole_loc,pin_rad,not inside_pinhole,pinatoms)
 
-    for csvfile in csvlist:
-        dfc=df[df["csvname"]==csvfile]
 
-        #print(dfc.to_string())
-        pinatoms=[3032,3041,3053,3087,3091,3041,3091,3105,2985,2984,3087,3101,2985,3396,2985,2984,2984,3530,3521,1535,3530,3521,3434,3434,3323,3529,3482,3410,3434,3434,3478,3482,3573,3581,3493,3921,4021,3933,4024,4029,4025,4139,4141,4139,4106,6089,3445,3101,3445,3437,3439,3445,3434,3437,3434,3437,3491,3487,3491,3410,3411,3410,3491,3487,3493,3494,3409,3411,3497,3493,3534,3546,3109,3162,5102,3163,3124,3162,3162,3163,5050,3029,3469,3564,3564,3370,3370,3635,3564,3634,5533,3649,5578]
-        # (ratio,Hnum)=stats_from_csv_name(csvfile)
-        
-        # (posdf,box)=load_data_from_csv(csvfile)
-        # dfc['pin_dist']=dfc.apply(lambda row: pbc_dist(box,row['iPos'],pinhole_loc),axis=1)
-        retdf=pd.DataFrame(columns=dfc.columns)
-        
-        for index,row in dfc.iterrows():
-            pair=row['id']
-            mover=int(pair.split('-')[0])
-            zapped=int(pair.split('-')[1])
-            
-            if mover not in pinatoms and zapped not in pinatoms:
-                retdf.loc[len(retdf)]=row
-        
-        
-        # print(dfc.to_string())
-        # for index,row in dfc.iterrows():
-        #     mover_pos=row['iPos']
-            
-        #     dist=pbc_dist(box,mover_pos,pinhole_loc)
-            
-        #     row['pin_dist']=dist
-            
-    return retdf
-            
-            
 
 #@TODO rename plot bond investigation
 def temp(path,dfile):
@@ -848,19 +641,34 @@ def temp(path,dfile):
         # avg=np.mean(difflist)
     # print(avg)
 
-def read_file_data_bonds(datapath,dfile):
+def read_file_data_topology(datapath,dfile,use_cache=True):
+    file=datapath+dfile
 
-    (dfdata,simbox)=read_data(datapath+dfile)
+    #warm load straight from the structure cache, no reaxff run needed
+    if use_cache:
+        cached=sc.load_structure(file)
+        if cached is not None and cached[2] is not None:
+            (atoms,simbox,bonds)=cached
+            topo=tp.BondTopology.from_flat(atoms['id'],atoms['element'],*bonds)
+            return (atoms_to_df(atoms),simbox,topo)
 
-    filename=dfile.removesuffix('.dat').removesuffix('.data').removesuffix('.dump')
-    bondfile=filename+".bonds"
+    (atoms,simbox)=lio.read_data_file(file)
 
-    os.makedirs(datapath+'/scratchfolder/', exist_ok=True)
+    #bond orders come straight out of the shared in-process LAMMPS instance
+    topo=rb.get_perceiver().topology(file,atoms)
 
-    create_bond_file(datapath,dfile,bondfile)
+    if use_cache:
+        sc.store_structure(file,atoms,simbox,topo.flat())
 
-    df=read_bonds(dfdata,datapath+'/scratchfolder/'+bondfile)
+    return (atoms_to_df(atoms),simbox,topo)
 
+def read_file_data_bonds(datapath,dfile,use_cache=True):
+    (df,simbox,topo)=read_file_data_topology(datapath,dfile,use_cache)
+    df['nb']=topo.degree.astype(float)
+    df['bonds']=topo.to_bond_lists()
+    #neighbor helpers pick this up through tp.topology_of (while the frame keeps these atoms)
+    #instead of walking the bonds column
+    df.attrs['topology']=topo
     return (df,simbox)
 
 
@@ -897,6 +705,11 @@ def load_data_and_bonds_from_csv(csvname):
     datafile=csvname.removesuffix('.dat').removesuffix('.data').removesuffix('.dump').removesuffix('.csv')+'.dat'
     return read_file_data_bonds(datafolder,datafile)
 
+def load_data_and_topology_from_csv(csvname):
+    global datafolder
+    datafile=csvname.removesuffix('.dat').removesuffix('.data').removesuffix('.dump').removesuffix('.csv')+'.dat'
+    return read_file_data_topology(datafolder,datafile)
+
 def mean_str(col):
     global jp
     if is_numeric_dtype(col):
@@ -941,173 +754,56 @@ def mean_str(col):
 #     return grpdf
     
     
-# def clean_pairfiles(df,pathtopairs):
-#     ucsvs=df["csvname"].unique()
-    
-#     for csv in ucsvs:
-#         print(csv)
-#         csvdf=df[df["csvname"]==csv]
-#         print(len(csvdf))
-#         upairs=str(csvdf["id"].unique())
-#         print(upairs)
-#         print(len(upairs))
-#         pfile=pathtopairs+csv.removesuffix(".csv")+"-pairlist.txt"
-#         if os.path.exists(pfile):
-#             with open(pfile,"r+") as f:
-#                 lines=f.readlines()
-#                 lines.reverse()
-#                 f.seek(0)
-#                 done=0
-#                 notdone=0
-#                 for l in lines:
-#                     #print(l)
-#                     pair=l.split()[0]+"-"+l.split()[1]
-#                     if pair in upairs:
-#                         done+=1
-#                     else:
-#                         notdone+=1
-#                         f.write(l)
-#                 print(f"{done} done and {notdone} not done")
-#                 f.truncate()
-#         else:
-#             print(f"{pfile} doesn't exist.")
-        
-        
+#pruning finished pairs out of pair lists is done with the completion ledger (Ledger.py)
+
+
 def csv_to_df(csvpath,includebad=False):
-    csvname=csvpath.split('/')[-1]
-    #print(csvname)
-    (cratio,cHnum)=stats_from_csv_name(csvname)
-    df=pd.read_csv(csvpath)
-    
-    
-    if not includebad and "fail" in df.columns:
-        df=df[df["fail"]!=True]
-        
-    df['ratio']=""
-    df['Hnum']=""
-    df['csvname']=""
-    df=df.assign(ratio=cratio)#assign all rows in the ratio column
-    df=df.assign(Hnum=cHnum)
-    df=df.assign(csvname=csvname)
-    cols=["iPos","fPos","box"]
-    
-    if "iPos" in df.columns:
-        df['iPos']=df.iPos.apply(literal_eval)
-        #df['iPos']=df.iPos.apply(lambda x: [literal_eval(x)])#literal_eval)
-    if "fPos" in df.columns:
-        df['fPos']=df.fPos.apply(literal_eval)
-    if "box" in df.columns:
-        df['box']=df.box.apply(literal_eval)
-    
-    df=df.sort_values(by=['ratio'])
+    df=nr.read_result_csv(csvpath,includebad)
+    df=df.sort_values(by=['ratio'],kind='stable')
     return df
 
 
 
-def csvs_to_df(csvlist):
-    dflist=[]
-    for csvpath in csvlist:
-        df = csv_to_df(csvpath)
-        dflist.append(df)
+#typed results store (NEBResults) in the same layout as csv_to_df, no literal_eval needed
+def results_to_df(storepath,includebad=False):
+    csvname=storepath.rstrip('/').split('/')[-1].removesuffix('.results')+'.csv'
+    (cratio,cHnum)=stats_from_csv_name(csvname)
+    df=nr.load_results(storepath,includebad)
+    df=df.assign(ratio=cratio,Hnum=cHnum,csvname=csvname)
+    df=df.sort_values(by=['ratio'],kind='stable')
+    return df
 
+def csvs_to_df(csvlist,includebad=False,nproc=None):
+    #read the csvs concurrently, the vector columns are parsed in bulk by each worker
+    if nproc is None:
+        nproc=min(len(csvlist),os.cpu_count() or 1)
+    if nproc>1 and len(csvlist)>1:
+        #spawn, forked workers would inherit the MPI/LAMMPS state of this process
+        with ProcessPoolExecutor(max_workers=nproc,mp_context=multiprocessing.get_context('spawn')) as pool:
+            dflist=list(pool.map(nr.read_result_csv,csvlist,[includebad]*len(csvlist),chunksize=max(1,len(csvlist)//(4*nproc))))
+    else:
+        dflist=[nr.read_result_csv(c,includebad) for c in csvlist]
 
     combodf=pd.concat(dflist,ignore_index=True)
+    combodf=combodf.sort_values(by=['ratio'],kind='stable',ignore_index=True)
     return combodf
 
 
-def find_movers_neighbor(df,curatom,zappdatom,natom="Si",nnatom="O"):
-    curbonds=df.at[curatom,'bonds']
-
-    on=[]
-    sin=[]
-    checkatom=None
-    
-    for n in curbonds:
-        ni=n[0]
-        bo=n[1]
-
-        neitype=df.at[ni,'type']
-        if neitype ==natom:
-            neibonds = df.at[ni,'bonds']
-        
-            for nn in neibonds:
-                nni=nn[0]
-                nnbo=nn[1]
-
-                #found the interested atom
-                if nni == zappdatom:
-                    return ni
-    return None
+#the neighbor helpers below answer from the array topology of the DataFrame (tp.topology_of),
+#pass topo (from read_file_data_topology) to skip the lookup
+def find_movers_neighbor(df,curatom,zappdatom,natom="Si",nnatom="O",topo=None):
+    return tp.find_movers_neighbor(tp.topology_of(df,topo),curatom,zappdatom,natom)
                 
-def find_suitable_neighbors(df,curatom,zappdatom,natom="Si",nnatom="O"):
-    
-    ni=find_movers_neighbor(df,curatom,zappdatom,natom,nnatom)
-    if ni is None:
-        return 0
-    
-    curbonds=df.at[curatom,'bonds']
-    neibonds = df.at[ni,'bonds']
-    for b in curbonds:
-        if b[0] == ni:
-            return b[1]
-
+def find_suitable_neighbors(df,curatom,zappdatom,natom="Si",nnatom="O",topo=None):
+    return tp.find_suitable_neighbors(tp.topology_of(df,topo),curatom,zappdatom,natom)
 
-def find_nnneighbor(df,curatom,zappdatom,natom="Si",nnatom="O"):
-    curbonds=df.at[curatom,'bonds']
 
+def find_nnneighbor(df,curatom,zappdatom,natom="Si",nnatom="O",topo=None):
+    return tp.find_movers_neighbor(tp.topology_of(df,topo),curatom,zappdatom,natom)
 
-    for n in curbonds:
-        ni=n[0]
-        bo=n[1]
-
-        neitype=df.at[ni,'type']
-        if neitype ==natom:
-            neibonds = df.at[ni,'bonds']
-        
-            for nn in neibonds:
-                nni=nn[0]
-                nnbo=nn[1]
-
-                #found the interested atom
-                if nni == zappdatom:
-                    return ni
-    return None
-
-def find_neighboring_sibc(atoms,oi):
+def find_neighboring_sibc(atoms,oi,topo=None):
     #start with an Oxygen and find all neighboring Si with BC vacancies
-    nindices=atoms.at[oi,'bonds']
-    #look to see if this atom has any neighboring SI with vacancies
-
-    si_bc_vac=[]
-    badsi=[]
-    for n in nindices:
-        
-        ni=n[0]
-        neitype=atoms.at[ni,'type']
-        if neitype=='Si':
-
-            sibonds=atoms.at[ni,'bonds']
-                    
-            badsi=[]  
-            for b in sibonds:
-                bi=b[0]
-                btype=atoms.at[bi,'type']
-                if btype=='H' or btype=='O':
-                    bb=atoms.at[bi,'bonds']
-                    for bn in bb:
-                        bni=bn[0]
-                        bntype=atoms.at[bni,'type']
-                        if bntype=='Si' and bni !=ni:
-                            badsi.append(bni)
-        
-            
-            for nnn in sibonds:
-                nnni=nnn[0]
-                nnntype=atoms.at[nnni,'type']
-                if nnntype=='Si'and nnni not in badsi:
-                    si_bc_vac.append([ni,nnni])
-    
-    return si_bc_vac
+    return tp.find_neighboring_sibc(tp.topology_of(atoms,topo),oi)
 
 def angle_between_pts_df(df,valcol,posdf=None,box=None):
     #this function finds the angle between pts of NEB vacancy pairs
@@ -1152,7 +848,7 @@ def angle_between_pts_df(df,valcol,posdf=None,box=None):
     return df
 
 
-def find_final_si_pair(bonddf,simbox,mover,f_loc=None):
+def find_final_si_pair(bonddf,simbox,mover,f_loc=None,sidx=None):
     si_atoms=[]
     
     # if zapped is not None: 
@@ -1169,12 +865,10 @@ def find_final_si_pair(bonddf,simbox,mover,f_loc=None):
                 
     # elif f_loc is not None:
     radius=1.75#ang
-    #this is a move to location style
-    distdf=apply_dist_from_pos(bonddf,simbox,f_loc,"Si")
-    distdf=distdf[distdf['dist']<radius]
-
-    for i,r in distdf.iterrows():
-        si_atoms.append(i)
+    #this is a move to location style, pass sidx to reuse one spatial index over many pairs
+    if sidx is None:
+        sidx=si.index_from_df(bonddf,simbox)
+    si_atoms=sorted(sidx.query_radius(np.asarray(f_loc,dtype=float),radius,"Si").tolist())
         
     if len(si_atoms) != 2:
         print(f'Found {len(si_atoms)} Si neighbors for location {f_loc}')
@@ -1244,51 +938,23 @@ def helper_drop_non(row,posdf,var='drop'):
     
     mover=int(row['id'].split('-')[0])
     zapped=int(row['id'].split('-')[1])
-
-    
-    mid_si=find_movers_neighbor(posdf,mover,zapped)
-    
-    ret=find_initial_final_si(posdf,mover,zapped)
-    initial_si=ret[0]
-    final_si=ret[1]
-    
-    blist_i=posdf.at[initial_si,'bonds']
-    blist_f=posdf.at[final_si,'bonds']
     
-    si_count=0
-    o_count=0
-    h_count=0
-    for b in blist_i:
-        bi=b[0]
-        btype=posdf.at[bi,'type']
-        if btype=="Si": 
-            si_count+=1
-        elif btype=="O":
-            o_count+=1
-        elif btype=="H":
-            h_count+=1
-            
-    for b in blist_f:
-        bi=b[0]
-        btype=posdf.at[bi,'type']
-        if btype=="Si": 
-            si_count+=1
-        elif btype=="O":
-            o_count+=1
-        elif btype=="H":
-            h_count+=1
-            
-    if si_count > 0 or h_count > 0:
-        row[var]=True
-    else:
-        row[var]=False
+    row[var]=bool(pairs_with_non_O(tp.topology_of(posdf),[mover],[zapped])[0])
         
     return row
 
+#True for every mover/zapped pair whose initial or final Si is bonded to a Si or H
+#(or could not be found)
+def pairs_with_non_O(topo,movers,zapped):
+    (initial_si,mid_si,final_si)=tp.initial_final_si(topo,movers,zapped)
+    counts=tp.type_counts(topo,initial_si)+tp.type_counts(topo,final_si)
+    return (counts[:,0]>0)|(counts[:,2]>0)|(initial_si<0)|(final_si<0)
+
 def drop_non_O_pairs(basedf):
     df=basedf.copy()    
     csvlist=df["csvname"].unique()
     
+    keep=[]
     for csvfile in csvlist:
 
         print("calc_local_bond_angles on "+ str(csvfile))
@@ -1297,14 +963,13 @@ def drop_non_O_pairs(basedf):
         #print(dfc.to_string())
         (ratio,Hnum)=stats_from_csv_name(csvfile)
         
-        (posdf,box)=load_data_and_bonds_from_csv(csvfile)
-        # dfc['drop']=""
-        # count=0
+        (posdf,box,topo)=load_data_and_topology_from_csv(csvfile)
         
-        
-        dfc=dfc.apply(helper_drop_non, args=(posdf,),axis=1)    
-        # print(dfc.to_string())
-        return dfc[dfc['drop']==False]
+        #every pair of this data file in one batch
+        pairs=dfc['id'].str.split('-',expand=True).astype(int)
+        dfc=dfc.assign(drop=pairs_with_non_O(topo,pairs[0].to_numpy(),pairs[1].to_numpy()))
+        keep.append(dfc[dfc['drop']==False])
+    return pd.concat(keep) if len(keep)>0 else df.iloc[0:0]
             
             
         
@@ -1399,52 +1064,9 @@ def create_initial_final_neb_files(basedf,neb_data_folder):
             
 
 def find_initial_final_si(posdf,mover,zapped):
-    si_o_bondorder=0.9
-    si_si_bondorder=3
-    si_h_bondorder=1.7
-    
-
-    initial_pair=[]
-    final_pair=[]
-    
-    
-    #Find all Si neighbors of the initial O
-    blist_i=posdf.at[mover,'bonds']
-    for b in blist_i:
-        bi=b[0]
-        btype=posdf.at[bi,'type']
-        if btype=="Si":
-            initial_pair.append(bi)
-            
-    #Find all Si neighbors of the final O
-    blist_f=posdf.at[zapped,'bonds']
-    for b in blist_f:
-        bi=b[0]
-        btype=posdf.at[bi,'type']
-        if btype=="Si":
-            final_pair.append(bi)
-                
-    mid_si=find_movers_neighbor(posdf,mover,zapped)
-    
-    
-    initial_si=None
-    #go through all the pairs(should be 2)
-    for ip in initial_pair:
-        if mid_si != ip:
-            initial_si=ip
-        elif mid_si==ip:
-            fine=0
-        else:
-            print('find_initial_final_si: BAD calc_local_structure')
-    final_si=None
-    for fp in final_pair:
-        if mid_si != fp:
-            final_si=fp
-        elif mid_si==fp:
-            fine=0
-        else:
-            print('find_initial_final_si: BAD calc_local_structure') 
-                    
+    (initial_si,mid_si,final_si)=tp.initial_final_si(tp.topology_of(posdf),[mover],[zapped])
+    initial_si=None if initial_si[0]<0 else int(initial_si[0])
+    final_si=None if final_si[0]<0 else int(final_si[0])
     return [initial_si,final_si]
 
 def helper_calc_avg_BLen_Si(neb_datfile,si_atom,blist,missing, box=None, posdf=None):
@@ -1706,6 +1328,24 @@ def calc_local_bond_angles(basedf,pair_path):
             
         
 
+#per atom local environment table (LocalEnv) of the data file behind a csv, cached per structure
+def load_local_env_from_csv(csvname,radii=le.default_radii,bo_cut=None):
+    global datafolder
+    datafile=csvname.removesuffix('.dat').removesuffix('.data').removesuffix('.dump').removesuffix('.csv')+'.dat'
+    (posdf,box,topo)=read_file_data_topology(datafolder,datafile)
+    return le.get_descriptors(datafolder+datafile,topo,posdf[['x','y','z']].to_numpy(),box,radii,bo_cut)
+
+
+#mover (m_) and zapped (z_) environments of every pair joined on, one descriptor pass per structure
+def add_local_env(basedf,radii=le.default_radii,bo_cut=None,columns=None):
+    parts=[]
+    for csvfile in basedf["csvname"].unique():
+        print("add_local_env on "+ str(csvfile))
+        desc=load_local_env_from_csv(csvfile,radii,bo_cut)
+        parts.append(le.join_pairs(basedf[basedf["csvname"]==csvfile],desc,columns=columns))
+    return pd.concat(parts).loc[basedf.index]
+
+
 def calc_local_structure(basedf,pair_path,gif=True):
     df=basedf.copy()    
     csvlist=df["csvname"].unique()
@@ -1718,33 +1358,34 @@ def calc_local_structure(basedf,pair_path,gif=True):
         #print(dfc.to_string())
         (ratio,Hnum)=stats_from_csv_name(csvfile)
         
-        (posdf,box)=load_data_and_bonds_from_csv(csvfile)
+        (posdf,box,topo)=load_data_and_topology_from_csv(csvfile)
         
         si_o_bondorder=0.9
         si_si_bondorder=3
         si_h_bondorder=1.7
         
-        
+        #initial/mid/final Si of every pair in one batch
+        pairs=dfc['id'].str.split('-',expand=True).astype(int)
+        (initial_l,mid_l,final_l)=tp.initial_final_si(topo,pairs[0].to_numpy(),pairs[1].to_numpy())
+        pos=pg.stack_positions(posdf['pos'])
+        si_i_f_l=np.round(pg.pbc_distances(box,pos[topo.rows(initial_l)],pos[topo.rows(final_l)]),2)
         
         # count=0
         final_configs=[]
-        for index, row in dfc.iterrows():
+        for k, (index, row) in enumerate(dfc.iterrows()):
             f_loc=row['fPos']
-            mover=int(row['id'].split('-')[0])
-            zapped=int(row['id'].split('-')[1])
+            mover=int(pairs.iat[k,0])
+            zapped=int(pairs.iat[k,1])
             cell_origin=row['iPos']
             
-            mid_si=find_movers_neighbor(posdf,mover,zapped)
-            
-            ret=find_initial_final_si(box,posdf,dfc)
-            
-            initial_si=ret[0]
-            final_si=ret[1]
-            
+            mid_si=int(mid_l[k])
+            initial_si=int(initial_l[k])
+            final_si=int(final_l[k])
+            if min(mid_si,initial_si,final_si)<0:
+                print(f'Could not find the initial/mid/final Si of {mover}-{zapped}')
+                continue
             
-            pos_initial_si=posdf.at[initial_si,'pos']
-            pos_final_si=posdf.at[final_si,'pos']
-            si_i_f_dist=round(pbc_dist(box,pos_initial_si,pos_final_si),2)
+            si_i_f_dist=si_i_f_l[k]
             
             
             #final_pair=find_final_si_pair(posdf,box,mover,f_loc=f_loc)
@@ -1758,27 +1399,12 @@ def calc_local_structure(basedf,pair_path,gif=True):
             all_atoms=bad_si + bad_o
             all_neis=[]
             for si in si_neis:
-                si_count=0
-                o_count=0
-                h_count=0
-                blist_i=posdf.at[si,'bonds']
-                cur_atoms=[]
-                #print(blist_i)
-                for b in blist_i:
-                    bi=b[0]
-                    cur_atoms.append(bi)
-                    btype=posdf.at[bi,'type']
-                    if btype=="Si" and bi not in all_atoms:# and b[1]<si_si_bondorder:
-                        si_count+=1
-                        all_atoms.append(bi)
-                    elif btype=="O" and bi not in all_atoms:# and b[1]<si_o_bondorder:
-                        o_count+=1
-                        all_atoms.append(bi)
-                    elif btype=="H" and bi not in all_atoms:#and b[1]<si_h_bondorder:
-                        h_count+=1
-                        all_atoms.append(bi)
-                
-                all_neis.append([si_count,o_count,h_count])
+                #neighbors not already counted for an earlier Si of this pair
+                nids=topo.neighbor_ids(si)
+                new=nids[~np.isin(nids,all_atoms)]
+                all_atoms+=new.tolist()
+                nel=topo.elements[topo.rows(new)]
+                all_neis.append([int(np.sum(nel=="Si")),int(np.sum(nel=="O")),int(np.sum(nel=="H"))])
                     
                     
 
@@ -2550,11 +2176,9 @@ def plot_rangehist(basedf,rlist,type=None,col='FEB',skip=False):
         
         #(posdf,box)=load_data_and_bonds_from_csv(csvfile)
         (posdf,box)=load_data_from_csv(csvfile)
-        if type is not None:
-            posdf=posdf[posdf["type"]==type]
+        sidx=si.get_index(csvfile,posdf,box)
         
         feblist=[]#dfc[col].to_numpy()
-        i=0
         
         if skip:
             skipping=True
@@ -2570,32 +2194,13 @@ def plot_rangehist(basedf,rlist,type=None,col='FEB',skip=False):
                 print(f"Skipping {csvfile}")
                 continue
         
-        for index, row in dfc.iterrows():
-            rowtimestart=time.time()
-            curcol=row[col]
-            pair=row['pair']
-            pos=row['iPos']
-            mover=int(pair.split('-')[0])
-            
-            
-# ##Testing
-#             if row[col] < colranges[1] or row[col]>colranges[2]:
-#                 continue
-# ##Testing
-            #need to load in this csv's data file and look at that dataframe in conjunction with this one
-            distdf=apply_dist_from_pos(posdf,box,pos,type)
-            
-            for radius in rlist:
-                valcol=f'{typename}range{radius}' 
-                df.at[index,valcol]=int(len(distdf[distdf['dist']<radius]))
-                
-            rowtimeend=time.time()
-            if i == 0 and me == 0:
-                rowtime=rowtimeend-rowtimestart
-                esttime=rowtime*len(dfc)
-                if esttime > 10:
-                    print(f"EST total time for this csv: {esttime}")
-                i+=1
+        #every pair and every radius in one query against this data file's spatial index
+        counts=sidx.count_within(pg.stack_positions(dfc['iPos']),rlist,type)
+        for j, radius in enumerate(rlist):
+            valcol=f'{typename}range{radius}' 
+            df.loc[dfc.index,valcol]=counts[:,j]
+        if me == 0:
+            print(f"{len(dfc)} pairs took {time.time()-filetimestart}s")
         
     units=r"$\AA$"
     print("Calculation done, now plotting")
@@ -2627,31 +2232,13 @@ def plot_atominrange(basedf,radius,type=None,col='FEB'):
         dfc=df[df["csvname"]==csvfile]
         (ratio,Hnum)=stats_from_csv_name(csvfile)
         
-        (posdf,box)=load_datafile_from_csv(csvfile)
-        
-        if type is not None:
-            posdf=posdf[posdf["type"]==type]
+        (posdf,box)=load_data_from_csv(csvfile)
+        sidx=si.get_index(csvfile,posdf,box)
         
         
         feblist=[]#dfc[col].to_numpy()
-        i=0
-        for index, row in dfc.iterrows():
-            rowtimestart=time.time()
-            curcol=row[col]
-            pair=row['pair']
-            pos=row['iPos']
-            mover=int(pair.split('-')[0])
-
-            
-            #need to load in this csv's data file and look at that dataframe in conjunction with this one
-            dfc.at[index,'inrange']=atoms_in_radius(posdf,box,pos,radius,type)
-            rowtimeend=time.time()
-            if i == 0 and me == 0:
-                rowtime=rowtimeend-rowtimestart
-                esttime=rowtime*len(dfc)
-                if esttime > 10:
-                    print(f"EST total time for this csv: {esttime}")
-                i+=1
+        #need to load in this csv's data file and look at that dataframe in conjunction with this one
+        dfc=dfc.assign(inrange=sidx.count_within(pg.stack_positions(dfc['iPos']),radius,type)[:,0])
             
 
         
@@ -2770,75 +2357,13 @@ def plot_bondang_vdz(basedf):
     
 def create_bond_angles(atoms,box,type1='O',typeM='Si',type2='O'):
     #create bond angles for a type1-typeM-type2 bond ex: O-Si-O
-    #print(atoms.to_string())
-    t1atoms=atoms[atoms['type']==type1]
-    bangleList=[]
-    
-    for i, row in t1atoms.iterrows():
-        nbonds = row['bonds']
-
-        
-        tmn=[]
-
-        #create the list of type 2
-        for n in nbonds:
-            ni=n[0]
-            bo=n[1]
-            
-            if ni not in atoms.index:
-                continue
-            neitype=atoms.at[ni,'type']
-
-            if neitype == typeM:
-                if bo < SiOBondOrder:
-                    continue
-                tmn.append(ni)
-        
-        #run through the bonds of the middle atom and fill a list with any type 3 neighbors 
-        for tmi in tmn:
-            neibonds = atoms.at[tmi,'bonds']
-            
-            for neib in neibonds:
-                nei=neib[0]
-                neibo=neib[1]
-                
-                if nei not in atoms.index:
-                    continue
-                
-                if neibo < SiOBondOrder:
-                    continue
-
-                if nei ==i:
-                    continue
-                
-                neitype = atoms.at[nei,'type']
-                if neitype != type2:
-                    continue
-
-                
-  
-                p1=[i, tmi, nei]
-                p2=[nei, tmi, i]
-
-                #good pair if it got this far
-                #add this pair to the pair list              
-                if p1 not in bangleList and p2 not in bangleList:
-                    bangleList.append(p1)
-                    
-    #now we have a list of all acceptable bonds
-    retlist=[]
-    for trio in bangleList:
-        i1=trio[0]
-        im=trio[1]
-        i2=trio[2]
-        
-        pos1=atoms.at[i1,'pos']
-        posm=atoms.at[im,'pos']
-        pos2=atoms.at[i2,'pos']
-        (ang,[v1,v2]) = angle_between_pts(box,pos1,pos2,posm)
-        retlist.append((posm,ang[0]))
+    #atoms needs the bonds column, bonds to atoms not in atoms are ignored
+    topo=tp.BondTopology.from_df(atoms)
+    table=ba.bond_angles(topo,pg.stack_positions(atoms['pos']),box,type1,typeM,type2,SiOBondOrder)
 
-    return retlist
+    #old (center position, angle) list
+    posm=atoms.loc[table['center'],'pos'].tolist()
+    return list(zip(posm,table['angle'].tolist()))
         
 
 def plot_all_bondang_vs_atom(basedf,dist,atype="H",maxang=180,all=False,bulk=False):
@@ -2865,32 +2390,36 @@ def plot_all_bondang_vs_atom(basedf,dist,atype="H",maxang=180,all=False,bulk=Fal
         
         
         
-        (posdf,box)=load_data_and_bonds_from_csv(csvfile)
+        (posdf,box,topo)=load_data_and_topology_from_csv(csvfile)
+        pos=pg.stack_positions(posdf['pos'])
+        mask=np.ones(len(posdf),dtype=bool)
         if not all:
-            posdf=posdf[posdf.apply(limit_zpos_iface,axis=1,args=(bulk,'pos',))]
+            #same region split as limit_zpos_iface
+            inside=(pos[:,2]>17)&(pos[:,2]<30)
+            mask=inside if bulk else ~inside
+            posdf=posdf[mask]
         
-        bondAngleL=create_bond_angles(posdf,box)
+        angtable=ba.bond_angles(topo,pos,box,'O','Si','O',SiOBondOrder,mask)
+        bondAngleL=list(zip(pos[topo.rows(angtable['center'])],angtable['angle']))
         print(len(bondAngleL))
         
+        #count the atype atoms around every bond angle center in one query
+        sidx=si.index_from_df(posdf,box)
+        if len(bondAngleL)>0:
+            bacounts=sidx.count_within(pos[topo.rows(angtable['center'])],dist,atype)[:,0]
+        
         #dfc=angle_between_pts_df(dfc,valcol)
         #dfc=dfc.apply(vz_idz,axis=1)
         #dfc=dfc[dfc[valcol]<maxang]
         
-        for ba in bondAngleL:
+        for k, bang in enumerate(bondAngleL):
             
-            pos=ba[0]
-            an=ba[1]
+            an=bang[1]
             # if an > maxang:
             #     continue
             #print("plot_bondang_vdz on "+ str(csvfile)
             
-            #fulldf=apply_dist_from_pos(dfc,box,pos,col='iPos')
-            hdist=apply_dist_from_pos(posdf,box,pos,atype)
-            
-            numH=0
-            for ind, row in hdist.iterrows():
-                if row['type']==atype and row['dist']<dist:
-                    numH+=1
+            numH=int(bacounts[k])
             
             
             #angdf=fulldf[fulldf[valcol]<maxang]
@@ -3337,157 +2866,43 @@ def check_convergenc():
         plt.title('Forward energy barrier for different energy tolerances and timesteps')
     
 
-def working_recursive_fun(df, og, path=[], debug=False):
-    max_depth=5
-    depth=len(path)
-    if depth > max_depth:
-        return [depth, path]
-    
-    curatom = og if depth == 0 else path[-1]
-    
-    curblist=df.at[curatom,'bonds']
-    bonds=[item[0] for item in curblist]
-    
-    if debug:
-        print(f'depth {depth} - Atom {curatom} has {bonds} bonded to it, path:{path}')
-    
-    if og in bonds and depth != 1:
-        return [depth, path]
-    
-    minpath=None
-    mindepth=max_depth
-    for b in curblist:
-        bi=b[0]
-        newpath=path+[bi]
-        
-        ret=recursive_fun(df,og,newpath)
-        
-        if ret is not None and ret[0]< mindepth:
-            mindepth=ret[0]
-            minpath=ret[1]
-     
-    return [mindepth, minpath]
-
-
-def double_recursive_fun(df, og,debug=False):
-    
-    ret1=recursive_fun(df,og)
-
-    ret2=recursive_fun(df,og,[],ret1[1])
-
-    if ret1[0]!=ret2[0]:
-        print(f"{og} path1:{ret1} path2:{ret2}")
-    return (ret1[0]+ret2[0])/2
-    
-        
-def recursive_fun(df, og, path=[], badpaths=[],debug=False):
-    max_depth=100
-    depth=len(path)
-    if depth > max_depth:
-        return [depth, path]
-    
-    curatom = og if depth == 0 else path[-1]
-    
-    curblist=df.at[curatom,'bonds']
-    bonds=[item[0] for item in curblist]
-    
-    if debug:
-        print(f'depth {depth} - Atom {curatom} has {bonds} bonded to it, path:{path} badpath{badpaths}')
-    
-    if og in bonds and depth != 1:
-        return [depth, path]
-    
-    minpath=None
-    mindepth=max_depth
-    for b in curblist:
-        bi=b[0]
-        newpath=path+[bi]
-        
-        ret=recursive_fun(df,og,newpath)
-        
-        if ret is not None and ret[0]< mindepth:
-            good=True
-            for b in badpaths:
-                if ret[1]==badpaths:
-                    good=False
-            if good:
-                mindepth=ret[0]
-                minpath=ret[1]
-     
-    return [mindepth, minpath]
-
-# from scipy.sparse import csr_matrix
-# import networkx as nx
-
-# def sparse_graph(df):     
-#     csvlist=df["csvname"].unique()
-
-#     for csvfile in csvlist:
-
-#         print(csvfile)
-
-
-#         dfc=df[df["csvname"]==csvfile]
-
-#         (bonddf,box)=load_data_and_bonds_from_csv(csvfile)
-        
-#         numatoms=len(bonddf)
-        
-#         sg=nx.Graph()
-
-#         for i in range(1,numatoms+1):
-#             bonds=bonddf.at[i,"bonds"]
-#             bl=[]
-#             sg.add_node(i)
-#             for b in bonds:
-#                 if b[0] != i:
-#                     sg.add_edge(i,b[0])
-        
-        
-#         sg.add_edge(1,2)
-#         sg.add_edge(2,3)
-#         sg.add_edge(1,3)
-#         # for s in sg.edges:
-#         #     print(s)
-        
-#         #print(list(nx.edge_dfs(sg,5)))
-        
-#         tstart=time.time()
-#         # for s in sg.nodes:
-#         ti=time.time()
-#         cycle=nx.find_cycle(sg,10,orientation='reverse')
-#         # for start_node in sg.nbunch_iter(s):
-#         #     print(start_node)
-#         l=list(cycle)
-#         tf=time.time()
-#         print(f"){l} took {tf-ti}s")
-            
-            
-
-
-#         return
-            
-# def get_path(Pr, i, j):
-#     path = [j]
-#     k = j
-#     while Pr[i, k] != -9999:
-#         path.append(Pr[i, k])
-#         k = Pr[i, k]
-#     return path[::-1]
+#primitive ring statistics through the O atoms of every pair (RingStats), one ring search
+#per structure over just the movers and zapped O. Adds smallest/mean ring size and ring count
+#(sizes in atoms, nan when no ring up to maxsize) for both O of the pair.
+def calc_ring_stats(basedf,maxsize=12,nproc=None):
+    df=basedf.copy()
+    for c in ['ring_min','ring_mean','ring_num','zring_min','zring_mean','zring_num']:
+        df[c]=np.nan
+    csvlist=df["csvname"].unique()
 
+    for csvfile in csvlist:
+        print("calc_ring_stats on "+ str(csvfile))
+        sel=df["csvname"]==csvfile
+        (posdf,box,topo)=load_data_and_topology_from_csv(csvfile)
+        pairs=df.loc[sel,'id'].str.split('-',expand=True).astype(int)
+        movers=pairs[0].to_numpy()
+        zapped=pairs[1].to_numpy()
+
+        table=rs.ring_table(topo,np.unique(np.concatenate([movers,zapped])),maxsize,nproc)
+        (mn,mean,num)=rs.ring_summary(table,movers,maxsize)
+        df.loc[sel,'ring_min']=mn
+        df.loc[sel,'ring_mean']=mean
+        df.loc[sel,'ring_num']=num
+        (mn,mean,num)=rs.ring_summary(table,zapped,maxsize)
+        df.loc[sel,'zring_min']=mn
+        df.loc[sel,'zring_mean']=mean
+        df.loc[sel,'zring_num']=num
+    return df
 
-# def find_rings(g,ring_size):
 
-#     D,Pr =csg.shortest_path(g,directed=False, return_predecessors=True)
-    
-    
-#     for r in range(1,4):
-#         inds=list(zip(*np.where(D==r)))
+#ring size distribution of a whole structure and the smallest/mean ring through each atom
+def structure_ring_stats(csvname,maxsize=12,nproc=None):
+    (posdf,box,topo)=load_data_and_topology_from_csv(csvname)
+    table=rs.ring_table(topo,None,maxsize,nproc)
+    (mn,mean,num)=rs.ring_summary(table,topo.ids,maxsize)
+    atomdf=pd.DataFrame({'type':topo.elements,'ring_min':mn,'ring_mean':mean,'ring_num':num},index=topo.ids)
+    return (rs.ring_distribution(table,maxsize),atomdf)
 
-#         for i in inds:
-#             print(get_path(Pr,i[0],i[1]))
-        
-        
 
 if __name__ == "__main__":       
         
@@ -3512,19 +2927,8 @@ if __name__ == "__main__":
     # #     #df=dist_from_df(setdf,False)
     # #     csvname=csvlist[0].split('/')[-1].removesuffix('.csv')
         
-    # #     (posdf,box)=load_datafile_from_csv(csvname)
-
-    # #     depthlist=[]
-    # #     for index, row in posdf.iterrows():
-    # #         if row['type']=='O':
-    # #             path=double_recursive_fun(posdf,index)
-    # #             if path is not None:
-    # #                 depthlist.append(path)
-
-    # #             # path=recursive_fun(posdf,index)
-    # #             # if path is not None:
-    # #             #     depthlist.append(len(path))
-            
+    # #     (dist,atomdf)=structure_ring_stats(csvname)
+    # #     depthlist=atomdf[atomdf.type=='O']['ring_mean'].dropna()
         
     # #     print(np.mean(depthlist))
     # #     print(np.min(depthlist))
@@ -3570,7 +2974,7 @@ if __name__ == "__main__":
     #             cleanlist.append(str(d))        
     #         cleandf=clean_csvs(cleanlist,gpath)
             
-    #         #nt.clean_pairfiles(cleandf,pairspath)
+    #         #finished pairs: python Ledger.py import/filter (Ledger.py)
     #     else:
     #         csvlist=[]
     #         i=0
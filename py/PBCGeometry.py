@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+import numpy as np
+
+#Batched minimum image geometry for orthogonal periodic boxes. simbox is always
+#[[xlo,xhi],[ylo,yhi],[zlo,zhi]]. Point arguments may be a single (3,) point or an
+#(N,3) array, they broadcast against each other like plain numpy arithmetic so one
+#call covers point-to-point, point-to-everything and row-by-row pairs.
+
+
+def box_lengths(simbox):
+    simbox=np.asarray(simbox,dtype=np.float64)
+    return simbox[:,1]-simbox[:,0]
+
+
+#a DataFrame column (or list) of 3-vectors as one (N,3) float array
+def stack_positions(col):
+    if hasattr(col,'tolist'):
+        col=col.tolist()
+    return np.array(col,dtype=np.float64).reshape(-1,3)
+
+
+#displacement(s) folded into [-L/2,L/2] in every dimension
+def min_image(d,simbox):
+    L=box_lengths(simbox)
+    return d-L*np.round(d/L)
+
+
+#minimum image vector(s) pointing from a to b (b-a)
+def pbc_vectors(simbox,a,b):
+    a=np.asarray(a,dtype=np.float64)
+    b=np.asarray(b,dtype=np.float64)
+    return min_image(b-a,simbox)
+
+
+def pbc_distances(simbox,a,b):
+    return np.linalg.norm(pbc_vectors(simbox,a,b),axis=-1)
+
+
+#midpoint(s) across the boundary, same convention as the old NEBTools.pbc_midpoint:
+#the lower coordinate is moved up one box length so the result can sit past the upper edge
+def pbc_midpoints(simbox,a,b):
+    a=np.asarray(a,dtype=np.float64)
+    b=np.asarray(b,dtype=np.float64)
+    L=box_lengths(simbox)
+    wrap=np.abs(b-a)>L/2
+    return (a+b+np.where(wrap,L,0))/2
+
+
+#positions moved back into the box
+def pbc_wrap(simbox,pos):
+    simbox=np.asarray(simbox,dtype=np.float64)
+    lo=simbox[:,0]
+    L=box_lengths(simbox)
+    return lo+np.mod(np.asarray(pos,dtype=np.float64)-lo,L)
+
+
+#perpendicular distance of every point to the line through p1 and p2 and the projection
+#parameter t along it (0 at p1, 1 at p2), all minimum image vectors. Points with t in
+#[0,1] and a small distance sit in a cylinder around the p1->p2 path. nan where p1==p2.
+def pbc_point_segment(simbox,p1,p2,points):
+    p1=np.asarray(p1,dtype=np.float64)
+    p2=np.asarray(p2,dtype=np.float64)
+    points=np.asarray(points,dtype=np.float64)
+    vec1=pbc_vectors(simbox,p1,p2)
+    vec2=pbc_vectors(simbox,p1,points)
+    l2=np.sum(vec1*vec1,axis=-1)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        t=np.sum(vec1*vec2,axis=-1)/l2
+        perp=np.linalg.norm(np.cross(vec1,vec2),axis=-1)/np.sqrt(l2)
+    return (perp,t)
+
+
+#mask of the points within radius of the p1->p2 segment's line and between tmin and tmax along it
+def within_cylinder(simbox,p1,p2,points,radius,tmin=0,tmax=1):
+    (perp,t)=pbc_point_segment(simbox,p1,p2,points)
+    return (perp<radius)&(t>=tmin)&(t<=tmax)
+
+
+#distance of every point to the infinite line through p1 and p2 (minimum image vectors),
+#nan where a point sits on p1/p2 or p1==p2 like the old None return
+def pbc_point_line_distances(simbox,p1,p2,points):
+    p1=np.asarray(p1,dtype=np.float64)
+    p2=np.asarray(p2,dtype=np.float64)
+    points=np.asarray(points,dtype=np.float64)
+    dist=pbc_point_segment(simbox,p1,p2,points)[0]
+    bad=np.all(points==p1,axis=-1)|np.all(points==p2,axis=-1)|np.all(p1==p2,axis=-1)
+    return np.where(bad,np.nan,dist)
+
+#orthonormal in-plane basis (e1,e2) of plane(s) with the given normal(s): e1 is (-ny,nx,0)
+#normalized, or x when the normal is along z, and e2=n x e1 so (e1,e2,n) is right handed
+def plane_basis(normal):
+    n=np.asarray(normal,dtype=np.float64)
+    n=n/np.linalg.norm(n,axis=-1,keepdims=True)
+    e1=np.stack([-n[...,1],n[...,0],np.zeros(n.shape[:-1])],axis=-1)
+    l=np.linalg.norm(e1,axis=-1,keepdims=True)
+    flat=l[...,0]<1e-12
+    e1=np.where(flat[...,None],np.array([1.0,0,0]),e1/np.where(l>0,l,1))
+    e2=np.cross(n,e1)
+    return (e1,e2)
+
+
+#points center+r*(cos(a)*e1+sin(a)*e2) for every radius and angle (radians), shape (nr,na,3)
+def plane_points(center,normal,radii,angles):
+    (e1,e2)=plane_basis(normal)
+    r=np.atleast_1d(np.asarray(radii,dtype=np.float64))[:,None,None]
+    a=np.atleast_1d(np.asarray(angles,dtype=np.float64))[None,:,None]
+    return np.asarray(center,dtype=np.float64)+r*(np.cos(a)*e1+np.sin(a)*e2)
+
+
+#signed angle (radians, from e1 towards e2 of plane_basis) of every point's minimum image
+#projection onto the plane through plane_point, nan where a point projects onto plane_point
+def angle_in_plane(simbox,plane_point,normal,points):
+    (e1,e2)=plane_basis(normal)
+    d=pbc_vectors(simbox,plane_point,points)
+    x=d@e1
+    y=d@e2
+    return np.where((np.abs(x)<1e-12)&(np.abs(y)<1e-12),np.nan,np.arctan2(y,x))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+import numpy as np
+import pandas as pd
+import glob
+import heapq
+import os
+from scipy.spatial import cKDTree
+
+import NEBLog as nl
+import NEBResults as nr
+
+#Cost aware splitting of pair lists into farm job chunks. The cost of a pair is the number
+#of NEB iterations (regular + climbing stage, every NEB of the pair) its earlier runs took,
+#read from the results stores and the NEB logs of their output folders. New pairs get the
+#mean cost of the k most similar historical pairs, similarity being the distance between
+#the local environments (LocalEnv descriptors) of mover and destination. Without history
+#the hop length is used. Chunks are then packed longest job first onto the least loaded
+#chunk (LPT), which keeps the longest chunk within 4/3 of the best possible.
+
+default_features=('z','depth','nSi','nO','nH','Atomsrange4','SiO_len','OSiO_ang')
+
+
+#NEB iterations of one log, nan when the log is missing or has no table
+def log_iterations(file):
+    try:
+        log=nl.read_neb_log(file,full=False)
+    except OSError:
+        return np.nan
+    if log.final_step is None:
+        return np.nan
+    return float(log.final_step)
+
+
+#structure name of a results store ('<datafile>.results')
+def store_structure(store):
+    return os.path.basename(os.path.normpath(store)).removesuffix('.results')
+
+
+#one row per (structure, pair) of the given results stores with the mean cost over its
+#runs. Logs are looked up in output_root/<run>/logs/<identifier>-*.log.
+def history_table(stores,output_root):
+    if isinstance(stores,str):
+        stores=[stores]
+    rows=[]
+    for store in stores:
+        arr=nr.load_arrays(store)
+        structure=store_structure(store)
+        for r in arr:
+            logs=glob.glob(os.path.join(output_root,str(r['run']),'logs',f"{r['id']}-*.log"))
+            it=np.nansum([log_iterations(f) for f in logs]) if len(logs)>0 else np.nan
+            rows.append((structure,str(r['pair']),str(r['run']),it,bool(r['fail'])))
+    df=pd.DataFrame(rows,columns=['structure','pair','run','cost','fail'])
+    df=df.dropna(subset=['cost'])
+    #all NEBs of one run make up the job, runs of the same pair are averaged
+    df=df.groupby(['structure','pair','run'],as_index=False).agg(cost=('cost','sum'),fail=('fail','max'))
+    df=df.groupby(['structure','pair'],as_index=False).agg(cost=('cost','mean'),fail=('fail','max'))
+    ids=df['pair'].str.split('-',expand=True)
+    df['mover']=pd.to_numeric(ids[0],errors='coerce').fillna(-1).astype(np.int64)
+    df['zapped']=pd.to_numeric(ids[1],errors='coerce').fillna(-1).astype(np.int64) if ids.shape[1]>1 else -1
+    return df
+
+
+#feature rows of pairs from a descriptor table (indexed by id): the mover's descriptors next
+#to the destination's, the mover's own where there is no destination atom (-1)
+def pair_features(desc,movers,dests,columns=default_features):
+    columns=[c for c in columns if c in desc.columns]
+    movers=np.asarray(movers,dtype=np.int64)
+    dests=np.asarray(dests,dtype=np.int64)
+    dests=np.where(dests>=0,dests,movers)
+    d=desc[columns]
+    return np.hstack([d.reindex(movers).to_numpy(dtype=np.float64),d.reindex(dests).to_numpy(dtype=np.float64)])
+
+
+#features of a history table, descs maps structure name -> descriptor table
+def history_features(hist,descs,columns=default_features):
+    feat=None
+    for s, g in hist.groupby('structure'):
+        if s not in descs:
+            continue
+        f=pair_features(descs[s],g['mover'],g['zapped'],columns)
+        if feat is None:
+            feat=np.full((len(hist),f.shape[1]),np.nan)
+        feat[hist.index.get_indexer(g.index)]=f
+    return feat
+
+
+#mean cost of the k nearest historical pairs in standardized feature space (inverse distance
+#weighted), nan for pairs without usable features
+def estimate_costs(feat,hfeat,hcost,k=5):
+    feat=np.asarray(feat,dtype=np.float64)
+    est=np.full(len(feat),np.nan)
+    if hfeat is None or len(feat)==0:
+        return est
+    hcost=np.asarray(hcost,dtype=np.float64)
+    ok=np.all(np.isfinite(hfeat),axis=1)&np.isfinite(hcost)
+    if not ok.any():
+        return est
+    hfeat=hfeat[ok]
+    hcost=hcost[ok]
+    mu=hfeat.mean(axis=0)
+    sd=hfeat.std(axis=0)
+    sd[sd==0]=1
+    q=np.all(np.isfinite(feat),axis=1)
+    k=min(k,len(hcost))
+    (d,i)=cKDTree((hfeat-mu)/sd).query((feat[q]-mu)/sd,k=k)
+    d=d.reshape(-1,k)
+    i=i.reshape(-1,k)
+    w=1/(d+1e-6)
+    est[q]=np.sum(w*hcost[i],axis=1)/np.sum(w,axis=1)
+    return est
+
+
+#estimated costs where there are any, the rest scaled from the hop length (size fallback)
+def fill_costs(est,hop):
+    est=np.asarray(est,dtype=np.float64).copy()
+    hop=np.asarray(hop,dtype=np.float64)
+    hop=np.where(np.isfinite(hop)&(hop>0),hop,np.nanmedian(hop) if np.isfinite(hop).any() else 1.0)
+    known=np.isfinite(est)
+    if not known.any():
+        return hop
+    scale=np.median(est[known])/max(np.median(hop[known]),1e-12)
+    est[~known]=hop[~known]*scale
+    return est
+
+
+#index arrays of nchunks chunks, longest pair first onto the least loaded chunk. Pairs keep
+#their input order inside a chunk. Equal costs give chunk sizes that differ by at most one.
+def balanced_chunks(costs,nchunks):
+    costs=np.asarray(costs,dtype=np.float64)
+    order=np.argsort(-costs,kind='stable')
+    heap=[(0.0,c) for c in range(nchunks)]
+    owner=np.zeros(len(costs),dtype=np.int64)
+    for i in order:
+        (load,c)=heapq.heappop(heap)
+        owner[i]=c
+        heapq.heappush(heap,(load+costs[i],c))
+    return [np.nonzero(owner==c)[0] for c in range(nchunks)]
+
+
+def chunk_loads(costs,chunks):
+    costs=np.asarray(costs,dtype=np.float64)
+    return np.array([costs[c].sum() for c in chunks])
@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+import numpy as np
+import os
+import shutil
+import string
+
+import PBCGeometry as pg
+import Topology as tp
+import SpatialIndex as si
+import PairCost as pcost
+import Ledger as lg
+import StructCache as sc
+
+#One pass pair generation for NEB pair lists. A PairContext holds one structure (CSR
+#topology, positions in topology row order, box). Candidate tables are built once per kind
+#and shared by every pair set of that structure:
+#    zap  - O-Si-O pairs (mover,zapped), each unordered pair once, mover closer to the interface
+#    oh   - O bonded to exactly one Si and one H, with the O across that Si (mover,zapped,h)
+#    bc   - O with every unbridged Si-Si bond center next to it (mover,si1,si2,target)
+#A PairSet is a kind plus a chain of filters. Each filter maps (ctx,cand) to a keep mask over
+#the candidate rows and runs on whole arrays, so a set is a handful of numpy passes.
+
+lowerletters=list(string.ascii_lowercase)
+
+pairdtype=np.dtype([('mover',np.int64),('zapped',np.int64),('h',np.int64),('si1',np.int64),
+                    ('si2',np.int64),('target',np.float64,(3,))])
+
+
+#vectorized closer_pair: True where a is closer than b to one of the two interfaces
+def closer_pairs(apos,bpos):
+    i1=16
+    i2=32
+    az=np.asarray(apos,dtype=np.float64)[:,2]
+    bz=np.asarray(bpos,dtype=np.float64)[:,2]
+    az=np.where(az<8,az+32,az)
+    bz=np.where(bz<8,bz+32,bz)
+    amin=np.minimum(np.abs(az-i1),np.abs(i2-az))
+    bmin=np.minimum(np.abs(bz-i1),np.abs(i2-bz))
+    return amin<bmin
+
+
+#first occurrence of every unordered (a,b) row pair, in input order
+def first_unordered(a,b,n):
+    key=np.minimum(a,b)*n+np.maximum(a,b)
+    return np.sort(np.unique(key,return_index=True)[1])
+
+
+def empty_candidates(m=0):
+    z=np.full(m,-1,dtype=np.int64)
+    return {'mover':z.copy(),'zapped':z.copy(),'h':z.copy(),'si1':z.copy(),'si2':z.copy(),
+            'target':np.full((m,3),np.nan)}
+
+
+class PairContext:
+
+    def __init__(self,topo,pos,simbox,bo_cut=0.9):
+        self.topo=topo
+        self.pos=np.asarray(pos,dtype=np.float64)
+        self.simbox=np.asarray(simbox,dtype=np.float64)
+        self.bo_cut=bo_cut
+        self._cands={}
+        self._counts=None
+        self._index=None
+
+    #Si/O/H neighbor counts of every row (all bonds, any order)
+    @property
+    def counts(self):
+        if self._counts is None:
+            self._counts=tp.type_counts(self.topo,self.topo.ids,('Si','O','H'))
+        return self._counts
+
+    #periodic KD-tree of the structure, built on first use
+    @property
+    def index(self):
+        if self._index is None:
+            self._index=si.PeriodicIndex(self.pos,self.simbox,labels=self.topo.ids,types=self.topo.elements)
+        return self._index
+
+    def candidates(self,kind):
+        if kind not in self._cands:
+            self._cands[kind]=candidate_kinds[kind](self)
+        return self._cands[kind]
+
+
+def zap_candidates(ctx):
+    topo=ctx.topo
+    orows=np.nonzero(topo.is_type('O'))[0]
+    (owner,nid)=tp.second_shell(topo,topo.ids[orows],'O','Si',ctx.bo_cut)
+    a=orows[owner]
+    b=topo.rows(nid)
+    first=first_unordered(a,b,topo.natoms)
+    a=a[first]
+    b=b[first]
+    closer=closer_pairs(ctx.pos[a],ctx.pos[b])
+    c=empty_candidates(len(a))
+    c['mover']=np.where(closer,a,b)
+    c['zapped']=np.where(closer,b,a)
+    return c
+
+
+def oh_candidates(ctx):
+    topo=ctx.topo
+    cnt=ctx.counts
+    orows=np.nonzero(topo.is_type('O')&(cnt[:,0]==1)&(cnt[:,2]==1))[0]
+    (owner,nid)=tp.second_shell(topo,topo.ids[orows],'O','Si',ctx.bo_cut)
+    a=orows[owner]
+    b=topo.rows(nid)
+    #ordered pairs, each once
+    key=a*topo.natoms+b
+    first=np.sort(np.unique(key,return_index=True)[1])
+    (ho,hid)=tp.neighbors_of_type(topo,topo.ids[orows],'H')
+    hrow=np.full(topo.natoms,-1,dtype=np.int64)
+    hrow[orows[ho]]=topo.rows(hid)
+    c=empty_candidates(len(first))
+    c['mover']=a[first]
+    c['zapped']=b[first]
+    c['h']=hrow[a[first]]
+    return c
+
+
+def bc_candidates(ctx):
+    topo=ctx.topo
+    orows=np.nonzero(topo.is_type('O'))[0]
+    (owner,si1,si2)=tp.bond_center_pairs(topo,topo.ids[orows])
+    c=empty_candidates(len(owner))
+    c['mover']=orows[owner]
+    c['si1']=topo.rows(si1)
+    c['si2']=topo.rows(si2)
+    p1=ctx.pos[c['si1']]
+    c['target']=p1+pg.pbc_vectors(ctx.simbox,p1,ctx.pos[c['si2']])/2
+    return c
+
+
+candidate_kinds={'zap':zap_candidates,'oh':oh_candidates,'bc':bc_candidates}
+
+
+def select(c,mask):
+    return {k:v[mask] for k, v in c.items()}
+
+
+#rows of one role of the candidates ('mover','zapped','h','si1','si2')
+def role_pos(ctx,c,which):
+    if which=='target':
+        return c['target']
+    return ctx.pos[c[which]]
+
+
+#separation vectors from the pinhole center, axial=True measures from the pinhole axis
+#(the center moved to each point's own z)
+def center_sep(ctx,center,points,axial=False):
+    centers=np.tile(np.asarray(center,dtype=np.float64),(len(points),1))
+    if axial:
+        centers[:,2]=points[:,2]
+    return pg.pbc_vectors(ctx.simbox,centers,points)
+
+
+#point movedist out from the pinhole center through each mover
+def push_points(ctx,c,center,movedist,axial=False):
+    mpos=ctx.pos[c['mover']]
+    sep=center_sep(ctx,center,mpos,axial)
+    return mpos+sep/np.linalg.norm(sep,axis=1)[:,None]*movedist
+
+
+#Filters. Each returns f(ctx,cand) -> keep mask.
+
+def species(el,which='mover'):
+    def f(ctx,c):
+        return ctx.topo.is_type(el)[c[which]]
+    return f
+
+
+#no H bonded to any of the listed atoms
+def no_h(which=('mover','zapped')):
+    def f(ctx,c):
+        keep=np.ones(len(c['mover']),dtype=bool)
+        for w in which:
+            r=c[w]
+            keep&=(r<0)|(ctx.counts[np.maximum(r,0),2]==0)
+        return keep
+    return f
+
+
+#no H atom within r of the listed atoms
+def h_proximity(r,which=('mover',)):
+    def f(ctx,c):
+        keep=np.ones(len(c['mover']),dtype=bool)
+        if not ctx.topo.is_type('H').any():
+            return keep
+        for w in which:
+            d=ctx.index.query_knn(role_pos(ctx,c,w),1,'H')[0][:,0]
+            keep&=d>=r
+        return keep
+    return f
+
+
+#lo<=z<=hi (closed) or lo<z<hi, either bound may be None
+def zwindow(lo=None,hi=None,which='mover',closed=True):
+    def f(ctx,c):
+        z=role_pos(ctx,c,which)[:,2]
+        keep=np.ones(len(z),dtype=bool)
+        if lo is not None:
+            keep&=(z>=lo) if closed else (z>lo)
+        if hi is not None:
+            keep&=(z<=hi) if closed else (z<hi)
+        return keep
+    return f
+
+
+#rmin<distance from the pinhole center (or axis)<rmax, either bound may be None
+def shell(center,rmin=None,rmax=None,axial=False,which='mover'):
+    def f(ctx,c):
+        p=role_pos(ctx,c,which)
+        d=np.linalg.norm(center_sep(ctx,center,p,axial),axis=1)
+        keep=np.ones(len(d),dtype=bool)
+        if rmin is not None:
+            keep&=d>rmin
+        if rmax is not None:
+            keep&=d<rmax
+        return keep
+    return f
+
+
+#mover->dest direction relative to the interface normal (z): 'perp' keeps hops within tol
+#degrees of the normal, 'parallel' within tol degrees of the interface plane
+def direction(mode,tol,dest='zapped'):
+    def f(ctx,c):
+        v=pg.pbc_vectors(ctx.simbox,ctx.pos[c['mover']],role_pos(ctx,c,dest))
+        ang=np.degrees(np.arccos(np.clip(np.abs(v[:,2])/np.linalg.norm(v,axis=1),0,1)))
+        if mode=='perp':
+            return ang<=tol
+        return 90-ang<=tol
+    return f
+
+
+#destination at least as far from the pinhole center (or axis) as the mover
+def away_from(center,dest='zapped',axial=False):
+    def f(ctx,c):
+        dm=np.linalg.norm(center_sep(ctx,center,ctx.pos[c['mover']],axial),axis=1)
+        dd=np.linalg.norm(center_sep(ctx,center,role_pos(ctx,c,dest),axial),axis=1)
+        return dd>=dm
+    return f
+
+
+#per mover only the candidate whose target is nearest the point movedist further out
+#from the pinhole (first one on ties)
+def nearest_to_push(center,movedist,axial=False):
+    def f(ctx,c):
+        fpos=push_points(ctx,c,center,movedist,axial)
+        d=pg.pbc_distances(ctx.simbox,c['target'],fpos)
+        order=np.lexsort((np.arange(len(d)),d,c['mover']))
+        first=np.ones(len(order),dtype=bool)
+        first[1:]=c['mover'][order][1:]!=c['mover'][order][:-1]
+        keep=np.zeros(len(d),dtype=bool)
+        keep[order[first]]=True
+        return keep
+    return f
+
+
+#angle at the mover between the outward push point and the target at most maxang degrees
+def push_angle(center,movedist,maxang,axial=False):
+    def f(ctx,c):
+        fpos=push_points(ctx,c,center,movedist,axial)
+        mpos=ctx.pos[c['mover']]
+        v1=pg.pbc_vectors(ctx.simbox,mpos,fpos)
+        v2=pg.pbc_vectors(ctx.simbox,mpos,c['target'])
+        cos=np.einsum('ij,ij->i',v1,v2)/(np.linalg.norm(v1,axis=1)*np.linalg.norm(v2,axis=1))
+        return np.degrees(np.arccos(np.clip(cos,-1,1)))<=maxang
+    return f
+
+
+#a named pair set: candidate kind, filter chain and the columns its pair file holds
+class PairSet:
+
+    def __init__(self,name,kind,filters=(),fields=('mover','zapped')):
+        self.name=name
+        self.kind=kind
+        self.filters=list(filters)
+        self.fields=tuple(fields)
+
+    def apply(self,ctx):
+        c=ctx.candidates(self.kind)
+        for f in self.filters:
+            if len(c['mover'])==0:
+                break
+            c=select(c,f(ctx,c))
+        return c
+
+
+def all_zap_set():
+    return PairSet('all_zap','zap',[no_h()])
+
+def oh_set():
+    return PairSet('oh','oh',[],('mover','zapped','h'))
+
+def pinhole_edge_set(center,minRad=7,maxRad=12,movedist=3,ifacez=15,maxz=27,maxang=50):
+    return PairSet('pinhole_edge','bc',[zwindow(ifacez+movedist,maxz),shell(center,minRad,maxRad,axial=True),
+                                        no_h(('mover',)),nearest_to_push(center,movedist,True),
+                                        push_angle(center,movedist,maxang,True)],('mover','target'))
+
+def pinhole_center_out_set(center,minRad=7,maxRad=12,movedist=3,ifacez=15):
+    return PairSet('pinhole_center_out','bc',[zwindow(ifacez+movedist),shell(center,minRad,maxRad),no_h(('mover',))],
+                   ('mover','si1','si2'))
+
+def all_O_neighbors_set(center,maxRad=12,zlo=17,zhi=30):
+    return PairSet('all_O_neighbors','bc',[shell(center,None,maxRad),zwindow(zlo,zhi,closed=False)],
+                   ('mover','target','si1','si2'))
+
+
+set_factories={'all_zap':all_zap_set,'oh':oh_set,'pinhole_edge':pinhole_edge_set,
+               'pinhole_center_out':pinhole_center_out_set,'all_O_neighbors':all_O_neighbors_set}
+
+#pair sets from a picklable spec so they can be rebuilt in worker processes: a set name,
+#'name@x,y,z' for the pinhole sets (the pinhole center, 'name@auto' for the given detected
+#center) or (name, kwargs)
+def make_sets(spec,center=None):
+    sets=[]
+    for s in spec:
+        if isinstance(s,PairSet):
+            sets.append(s)
+            continue
+        kw={}
+        if not isinstance(s,str):
+            (s,kw)=s
+        elif '@' in s:
+            (s,c)=s.split('@')
+            kw={'center':center if c=='auto' else [float(v) for v in c.split(',')]}
+        sets.append(set_factories[s](**kw))
+    return sets
+
+
+#candidates as a typed pair array of atom ids (-1 where a role is unused)
+def to_pairs(ctx,c):
+    pairs=np.zeros(len(c['mover']),dtype=pairdtype)
+    for k in ('mover','zapped','h','si1','si2'):
+        r=c[k]
+        pairs[k]=np.where(r>=0,ctx.topo.ids[np.maximum(r,0)],-1)
+    pairs['target']=c['target']
+    return pairs
+
+
+#every set of one structure from the shared candidate tables, {name: pairs}
+def generate(ctx,sets):
+    ret={}
+    for s in sets:
+        ret[s.name]=to_pairs(ctx,s.apply(ctx))
+    return ret
+
+
+def format_pair(p,fields):
+    parts=[]
+    for f in fields:
+        if f=='target':
+            parts+=[str(float(v)) for v in p['target']]
+        else:
+            parts.append(str(int(p[f])))
+    return ' '.join(parts)
+
+
+#mover to destination (zapped atom or target point) distance of every pair, nan without either
+def hop_lengths(ctx,pairs):
+    m=ctx.topo.rows(pairs['mover'])
+    dest=np.array(pairs['target'],dtype=np.float64)
+    z=pairs['zapped']>=0
+    dest[z]=ctx.pos[ctx.topo.rows(pairs['zapped'][z])]
+    return pg.pbc_distances(ctx.simbox,ctx.pos[m],dest)
+
+
+#pair list files in datapath+distDir, split ways (a-, b-, ... prefixes), each with a copy
+#of the data file next to it. With costs the chunks are balanced on them (PairCost),
+#otherwise on the pair count. With a ledger folder (Ledger, True for the one the farm
+#scripts use next to the written pair lists) pairs that are done or still running are left
+#out and the written ones are recorded as pending.
+def write_pair_files(datapath,dfile,distDir,pairs,fields,split=1,costs=None,ledger=None):
+    filename=dfile.removesuffix('.dat').removesuffix('.data').removesuffix('.dump')
+    if not os.path.exists(datapath+distDir):
+        os.mkdir(datapath+distDir)
+
+    lines=[format_pair(p,fields) for p in pairs]
+    if costs is None:
+        costs=np.ones(len(pairs))
+    costs=np.asarray(costs,dtype=np.float64)
+    if ledger is True:
+        ledger=lg.ledger_path(datapath+distDir+dfile)
+    if ledger is not None:
+        key=sc.file_key(datapath+dfile)
+        keep=lg.unfinished(ledger,key,lines)
+        print(f"{len(lines)-int(keep.sum())} pairs already finished or running according to the ledger")
+        lines=[l for l, k in zip(lines,keep) if k]
+        costs=costs[keep]
+        lg.record(ledger,key,lines,'pending')
+
+    chunks=pcost.balanced_chunks(costs,split)
+    loads=pcost.chunk_loads(costs,chunks)
+    for i in range(split):
+        presplit=""
+        if split>1:
+            presplit=lowerletters[i]
+        pairname=presplit+filename+"-pairlist.txt"
+        pairfile=datapath+distDir+pairname
+
+        shutil.copyfile(datapath+dfile, datapath+distDir+presplit+dfile)
+
+        with open(pairfile,"w") as tf:
+            for j in chunks[i]:
+                tf.write(lines[j]+"\n")
+        print(f"{len(chunks[i])} total pairs added to the file {pairname}, estimated cost {loads[i]:.4g}.")
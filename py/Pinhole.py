@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+import numpy as np
+from scipy.ndimage import label, uniform_filter
+
+import PBCGeometry as pg
+
+#Pinholes: Si rich channels through the oxide layer. The box is cut into voxels of about
+#voxel A, Si and O counts are smoothed over smooth voxels (periodic) and a voxel is Si rich
+#when its Si fraction is above sithr (default half way between the oxide's median and pure
+#Si). The oxide layer is the longest (periodic) run of z voxel layers whose O fraction is
+#above the middle of the layer profile. Si rich voxels of the oxide layer are labeled into
+#connected components, joined across the x,y boundaries. Each component gets its axis (center
+#and principal direction), equivalent radius (mean cross section per layer), z extent and
+#whether it runs through the whole oxide layer; the atoms in its voxels are its members.
+
+channeldtype=np.dtype([('label',np.int64),('center',np.float64,(3,)),('axis',np.float64,(3,)),
+                       ('radius',np.float64),('zlo',np.float64),('zhi',np.float64),
+                       ('nvox',np.int64),('natoms',np.int64),('through',np.bool_)])
+
+
+#voxel counts per dims (nx,ny,nz) and the flat voxel of every atom
+def voxel_index(pos,simbox,voxel=2.0):
+    simbox=np.asarray(simbox,dtype=np.float64)
+    L=pg.box_lengths(simbox)
+    dims=np.maximum(np.round(L/voxel).astype(np.int64),1)
+    h=L/dims
+    ijk=np.minimum((np.mod(np.asarray(pos,dtype=np.float64)-simbox[:,0],L)/h).astype(np.int64),dims-1)
+    return (dims,h,ijk)
+
+
+def composition_grid(pos,elements,simbox,voxel=2.0,smooth=3):
+    (dims,h,ijk)=voxel_index(pos,simbox,voxel)
+    flat=np.ravel_multi_index(ijk.T,dims)
+    elements=np.asarray(elements)
+    n=int(np.prod(dims))
+    nSi=np.bincount(flat[elements=='Si'],minlength=n).reshape(dims).astype(np.float64)
+    nO=np.bincount(flat[elements=='O'],minlength=n).reshape(dims).astype(np.float64)
+    if smooth>1:
+        nSi=uniform_filter(nSi,size=smooth,mode='wrap')
+        nO=uniform_filter(nO,size=smooth,mode='wrap')
+    return (nSi,nO,dims,h,ijk)
+
+
+#z layers of the oxide as (first layer, number of layers), the run may wrap in z
+def oxide_layers(nSi,nO,mincontrast=0.2):
+    tot=(nSi+nO).sum(axis=(0,1))
+    frac=nO.sum(axis=(0,1))/np.maximum(tot,1e-12)
+    if frac.max()-frac.min()<mincontrast:
+        return (0,0)
+    ox=frac>(frac.max()+frac.min())/2
+    nz=len(ox)
+    if ox.all():
+        return (0,nz)
+    #longest run of oxide layers starting right after a non oxide layer
+    start=int(np.argmin(ox))
+    r=np.roll(ox,-start)
+    best=(0,0)
+    k=0
+    while k<nz:
+        if r[k]:
+            e=k
+            while e<nz and r[e]:
+                e+=1
+            if e-k>best[1]:
+                best=((k+start)%nz,e-k)
+            k=e
+        else:
+            k+=1
+    return best
+
+
+#connected components of a 3d mask with the x and y faces joined periodically
+def periodic_label(mask):
+    (lab,n)=label(mask)
+    parent=np.arange(n+1)
+
+    def find(a):
+        while parent[a]!=a:
+            parent[a]=parent[parent[a]]
+            a=parent[a]
+        return a
+
+    for (a,b) in ((lab[0],lab[-1]),(lab[:,0],lab[:,-1])):
+        k=(a>0)&(b>0)
+        for p, q in set(zip(a[k].tolist(),b[k].tolist())):
+            (rp,rq)=(find(p),find(q))
+            if rp!=rq:
+                parent[max(rp,rq)]=min(rp,rq)
+    roots=np.array([find(i) for i in range(n+1)])
+    (_,new)=np.unique(roots,return_inverse=True)
+    return (new.reshape(-1)[lab],len(np.unique(roots))-1)
+
+
+#pinhole channels of a structure and the channel label of every atom (-1 outside all)
+def find_pinholes(pos,elements,simbox,voxel=2.0,smooth=3,sithr=None,minvox=8):
+    simbox=np.asarray(simbox,dtype=np.float64)
+    L=pg.box_lengths(simbox)
+    (nSi,nO,dims,h,ijk)=composition_grid(pos,elements,simbox,voxel,smooth)
+    atomlabel=np.full(len(ijk),-1,dtype=np.int64)
+    (z0,nzox)=oxide_layers(nSi,nO)
+    if nzox==0:
+        return (np.zeros(0,dtype=channeldtype),atomlabel)
+
+    with np.errstate(divide='ignore',invalid='ignore'):
+        frac=np.where(nSi+nO>0,nSi/(nSi+nO),0)
+    #oxide layers moved to the front so they are contiguous
+    frac=np.roll(frac,-z0,axis=2)[:,:,:nzox]
+    if sithr is None:
+        sithr=(np.median(frac)+1)/2
+    (lab,n)=periodic_label(frac>sithr)
+
+    #atom voxels in the same rolled layout, atoms outside the oxide layers get no label
+    k=np.mod(ijk[:,2]-z0,dims[2])
+    inox=k<nzox
+    alab=np.zeros(len(ijk),dtype=np.int64)
+    alab[inox]=lab[ijk[inox,0],ijk[inox,1],k[inox]]
+
+    (i,j,kk)=np.nonzero(lab)
+    vl=lab[i,j,kk]
+    rows=[]
+    for c in range(1,n+1):
+        m=vl==c
+        if m.sum()<minvox:
+            continue
+        (ci,cj,ck)=(i[m],j[m],kk[m])
+        #unwrap x,y around the circular mean so channels across the boundary stay whole
+        p=np.zeros((len(ci),3))
+        for d, idx in ((0,ci),(1,cj)):
+            ang=2*np.pi*idx/dims[d]
+            cm=np.arctan2(np.sin(ang).mean(),np.cos(ang).mean())*dims[d]/(2*np.pi)
+            p[:,d]=(np.mod(idx-cm+dims[d]/2,dims[d])-dims[d]/2+cm+0.5)*h[d]
+        p[:,2]=(ck+0.5)*h[2]
+        center=p.mean(axis=0)
+        (_,_,vt)=np.linalg.svd(p-center,full_matrices=False)
+        axis=vt[0] if vt[0][2]>=0 else -vt[0]
+        area=np.bincount(ck).astype(np.float64)
+        area=area[area>0]*h[0]*h[1]
+        rows.append((c,simbox[:,0]+np.mod(center+np.array([0,0,z0*h[2]]),L),axis,np.sqrt(area.mean()/np.pi),
+                     simbox[2,0]+np.mod((ck.min()+z0)*h[2],L[2]),simbox[2,0]+np.mod((ck.max()+1+z0)*h[2],L[2]),
+                     int(m.sum()),int(np.sum(alab==c)),bool(ck.min()==0 and ck.max()==nzox-1)))
+
+    channels=np.array(rows,dtype=channeldtype)
+    channels=channels[np.argsort(-channels['nvox'],kind='stable')]
+    for r, c in enumerate(channels['label']):
+        atomlabel[alab==c]=r
+    channels['label']=np.arange(len(channels))
+    return (channels,atomlabel)
+
+
+#ids of the atoms of the channels through the whole oxide (or of all channels)
+def pinhole_atoms(channels,atomlabel,ids,through_only=True):
+    keep=channels['label'][channels['through']] if through_only else channels['label']
+    return np.asarray(ids)[np.isin(atomlabel,keep)]
+
+
+#distance of points from the axis of a channel
+def axis_distance(simbox,channel,points):
+    c=channel['center']
+    return pg.pbc_point_segment(simbox,c,c+channel['axis'],points)[0]
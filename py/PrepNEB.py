@@ -21,6 +21,9 @@ import matplotlib.gridspec as gridspec
 import matplotlib as mpl
 from argparse import ArgumentParser
 
+import LammpsIO as lio
+import Topology as tp
+
 
 skipPES=0
 dt=0.5
@@ -55,6 +58,12 @@ def NEB_min(L):
     L.commands_string(f'''minimize {etol} {etol} 10000 10000''')
 
 def init_dump(L,file,dumpstep):
+    #pull the requested frame out through the dump index, LAMMPS then only reads that frame
+    framefile=None
+    if MPI.COMM_WORLD.Get_rank()==0:
+        framefile=lio.dump_frame_file(file,dumpstep)
+    framefile=MPI.COMM_WORLD.bcast(framefile,root=0)
+
     #Initialize and load the dump file
     L.commands_string(f'''
         clear
@@ -83,7 +92,7 @@ def init_dump(L,file,dumpstep):
 
         create_box 3 sim
 
-        read_dump {file} {dumpstep} x y z box yes add keep
+        read_dump {framefile} {dumpstep} x y z box yes add keep
         
         mass         3 $(v_massH)
         mass         2 $(v_massO)
@@ -104,7 +113,17 @@ def init_dump(L,file,dumpstep):
         
         fix r1 all qeq/reax 1 0.0 10.0 1e-6 reaxff
         compute c1 all property/atom x y z''')
+
+    if MPI.COMM_WORLD.Get_rank()==0 and framefile!=file:
+        os.remove(framefile)
     
+#data file of one dump frame written by rank 0 (same content as read_dump + write_data)
+def dump_to_full(file,dumpstep,full):
+    if MPI.COMM_WORLD.Get_rank()==0:
+        lio.dump_to_data(file,dumpstep,full)
+    MPI.COMM_WORLD.Barrier()
+    return full
+
 def init_dat(L,file):
 
     L.commands_string(f'''
@@ -416,39 +435,9 @@ def place_random_O(L,zlims,seed):
     
 def find_neighboring_sibc(atoms,oi):
     #start with an Oxygen and find all neighboring Si with BC vacancies
-    nindices=atoms.at[oi,'bonds']
-    #look to see if this atom has any neighboring SI with vacancies
-    print(f'numbonds={len(nindices)}')
-    si_bc_vac=[]
-    badsi=[]
-    for n in nindices:
-        
-        ni=n[0]
-        neitype=atoms.at[ni,'type']
-        if neitype=='Si':
-
-            sibonds=atoms.at[ni,'bonds']
-                    
-            badsi=[]  
-            for b in sibonds:
-                bi=b[0]
-                btype=atoms.at[bi,'type']
-                if btype=='H' or btype=='O':
-                    bb=atoms.at[bi,'bonds']
-                    for bn in bb:
-                        bni=bn[0]
-                        bntype=atoms.at[bni,'type']
-                        if bntype=='Si' and bni !=ni:
-                            badsi.append(bni)
-        
-            
-            for nnn in sibonds:
-                nnni=nnn[0]
-                nnntype=atoms.at[nnni,'type']
-                if nnntype=='Si'and nnni not in badsi:
-                    si_bc_vac.append([ni,nnni])
-    
-    return si_bc_vac
+    topo=tp.topology_of(atoms)
+    print(f'numbonds={len(topo.neighbor_ids(oi))}')
+    return tp.find_neighboring_sibc(topo,oi)
 
 def prep_neb_zap_multi(file,dumpstep,atomI,aditionalAtoms,atomF,outfolder,infofile,plot,skipPES=True):
     
@@ -476,12 +465,8 @@ def prep_neb_zap_multi(file,dumpstep,atomI,aditionalAtoms,atomF,outfolder,infofi
     
     #initilize the data files 
     if file.endswith(".dump"):
-        LT = lammps('mpi',["-log",f'{outfolder}/logs/PrepNEB-LT.log'])
-        #do this first initialize to get around reaxff issues(charge stuff I think)
-        init_dump(LT,file,dumpstep)
-        LT.commands_string(f'''
-            write_data {full}
-            ''')
+        #write the frame out directly, no lammps instance needed for the conversion
+        dump_to_full(file,dumpstep,full)
         #
         init_dat(L1,full)
         init_dat(L2,full)
@@ -637,11 +622,7 @@ def prep_neb_zap_multi(file,dumpstep,atomI,aditionalAtoms,atomF,outfolder,infofi
     ####Now clean up the dump file to be the correct format for NEB runs
     if me == 0:## ONLY RUN ON ONE PROCESS
         
-        with open(nebF,'w+') as f:
-            numAdd=len(aditionalAtoms)
-            f.write(f'''{numAdd+1}\n{atomI} {rf2[0]} {rf2[1]} {rf2[2]}''')
-            for a in finalPosAdd:
-                f.write(f"\n{a[0]} {a[1][0]} {a[1][1]} {a[1][2]}")
+        lio.write_neb_coords(nebF,[atomI]+[a[0] for a in finalPosAdd],[rf2]+[a[1] for a in finalPosAdd])
             
             
                 
@@ -718,12 +699,8 @@ def prep_neb_to_bond_center(args,ident,atomF1=None,atomF2=None,datafile=None,dum
     
     #initilize the data files 
     if datafile.endswith(".dump"):
-        LT = get_lammps(f'{outfolder}/logs/PrepNEB-LT.log')
-        #do this first initialize to get around reaxff issues(charge stuff I think)
-        init_dump(LT,datafile,dumpstep)
-        LT.commands_string(f'''
-            write_data {full}
-            ''')
+        #write the frame out directly, no lammps instance needed for the conversion
+        dump_to_full(datafile,dumpstep,full)
         #
         init_dat(L1,full)
         
@@ -767,12 +744,8 @@ def prep_neb_to_location(args,fileIdent,ident,fpos,datafile=None,L1=None,dumpste
         
     full= outfolder+ f'{fileIdent}-Full.data'
     if datafile.endswith(".dump"):
-        LT = get_lammps(f'{outfolder}/logs/PrepNEB-LT.log')
-        #do this first initialize to get around reaxff issues(charge stuff I think)
-        init_dump(LT,datafile,dumpstep)
-        LT.commands_string(f'''
-            write_data {full}
-            ''')
+        #write the frame out directly, no lammps instance needed for the conversion
+        dump_to_full(datafile,dumpstep,full)
         init_dat(L1,full)
         
     elif datafile.endswith(".data") or datafile.endswith(".dat"):
@@ -839,8 +812,7 @@ def prep_neb_to_location(args,fileIdent,ident,fpos,datafile=None,L1=None,dumpste
     ####Now clean up the dump file to be the correct format for NEB runs
     if me == 0:## ONLY RUN ON ONE PROCESS
         
-        with open(nebF,'w+') as f:
-            f.write(f"1 \n{atomI} {rf[0]} {rf[1]} {rf[2]}")
+        lio.write_neb_coords(nebF,[atomI],[rf])
     return (nebI,nebF,xyz)
     
 
@@ -865,12 +837,8 @@ def prep_neb_to_location_boomerang(args,fileIdent,ident,fpos,datafile=None,L1=No
         L1 = get_lammps(f'{outfolder}/logs/PrepNEB-L1.log')
         full= outfolder+ f'{fileIdent}-Full.data'
         if datafile.endswith(".dump"):
-            LT = get_lammps(f'{outfolder}/logs/PrepNEB-LT.log')
-            #do this first initialize to get around reaxff issues(charge stuff I think)
-            init_dump(LT,datafile,dumpstep)
-            LT.commands_string(f'''
-                write_data {full}
-                ''')
+            #write the frame out directly, no lammps instance needed for the conversion
+            dump_to_full(datafile,dumpstep,full)
             init_dat(L1,full)
             
         elif datafile.endswith(".data") or datafile.endswith(".dat"):
@@ -979,8 +947,7 @@ def prep_neb_to_location_boomerang(args,fileIdent,ident,fpos,datafile=None,L1=No
     ####Now clean up the dump file to be the correct format for NEB runs
     if me == 0:## ONLY RUN ON ONE PROCESS
         
-        with open(nebF,'w+') as f:
-            f.write(f"1 \n{atomI} {rf[0]} {rf[1]} {rf[2]}")
+        lio.write_neb_coords(nebF,[atomI],[rf])
     return (nebI,nebF,xyz)
 
 def prep_neb_zap_single(args):
@@ -1017,12 +984,8 @@ def prep_neb_zap_single(args):
     
     #initilize the data files 
     if file.endswith(".dump"):
-        LT = get_lammps(f'{outfolder}/logs/PrepNEB-LT.log')
-        #do this first initialize to get around reaxff issues(charge stuff I think)
-        init_dump(LT,file,dumpstep)
-        LT.commands_string(f'''
-            write_data {full}
-            ''')
+        #write the frame out directly, no lammps instance needed for the conversion
+        dump_to_full(file,dumpstep,full)
         #
         init_dat(L1,full)
         init_dat(L2,full)
@@ -1170,8 +1133,7 @@ def prep_neb_zap_single(args):
     ####Now clean up the dump file to be the correct format for NEB runs
     if me == 0:## ONLY RUN ON ONE PROCESS
         
-        with open(nebF,'w+') as f:
-            f.write(f'''1\n{atomI} {rf2[0]} {rf2[1]} {rf2[2]}''')
+        lio.write_neb_coords(nebF,[atomI],[rf2])
 
             
         
@@ -1263,12 +1225,8 @@ def prep_neb_boomerang(args):
     
     #initilize the data files 
     if datafile.endswith(".dump"):
-        LT = get_lammps(f'{outfolder}/logs/PrepNEB-LT.log')
-        #do this first initialize to get around reaxff issues(charge stuff)
-        init_dump(LT,datafile,dumpstep)
-        LT.commands_string(f'''
-            write_data {full}
-            ''')
+        #write the frame out directly, no lammps instance needed for the conversion
+        dump_to_full(datafile,dumpstep,full)
         
         init_dat(L1,full)
         
@@ -1359,12 +1317,8 @@ def prep_interstitial(args):
     
     #initilize the data files 
     if file.endswith(".dump"):
-        LT = get_lammps(f'{outfolder}/logs/PrepNEB-LT.log')
-        #do this first initialize to get around reaxff issues(charge stuff I think)
-        init_dump(LT,file,dumpstep)
-        LT.commands_string(f'''
-            write_data {full}
-            ''')
+        #write the frame out directly, no lammps instance needed for the conversion
+        dump_to_full(file,dumpstep,full)
         #
         init_dat(L1,full)
         # init_dat(L2,full)
@@ -1393,7 +1347,15 @@ def prep_interstitial(args):
         write_data {tempfile1}
         ''')
 
-    place_random_O(L1,[bulk_low_z,bulk_high_z],seed)
+    #a site from an interstitial pair list (CreatePairList.create_interstitial_pair_list) comes
+    #with its bond center already known, no random placement or bond perception needed
+    presite=bool(args.fposx) and bool(args.bc1)
+    if presite:
+        L1.commands_string(f'''
+            create_atoms 2 single {args.fposx} {args.fposy} {args.fposz}
+            ''')
+    else:
+        place_random_O(L1,[bulk_low_z,bulk_high_z],seed)
     
     atomI=L1.get_natoms()
     
@@ -1413,6 +1375,12 @@ def prep_interstitial(args):
     L1.commands_string(f'''
         write_data {tempfile}
         ''')
+    if presite:
+        args.atomid=atomI
+        args.dfile=tempfile
+        prep_neb_to_bond_center(args,seed,atomF1=int(args.bc1),atomF2=int(args.bc2))
+        return
+
     if me==0:
         print('here1')
     (atoms, simbox) = nt.read_file_data_bonds(outfolder,tempfile_name)
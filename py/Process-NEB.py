@@ -4,7 +4,6 @@
 # app = QApplication([])
 
 import numpy as np
-import linecache as lc
 from mpi4py import MPI
 
 
@@ -15,10 +14,12 @@ import sys
 
 import csv 
 # import itertools
-import collections
 from argparse import ArgumentParser
 import argparse
 
+import NEBResults as nr
+import NEBLog as nl
+
 #matplotlib.use('tkagg')
 comm = MPI.COMM_WORLD
 rank = comm.Get_rank()
@@ -42,28 +43,25 @@ conv=0.043361254529175
 #I need to read a reax.dat file and a reax.log file and get values from both.
 
 
+#every log is parsed once (tail only) and the NEBLog kept for the later combined plots
+neb_logs={}
+
+def get_log(file):
+    if isinstance(file,nl.NEBLog):
+        return file
+    if file not in neb_logs:
+        neb_logs[file]=nl.read_neb_log(file,full=False)
+    return neb_logs[file]
+
+
+#row of the NEB table, mod lines up from the last one
 def read_log(file, mod=0):
-    ar=[]
-    with open(file) as f:
-        cont=len(f.readlines())
-        line = lc.getline(file,cont - mod).split()
-    f.close()
-    for val in line:
-        ar.append(float(val))
-    return np.asarray(ar)
+    return get_log(file).table[-1-mod]
 
 
 def MEP(file):
-    #there are 9 elements before RD1
-    last= read_log(file)
-    prev = read_log(file,mod=1)
-    R=last[9::2]                #points in replica space, RD1-RDN
-    mep=last[10::2]*conv            #actual pE values, PE1-PEN
-    ms = mep - np.min(mep)      #normalizing MEP
-    efb=last[6]*conv               #forward barrier
-    erb=last[7]*conv               #reverse barrier
-    RD=last[8]                  #total reaction cood space
-    return R, ms , efb, erb, RD
+    #R (RD1-RDN), normalized MEP (PE1-PEN), forward/reverse barrier, total reaction coord space
+    return get_log(file).mep()
 
 def plot_mep(args,logfiles,figPath,hnum=0, plot=True, xo= 0.01):
     etol=args.etol
@@ -77,7 +75,7 @@ def plot_mep(args,logfiles,figPath,hnum=0, plot=True, xo= 0.01):
     last_pe=0
     txtl=[]
     for lfile in range(numfiles):
-        logfile=logfiles[lfile]
+        logfile=get_log(logfiles[lfile])
         r,pe,EF,ER, RD = MEP(logfile)
         my_barriers=[]
         points=[]
@@ -196,20 +194,20 @@ def calc_barrier(file):
 
 
 def savecsv(data,filename,col_names=None):
+    savecsv_rows([data],filename,col_names)
 
-    csv_name=filename+'.csv'
-
+#write a whole batch of rows with one open of the csv
+def savecsv_rows(rows,filename,col_names=None):
 
     file_exists = os.path.isfile(filename)
 
-    #data=runname+','+data+''
     with open(filename,'a',newline='', encoding='utf-8') as fd:
         csv_writer=csv.writer(fd)
 
         if file_exists is False and col_names is not None:
             csv_writer.writerow(col_names)
             
-        csv_writer.writerow(data)
+        csv_writer.writerows(rows)
 
 def catch(func, *args, handle=lambda e : e, **kwargs):
     try:
@@ -286,40 +284,7 @@ def calc_dist():
     #3000    57.295123........
 #end example
 def check_convergence(filename,maxneb,maxclimbing,numpart=13):
-    
-    fsize=os.path.getsize(filename)
-    with open(filename,'r') as logF:
-        last = collections.deque(maxlen=1)
-        climbing=None
-        nebiter=None
-        climbing_iter_i=None
-        climbing_iter_f=None
-        for line in logF:
-            fsize -= len(line)
-            
-            if not fsize:#this line is the last line
-                climbing_iter_f=int(line.split()[0])
-                
-            elif line.startswith('Climbing'):
-                nebiter=int(last[0].split()[0])
-                climbing_iter_i=nebiter#if god loves us this is easy else use next=itertools.islice(logF,2)
-                climbing=int(line.split()[3])
-            
-            last.append(line)
-        if climbing is None or nebiter is None or climbing_iter_f is None or climbing_iter_i is None:#cry
-            print('Big boy oppsie in "Process-NEB.py"')    
-            return False
-        elif climbing==numpart or climbing==0:
-            print('NEB did not converge because the climbing replica was the first or last replica.')  
-            return False
-        elif nebiter == maxneb:
-            print('NEB did not converge because the maximum NEB iterations were reached.')  
-            return False
-        elif (climbing_iter_f-climbing_iter_i) == maxclimbing:
-            print('NEB did not converge because the maximum climbing image iterations were reached.')  
-            return False
-        else:
-            return True
+    return get_log(filename).converged(maxneb,maxclimbing,numpart)
     
 def check_bad_NEB(feb,reb,pe):
     cutoff=max(feb,reb)/2
@@ -332,41 +297,11 @@ def check_bad_NEB(feb,reb,pe):
 def find_NEB_info(filename):
     #The log file outputs lines like
     #print pcsv_Zi 25
-    
-    #Search for these lines and input 25 into the Zi column of the CSV
-    zi=None
-    zf=None
-    fields=[]
-    
-    with open(filename,'r') as logF:
-        for line in logF:
-            if "pcsv_" in line:
-                spt=line.split()
-                name=spt[0].split('_')[-1]
-                data=spt[1]
-                fields.append([name,data])
-            
-                
-    return fields   
+    #or pcsv_{identifier}_iPos [x,y,z]
+    return nl.read_neb_info(filename).fields
 
 def find_NEB_images(filename):
-    #The log file outputs lines like
-    #print pcsv_Zi 25
-    
-    #Search for these lines and input 25 into the Zi column of the CSV
-    zi=None
-    zf=None
-    imagenames=[]
-    
-    with open(filename,'r') as logF:
-        for line in logF:
-            if "image" in line:
-                spt=line.split()
-                img=spt[-1]
-                imagenames.append(img)
-            
-                
-    return imagenames 
+    return nl.read_neb_info(filename).images
 
 
 def render_neb_gif(dumpfiles, gifname, atom):
@@ -502,7 +437,6 @@ if __name__=='__main__':
     fileID=atomID
     
     csvID=str(atomID)+'-'+str(removeID)
-    col_names=["pair","id","etol","ts","fail","dist","FEB","REB","K"]
     col_names_tail=["A","B","C","D","E","F","G","H"]
 
     
@@ -515,13 +449,9 @@ if __name__=='__main__':
                 datafile = datafile.split('/')[-1]
             datafile=datafile[:-len(datend)]
     
-    neb_runs=[]
-    #Find all times we were supposed to run the lammps neb file 
-    with open(neb_info_file,'r') as infoF:
-        
-        for line in infoF:
-            if line.startswith("neb"):
-                neb_runs.append(line)
+    #Find all times we were supposed to run the lammps neb file, the pcsv fields and images in one read
+    info=nl.read_neb_info(neb_info_file)
+    neb_runs=info.runs
                
     
     
@@ -539,6 +469,8 @@ if __name__=='__main__':
     
     
     log_file_list=[]
+    csv_rows=[]
+    store_rows=[]
     for l in neb_runs:
         #"neb {i} {atomI} {identifier} {nebI} {nebF} {identifier}-{atomI}.log\n"+
         line=l.split()
@@ -584,12 +516,13 @@ if __name__=='__main__':
         bad= "False" if (not badneb and convergence) else "True"
         
         dat=[csvID,identifier,etol,timestep,bad,ret[3],ret[0],ret[1],springconst]
-        log_entries=find_NEB_info(neb_info_file)
+        col_names=["pair","id","etol","ts","fail","dist","FEB","REB","K"]
         
-        #print(log_entries)
-        for e in log_entries:
-            col_names.append(e[0])
-            dat.append(e[1])
+        #only this identifier's pcsv entries, a multi NEB info file has one set per NEB
+        vecs=info.fields_for(identifier)
+        for (k,v) in vecs.items():
+            col_names.append(k)
+            dat.append(v)
         
         
         
@@ -601,7 +534,17 @@ if __name__=='__main__':
             dat.append(l[0])
             dat.append(l[1])
             
-        savecsv(dat,csvfile,col_names)
+        csv_rows.append(dat)
+
+        #typed row for the results store, from the same pcsv entries
+        store_rows.append(nr.make_row(csvID,identifier,etol,timestep,bad=="True",ret[3],ret[0],ret[1],springconst,
+                                      nr.parse_vector(vecs['iPos'],(3,)) if 'iPos' in vecs else None,
+                                      nr.parse_vector(vecs['fPos'],(3,)) if 'fPos' in vecs else None,
+                                      nr.parse_vector(vecs['box'],(3,2)) if 'box' in vecs else None,
+                                      obarriers,c_run_folder))
+        
+    savecsv_rows(csv_rows,csvfile,col_names if len(csv_rows)>0 else None)
+    nr.append_results(nr.store_path(csvfile),store_rows)
         
     # except:
     #     print('Failed to analyze NEB')
@@ -645,7 +588,7 @@ if __name__=='__main__':
     if plot:
         import numpy as np
         from PIL import Image, ImageSequence
-        nebim=find_NEB_images(neb_info_file)
+        nebim=info.images
         
         #print(f"figpaths {figpaths}")
         for cplot in range(numplot):
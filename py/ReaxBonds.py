@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+import numpy as np
+import os
+import uuid
+from lammps import lammps, LMP_STYLE_LOCAL, LMP_TYPE_ARRAY
+from mpi4py import MPI
+
+import LammpsIO as lio
+import StructCache as sc
+import Topology as tp
+
+potential_folder="/home/adam/code/topcon-md/potential/"
+control_file="topcon.control"
+ffield_file="ffield_Nayir_SiO_2019.reax"
+
+
+def potential_files():
+    return [potential_folder+control_file,potential_folder+ffield_file]
+
+#cached bond orders are only valid for the potential they were perceived with
+sc.potential_files=potential_files
+
+
+#Bond perception with one long lived LAMMPS instance. Each structure is loaded
+#with clear + read_data and the reaxff bond orders come straight back into
+#numpy through compute reaxff/atom, so no bond text file is written. LAMMPS
+#builds without compute reaxff/atom (older than Mar 2023) fall back to fix
+#reaxff/bonds writing a bond file into the scratchfolder next to the data file,
+#which rank 0 parses and broadcasts.
+class BondPerceiver:
+
+    def __init__(self,log='none',comm=None):
+        self.comm=comm if comm is not None else MPI.COMM_WORLD
+        args=["-log",log,"-screen","none"]
+        if comm is not None:
+            self.L=lammps('mpi',args,comm=comm)
+        else:
+            self.L=lammps('mpi',args)
+        #compute reaxff/atom is only in LAMMPS builds from Mar 2023 on
+        self.use_compute=self.L.has_style('compute','reaxff/atom')
+
+    def close(self):
+        if self.L is not None:
+            self.L.close()
+            self.L=None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def load(self,file,typemap):
+        elements=' '.join(typemap[t] for t in sorted(typemap))
+        masses='\n'.join(f'mass {t} {lio.elementmasses[typemap[t]]}' for t in sorted(typemap))
+        self.L.commands_string(f'''
+            clear
+            units         real
+            dimension     3
+            boundary    p p p
+            atom_style  charge
+            atom_modify map yes
+
+            read_data {file}
+            {masses}
+
+            pair_style	    reaxff {potential_folder}{control_file}
+            pair_coeff	    * * {potential_folder}{ffield_file} {elements}
+
+            neighbor        2 bin
+            neigh_modify    every 10 delay 0 check no
+            thermo_modify lost ignore
+
+            fix r1 all qeq/reax 1 0.0 10.0 1e-6 reaxff
+            ''')
+
+    #(ida,idb,bo) arrays of every bond above the control file bond order cutoff, file is
+    #the loaded data file (its folder holds the fallback bond file)
+    def extract_bonds(self,file):
+        if self.use_compute:
+            self.L.commands_string('''
+                compute rbo all reaxff/atom bonds yes
+                run 0 post no
+                ''')
+            local=self.L.numpy.extract_compute('rbo',LMP_STYLE_LOCAL,LMP_TYPE_ARRAY)
+            local=np.zeros((0,3)) if local is None else np.array(local).reshape(-1,3)
+            #every rank only sees the bonds of its own atoms
+            local=np.concatenate(self.comm.allgather(local))
+            return (local[:,0],local[:,1],local[:,2])
+
+        #fix reaxff/bonds is written by LAMMPS rank 0, into the shared scratchfolder so the
+        #path means the same on every node, only rank 0 reads it back
+        scratch=os.path.join(os.path.dirname(os.path.abspath(file)),'scratchfolder')
+        name=None
+        if self.comm.Get_rank()==0:
+            os.makedirs(scratch,exist_ok=True)
+            name=f'reaxbonds-{uuid.uuid4().hex}.txt'
+        bondfile=os.path.join(scratch,self.comm.bcast(name,root=0))
+        self.L.commands_string(f'''
+            fix rbf all reaxff/bonds 1 {bondfile}
+            run 0 post no
+            unfix rbf
+            ''')
+        ret=None
+        if self.comm.Get_rank()==0:
+            try:
+                (ids,types,offsets,nbrids,bo)=tp.read_bond_file(bondfile)
+                ret=(np.repeat(ids,np.diff(offsets)),nbrids,bo)
+            finally:
+                os.remove(bondfile)
+        return self.comm.bcast(ret,root=0)
+
+    #CSR topology of one data file, rows in data file order
+    def topology(self,file,atoms=None):
+        if atoms is None:
+            (atoms,simbox)=lio.read_data_file(file)
+        types=np.unique(atoms['type'])
+        typemap={}
+        for t in types:
+            typemap[int(t)]=atoms['element'][np.argmax(atoms['type']==t)]
+        for t in range(1,max(typemap)+1):
+            typemap.setdefault(t,lio.typenames.get(t,'Si'))
+
+        self.load(file,typemap)
+        (ida,idb,bo)=self.extract_bonds(file)
+        return tp.topology_from_edges(atoms['id'],atoms['element'],ida,idb,bo)
+
+    #topologies for a list of data files with the one instance
+    def topologies(self,files):
+        for f in files:
+            yield (f,self.topology(f))
+
+
+#shared instance so a python session only starts LAMMPS once for bond perception
+perceiver=None
+
+def get_perceiver():
+    global perceiver
+    if perceiver is None:
+        perceiver=BondPerceiver()
+    return perceiver
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+import numpy as np
+from scipy.sparse import csr_matrix
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+#Primitive ring statistics on the bond graph (Topology.BondTopology).
+#For a center atom a and two of its neighbors b,c the candidate ring through b-a-c is
+#the shortest b->c path that avoids a, closed by the two bonds to a (King's shortest path
+#ring). Candidates are then checked for primitivity: a ring is kept only if no two of its
+#atoms are connected by a path shorter than their distance along the ring, i.e. it is not
+#the sum of two smaller rings (so fused 4+6 rings give no 8 ring). A b-a-c angle whose
+#smallest ring is not primitive has no entry.
+#All breadth first searches of a chunk run together as one sparse frontier matrix (one
+#column per search) so a level is a single sparse product. Ring sizes count atoms
+#(= bonds) in the ring, a 6 Si ring of a silica network is size 12. Rings larger than
+#maxsize are not searched for.
+
+ringdtype=np.dtype([('center',np.int64),('end1',np.int64),('end2',np.int64),('size',np.int16)])
+
+
+def adjacency(offsets,nbr,n):
+    return csr_matrix((np.ones(len(nbr),dtype=np.int8),nbr,offsets),shape=(n,n))
+
+
+#Breadth first search from src[j] in column j, never entering blocked[j] (-1 for none).
+#visit(level,r,c) gets the rows r first reached at that level in columns c and returns
+#which of them to keep expanding. Returns the sorted visit keys (col*n+row) of every level.
+def bounded_bfs(A,src,blocked,maxlevel,visit):
+    n=A.shape[0]
+    S=len(src)
+    cols=np.arange(S)
+    start=cols*n+src
+    b=blocked>=0
+    visited=np.sort(np.concatenate([start,cols[b]*n+blocked[b]]))
+    levels=[start]
+    frontier=(cols,src)
+    for level in range(1,maxlevel+1):
+        if len(frontier[0])==0:
+            break
+        #one row per search, the product has each reached (search,row) once
+        F=csr_matrix((np.ones(len(frontier[0]),dtype=np.int8),frontier),shape=(S,n))
+        N=F@A
+        N.sort_indices()
+        keys=np.repeat(np.arange(S,dtype=np.int64),np.diff(N.indptr))*n+N.indices
+        new=keys[~in_sorted(visited,keys)]
+        levels.append(new)
+        if len(new)==0:
+            break
+        #two sorted runs, the stable sort merges them
+        visited=np.sort(np.concatenate([visited,new]),kind='stable')
+        c=new//n
+        r=new%n
+        keep=visit(level,r,c)
+        frontier=(c[keep],r[keep])
+    return levels
+
+
+def in_sorted(sorted_keys,k):
+    if len(sorted_keys)==0:
+        return np.zeros(len(k),dtype=bool)
+    i=np.minimum(np.searchsorted(sorted_keys,k),len(sorted_keys)-1)
+    return sorted_keys[i]==k
+
+
+#(center row, end1 row, end2 row, size) of the King ring of every neighbor pair of the
+#given centers and the ring atoms in ring order (center,end1,...,end2), padded with -1
+def king_rings(offsets,nbr,centers,maxsize=12):
+    n=len(offsets)-1
+    centers=np.asarray(centers,dtype=np.int64)
+    deg=np.diff(offsets)
+    A=adjacency(offsets,nbr,n)
+    edgekeys=np.sort(np.repeat(np.arange(n),deg)*n+nbr)
+
+    #one search per (center, neighbor)
+    cnt=deg[centers]
+    colcenter=np.repeat(centers,cnt)
+    src=nbr[np.repeat(offsets[centers]-np.cumsum(cnt)+cnt,cnt)+np.arange(cnt.sum())]
+    S=len(src)
+    if S==0:
+        return (np.zeros((0,4),dtype=np.int64),np.zeros((0,maxsize),dtype=np.int64))
+    #a search is done once every other neighbor of its center has been reached
+    need=deg[colcenter]-1
+    found=[]
+
+    def visit(level,r,c):
+        hit=in_sorted(edgekeys,colcenter[c]*n+r)
+        found.append(np.stack([c[hit],r[hit],np.full(int(hit.sum()),level)],axis=1))
+        need[:]-=np.bincount(c[hit],minlength=S)
+        return need[c]>0
+
+    levels=bounded_bfs(A,src,colcenter,maxsize-2,visit)
+    f=np.concatenate(found) if len(found)>0 else np.zeros((0,3),dtype=np.int64)
+    #each neighbor pair is found from both ends, keep one
+    f=f[src[f[:,0]]<f[:,1]]
+    (col,end,length)=(f[:,0],f[:,1],f[:,2])
+
+    #walk every path back to its source through the previous level of the same column
+    members=np.full((len(f),maxsize),-1,dtype=np.int64)
+    members[:,0]=colcenter[col]
+    members[np.arange(len(f)),length+1]=end
+    cur=end.copy()
+    for l in range(int(length.max(initial=0)),0,-1):
+        q=np.nonzero(length>=l)[0]
+        x=cur[q]
+        d=deg[x]
+        owner=np.repeat(np.arange(len(q)),d)
+        y=nbr[np.repeat(offsets[x]-np.cumsum(d)+d,d)+np.arange(d.sum())]
+        ok=in_sorted(levels[l-1],col[q][owner]*n+y)
+        #first matching neighbor of each path
+        first=np.unique(owner[ok],return_index=True)[1]
+        prev=y[ok][first]
+        cur[q]=prev
+        members[q,l]=prev
+    rings=np.stack([colcenter[col],src[col],end,length+2],axis=1)
+    return (rings,members)
+
+
+#True for every ring (rows of members, ring order, -1 padded) that has no shortcut
+def primitive_mask(offsets,nbr,members):
+    n=len(offsets)-1
+    nring=len(members)
+    if nring==0:
+        return np.zeros(0,dtype=bool)
+    A=adjacency(offsets,nbr,n)
+    size=np.sum(members>=0,axis=1)
+    #one search per ring atom
+    (ring,pos)=np.nonzero(members>=0)
+    src=members[ring,pos]
+    memberkeys=ring*n+src
+    order=np.argsort(memberkeys)
+    memberkeys=memberkeys[order]
+    memberpos=pos[order]
+    good=np.ones(nring,dtype=bool)
+
+    #a shortcut between atoms k apart along the ring is shorter than k <= size/2
+    def visit(level,r,c):
+        q=ring[c]
+        k=q*n+r
+        i=np.minimum(np.searchsorted(memberkeys,k),len(memberkeys)-1)
+        on=memberkeys[i]==k
+        step=np.abs(memberpos[i]-pos[c])
+        along=np.minimum(step,size[q]-step)
+        bad=on&(level<along)
+        good[q[bad]]=False
+        return good[q]&(level<size[q]//2-1)
+
+    bounded_bfs(A,src,np.full(len(src),-1,dtype=np.int64),int(size.max())//2-1,visit)
+    return good
+
+
+#primitive rings through the given center rows: table rows and ring atoms
+def rings_chunk(offsets,nbr,centers,maxsize=12,primitive=True):
+    (rings,members)=king_rings(offsets,nbr,centers,maxsize)
+    if primitive and len(rings)>0:
+        #check every distinct ring once
+        key=np.sort(np.where(members>=0,members,np.iinfo(np.int64).max),axis=1)
+        (_,first,inv)=np.unique(key,axis=0,return_index=True,return_inverse=True)
+        keep=primitive_mask(offsets,nbr,members[first])[inv.ravel()]
+        rings=rings[keep]
+        members=members[keep]
+    out=np.zeros(len(rings),dtype=ringdtype)
+    out['center']=rings[:,0]
+    out['end1']=rings[:,1]
+    out['end2']=rings[:,2]
+    out['size']=rings[:,3]
+    return (out,members)
+
+
+#ring table (ids, not rows) for all atoms or only the given center ids, split over
+#nproc worker processes in chunks of centers. Workers are spawned, not forked, so they
+#never inherit an initialized MPI/LAMMPS state. With members=True the ring atoms (ids,
+#ring order starting at the center, -1 padded) are returned too.
+def ring_table(topo,ids=None,maxsize=12,nproc=None,chunk=500,primitive=True,members=False):
+    if ids is None:
+        centers=np.arange(topo.natoms)
+    else:
+        centers=topo.rows(ids)
+        centers=centers[centers>=0]
+    chunks=[centers[i:i+chunk] for i in range(0,len(centers),chunk)]
+    if nproc is None:
+        nproc=min(len(chunks),os.cpu_count() or 1)
+
+    nc=len(chunks)
+    if nproc<=1 or nc<=1:
+        parts=[rings_chunk(topo.offsets,topo.nbr,c,maxsize,primitive) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=nproc,mp_context=multiprocessing.get_context('spawn')) as ex:
+            parts=list(ex.map(rings_chunk,[topo.offsets]*nc,[topo.nbr]*nc,chunks,[maxsize]*nc,[primitive]*nc))
+    if len(parts)==0:
+        table=np.zeros(0,dtype=ringdtype)
+        atoms=np.zeros((0,maxsize),dtype=np.int64)
+    else:
+        table=np.concatenate([p[0] for p in parts])
+        atoms=np.concatenate([p[1] for p in parts])
+    for c in ('center','end1','end2'):
+        table[c]=topo.ids[table[c]]
+    if members:
+        return (table,np.where(atoms>=0,topo.ids[atoms],-1))
+    return table
+
+
+#per atom ring size counts, shape (len(ids),maxsize+1), column s counts the rings of size s
+def ring_counts(table,ids,maxsize=12):
+    ids=np.asarray(ids,dtype=np.int64)
+    counts=np.zeros((len(ids),maxsize+1),dtype=np.int64)
+    if len(ids)==0:
+        return counts
+    order=np.argsort(ids,kind='stable')
+    pos=np.searchsorted(ids[order],table['center'])
+    pos=np.minimum(pos,len(ids)-1)
+    ok=ids[order][pos]==table['center']
+    np.add.at(counts,(order[pos[ok]],table['size'][ok].astype(np.int64)),1)
+    return counts
+
+
+#structure wide ring size distribution (fraction of the rings of each size over all angles)
+def ring_distribution(table,maxsize=12):
+    counts=np.bincount(table['size'].astype(np.int64),minlength=maxsize+1)
+    return counts/max(counts.sum(),1)
+
+
+#smallest and mean ring size through each id and the number of rings (nan when none)
+def ring_summary(table,ids,maxsize=12):
+    counts=ring_counts(table,ids,maxsize)
+    sizes=np.arange(maxsize+1)
+    tot=counts.sum(axis=1)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        mean=(counts*sizes).sum(axis=1)/tot
+    smallest=np.argmax(counts>0,axis=1).astype(float)
+    smallest[tot==0]=np.nan
+    return (smallest,mean,tot)
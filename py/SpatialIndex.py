@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+import numpy as np
+from scipy.spatial import cKDTree
+
+import PBCGeometry as pg
+
+#Periodic KD-tree over the atoms of one structure. Positions are shifted to the box
+#origin and wrapped so cKDTree's boxsize does the minimum image for every query.
+#One tree per element is built the first time a query filters on it, queries return
+#labels (lammps atom ids by default) so results index straight into the usual DataFrames.
+class PeriodicIndex:
+
+    def __init__(self,pos,simbox,labels=None,types=None):
+        self.simbox=np.asarray(simbox,dtype=np.float64)
+        self.lo=self.simbox[:,0]
+        self.L=pg.box_lengths(self.simbox)
+        self.pos=self.wrap(pos)
+        n=len(self.pos)
+        self.labels=np.arange(n) if labels is None else np.asarray(labels)
+        self.types=None if types is None else np.asarray(types,dtype=object)
+        self._trees={}
+
+    def __len__(self):
+        return len(self.pos)
+
+    #points moved into [0,L) relative to the box origin, the layout the trees are built on
+    def wrap(self,points):
+        p=np.mod(np.asarray(points,dtype=np.float64).reshape(-1,3)-self.lo,self.L)
+        #mod can round up to exactly L, cKDTree wants it strictly inside
+        p[p>=self.L]=0
+        return p
+
+    #rows of one type (or all of them) and their tree
+    def tree(self,type=None):
+        if type not in self._trees:
+            if type is None:
+                rows=np.arange(len(self.pos))
+            else:
+                rows=np.nonzero(self.types==type)[0]
+            self._trees[type]=(rows,cKDTree(self.pos[rows],boxsize=self.L))
+        return self._trees[type]
+
+    #labels within r of every point, one array per point (or one array for a single point)
+    def query_radius(self,points,r,type=None):
+        single=np.ndim(points)==1
+        (rows,t)=self.tree(type)
+        hits=t.query_ball_point(self.wrap(points),r)
+        ret=[self.labels[rows[np.asarray(h,dtype=np.int64)]] for h in hits]
+        return ret[0] if single else ret
+
+    #(distances,labels) of the k nearest atoms, shaped (npoints,k)
+    def query_knn(self,points,k=1,type=None):
+        (rows,t)=self.tree(type)
+        k=min(k,len(rows))
+        d,i=t.query(self.wrap(points),k=k)
+        d=np.asarray(d).reshape(-1,k)
+        i=np.asarray(i).reshape(-1,k)
+        return (d,self.labels[rows[i]])
+
+    #number of atoms within each radius of each point, shape (npoints,nradii)
+    def count_within(self,points,radii,type=None):
+        (rows,t)=self.tree(type)
+        p=self.wrap(points)
+        radii=np.atleast_1d(radii)
+        counts=np.zeros((len(p),len(radii)),dtype=np.int64)
+        for j, r in enumerate(radii):
+            counts[:,j]=t.query_ball_point(p,r,return_length=True)
+        return counts
+
+    #every pair of atoms closer than r as (label a, label b, distance), a<b by row
+    def pairs_within(self,r,type=None):
+        (rows,t)=self.tree(type)
+        pr=t.query_pairs(r,output_type='ndarray')
+        d=pg.pbc_distances(self.simbox,self.pos[rows[pr[:,0]]],self.pos[rows[pr[:,1]]])
+        return (self.labels[rows[pr[:,0]]],self.labels[rows[pr[:,1]]],d)
+
+
+#index of an atoms DataFrame (NEBTools.read_data layout: id index, type, pos)
+def index_from_df(df,simbox):
+    return PeriodicIndex(pg.stack_positions(df['pos']),simbox,labels=df.index.to_numpy(),types=df['type'].to_numpy())
+
+
+#indexes kept per structure so every pair of a csv reuses the same trees
+indexes={}
+maxindexes=16
+
+def get_index(key,df,simbox):
+    if key not in indexes:
+        if len(indexes)>=maxindexes:
+            indexes.pop(next(iter(indexes)))
+        indexes[key]=index_from_df(df,simbox)
+    return indexes[key]
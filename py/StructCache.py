@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+import numpy as np
+import hashlib
+import json
+import os
+import uuid
+import shutil
+
+#On-disk cache of parsed structures (atoms, box and reaxff bond topology).
+#Entries live in <cache_folder>/<content hash>/ as one .npy per array so a warm
+#load is just a memory mapped read. A small per-path stamp file remembers the
+#size/mtime of the data file so unchanged files are not even rehashed. The entry
+#key also covers the path and mtime of the reaxff potential files the bond orders
+#came from, so a new force field or control file gives new entries.
+
+#None means keep the cache next to the data file in scratchfolder/structcache/
+cache_folder=None
+
+cache_version=2
+
+#callable returning the potential files the cached bonds depend on, ReaxBonds sets it
+potential_files=None
+
+
+def cache_root(file):
+    if cache_folder is not None:
+        return cache_folder
+    return os.path.join(os.path.dirname(os.path.abspath(file)),'scratchfolder','structcache')
+
+
+def hash_file(file,blocksize=1<<20):
+    h=hashlib.sha1()
+    with open(file,'rb') as f:
+        for chunk in iter(lambda: f.read(blocksize),b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+#write a file so other readers only ever see the old or the complete new version
+def atomic_write_text(path,text):
+    tmp=f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp,'w') as f:
+        f.write(text)
+    os.replace(tmp,path)
+
+
+#content hash of a data file, only rehashed when the size or mtime changed
+def file_key(file):
+    root=cache_root(file)
+    st=os.stat(file)
+    stampdir=os.path.join(root,'stamps')
+    stamp=os.path.join(stampdir,hashlib.sha1(os.path.abspath(file).encode()).hexdigest()+'.json')
+
+    try:
+        with open(stamp,'r') as f:
+            s=json.load(f)
+        if s['size']==st.st_size and s['mtime_ns']==st.st_mtime_ns:
+            return s['hash']
+    except (OSError,ValueError,KeyError):
+        pass
+
+    key=hash_file(file)
+    try:
+        os.makedirs(stampdir,exist_ok=True)
+        atomic_write_text(stamp,json.dumps({'path':os.path.abspath(file),'size':st.st_size,
+                                            'mtime_ns':st.st_mtime_ns,'hash':key}))
+    except OSError as e:
+        print(f'Could not write cache stamp for {file}: {e}')
+    return key
+
+
+#short hash of the potential files' paths and mtimes, '' when none are known
+def potential_key():
+    if potential_files is None:
+        return ''
+    h=hashlib.sha1()
+    for p in potential_files():
+        p=os.path.abspath(p)
+        try:
+            mtime=os.stat(p).st_mtime_ns
+        except OSError:
+            mtime=-1
+        h.update(f'{p}:{mtime};'.encode())
+    return h.hexdigest()[:12]
+
+
+#kind names a derived table of the same structure (e.g. 'localenv'), None is the structure itself
+def entry_path(file,key=None,kind=None):
+    if key is None:
+        key=file_key(file)
+    pk=potential_key()
+    if pk:
+        key=f'{key}-{pk}'
+    if kind is not None:
+        key=f'{key}-{kind}'
+    return os.path.join(cache_root(file),key)
+
+
+#returns (arrays,meta) for a cached file or None on a miss, arrays are read-only memmaps
+def load_entry(file,names=None,kind=None):
+    if not os.path.exists(file):
+        return None
+    path=entry_path(file,kind=kind)
+    try:
+        with open(os.path.join(path,'meta.json'),'r') as f:
+            meta=json.load(f)
+    except (OSError,ValueError):
+        return None
+    if meta.get('version')!=cache_version:
+        return None
+
+    if names is None:
+        names=meta['arrays']
+    arrays={}
+    for n in names:
+        if n not in meta['arrays']:
+            return None
+        arrays[n]=np.load(os.path.join(path,n+'.npy'),mmap_mode='r')
+    return (arrays,meta)
+
+
+#store a dict of arrays for a data file, the whole entry appears at once or not at all
+def store_entry(file,arrays,meta=None,kind=None):
+    path=entry_path(file,kind=kind)
+    if os.path.exists(os.path.join(path,'meta.json')):
+        return path
+
+    meta=dict(meta or {})
+    meta['version']=cache_version
+    meta['source']=os.path.abspath(file)
+    meta['arrays']=list(arrays.keys())
+
+    tmp=f'{path}.{uuid.uuid4().hex}.tmp'
+    try:
+        os.makedirs(tmp)
+        for n, a in arrays.items():
+            np.save(os.path.join(tmp,n+'.npy'),np.ascontiguousarray(a))
+        with open(os.path.join(tmp,'meta.json'),'w') as f:
+            json.dump(meta,f)
+        os.rename(tmp,path)
+    except OSError as e:
+        #another process most likely finished the same entry first
+        shutil.rmtree(tmp,ignore_errors=True)
+        if not os.path.exists(os.path.join(path,'meta.json')):
+            print(f'Could not write structure cache for {file}: {e}')
+    return path
+
+
+#cached atoms dict (as returned by LammpsIO.read_data_file), box and flat bond arrays
+def load_structure(file):
+    ret=load_entry(file)
+    if ret is None:
+        return None
+    (arrays,meta)=ret
+    atoms={n:arrays[n] for n in ('id','type','q','pos','image')}
+    typemap={int(t):e for t, e in meta['typemap'].items()}
+    lookup=np.array([typemap.get(t,str(t)) for t in range(int(atoms['type'].max())+1)],dtype=object)
+    atoms['element']=lookup[atoms['type']]
+    atoms['masses']={int(t):m for t, m in meta['masses'].items()}
+
+    bonds=None
+    if 'bond_offsets' in arrays:
+        bonds=(arrays['bond_offsets'],arrays['bond_ids'],arrays['bond_order'])
+    return (atoms,np.array(arrays['box']),bonds)
+
+
+def store_structure(file,atoms,simbox,bonds=None):
+    arrays={n:atoms[n] for n in ('id','type','q','pos','image')}
+    arrays['box']=np.asarray(simbox,dtype=np.float64)
+    if bonds is not None:
+        arrays['bond_offsets']=bonds[0]
+        arrays['bond_ids']=bonds[1]
+        arrays['bond_order']=bonds[2]
+
+    typemap={}
+    types,first=np.unique(atoms['type'],return_index=True)
+    for t, i in zip(types,first):
+        typemap[str(int(t))]=str(atoms['element'][i])
+    meta={'typemap':typemap,'masses':{str(t):m for t, m in atoms.get('masses',{}).items()}}
+    return store_entry(file,arrays,meta)
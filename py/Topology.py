@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+import numpy as np
+
+#Compressed sparse row bond topology. Row i owns the slice offsets[i]:offsets[i+1]
+#of nbr (neighbor row indices) and bo (bond orders). Rows follow the order of the
+#atoms in the data file, rowof maps a lammps atom id to its row (-1 if missing).
+class BondTopology:
+
+    def __init__(self,ids,elements,offsets,nbr,bo):
+        self.ids=np.asarray(ids,dtype=np.int64)
+        self.elements=np.asarray(elements,dtype=object)
+        self.offsets=np.asarray(offsets,dtype=np.int64)
+        self.nbr=np.asarray(nbr,dtype=np.int64)
+        self.bo=np.asarray(bo,dtype=np.float32)
+
+        self.rowof=np.full(self.ids.max()+1 if len(self.ids)>0 else 1,-1,dtype=np.int64)
+        self.rowof[self.ids]=np.arange(len(self.ids))
+        #integer type code per row, typenames[code] is the element
+        (self.typenames,codes)=np.unique(self.elements.astype(str),return_inverse=True)
+        self.codes=codes.astype(np.int8)
+        self._masks={}
+        self._edgekeys=None
+        self._bridged=None
+
+    #treated as immutable, so DataFrame copies (which deep copy df.attrs) share one instance.
+    #A filtered copy carries the full topology along, topology_of checks it against the index.
+    def __deepcopy__(self,memo):
+        return self
+
+    def __copy__(self):
+        return self
+
+    #True when the rows are exactly these atom ids in this order
+    def matches(self,ids):
+        ids=np.asarray(ids)
+        return len(ids)==len(self.ids) and np.array_equal(ids,self.ids)
+
+    @property
+    def natoms(self):
+        return len(self.ids)
+
+    @property
+    def degree(self):
+        return np.diff(self.offsets)
+
+    #boolean mask over rows for one element name, cached
+    def is_type(self,el):
+        if el not in self._masks:
+            self._masks[el]=self.elements==el
+        return self._masks[el]
+
+    def rows(self,ids):
+        ids=np.asarray(ids,dtype=np.int64)
+        ret=np.full(ids.shape,-1,dtype=np.int64)
+        ok=(ids>=0)&(ids<len(self.rowof))
+        ret[ok]=self.rowof[ids[ok]]
+        return ret
+
+    def row(self,id):
+        if id<0 or id>=len(self.rowof):
+            return -1
+        return int(self.rowof[id])
+
+    #neighbor rows (and bond orders) of one row, optionally only one element/above a bond order
+    def neighbors(self,row,el=None,bo_cut=None,return_bo=False):
+        s=slice(self.offsets[row],self.offsets[row+1])
+        n=self.nbr[s]
+        b=self.bo[s]
+        keep=np.ones(len(n),dtype=bool)
+        if el is not None:
+            keep&=self.is_type(el)[n]
+        if bo_cut is not None:
+            keep&=b>=bo_cut
+        if return_bo:
+            return (n[keep],b[keep])
+        return n[keep]
+
+    def neighbor_ids(self,id,el=None,bo_cut=None):
+        r=self.row(id)
+        if r<0:
+            return np.zeros(0,dtype=np.int64)
+        return self.ids[self.neighbors(r,el,bo_cut)]
+
+    #every bond as (source row, neighbor row, bond order), each bond appears from both ends
+    def edges(self):
+        src=np.repeat(np.arange(self.natoms),self.degree)
+        return (src,self.nbr,self.bo)
+
+    def bond_order(self,ra,rb):
+        n,b=self.neighbors(ra,return_bo=True)
+        hit=np.nonzero(n==rb)[0]
+        if len(hit)==0:
+            return 0
+        return round(float(b[hit[0]]),3)
+
+    #sorted src*natoms+dst key of every directed bond, for vectorized "is bonded" tests
+    def edge_keys(self):
+        if self._edgekeys is None:
+            (src,dst,bo)=self.edges()
+            self._edgekeys=np.sort(src*self.natoms+dst)
+        return self._edgekeys
+
+    #bool per (ra[k],rb[k]) row pair, True when they are bonded
+    def bonded(self,ra,rb):
+        ra=np.asarray(ra,dtype=np.int64)
+        rb=np.asarray(rb,dtype=np.int64)
+        keys=self.edge_keys()
+        q=ra*self.natoms+rb
+        if len(keys)==0:
+            return np.zeros(q.shape,dtype=bool)
+        i=np.minimum(np.searchsorted(keys,q),len(keys)-1)
+        return (keys[i]==q)&(ra>=0)&(rb>=0)
+
+    #flat (offsets, neighbor ids, bond orders), the layout kept in StructCache
+    def flat(self):
+        return (self.offsets,self.ids[self.nbr],self.bo)
+
+    #old style per-atom [[id,bo],...] lists for the DataFrame bonds column
+    def to_bond_lists(self):
+        nids=self.ids[self.nbr].tolist()
+        bos=self.bo.astype(np.float64).round(3).tolist()
+        o=self.offsets.tolist()
+        return [[[nids[j],bos[j]] for j in range(o[i],o[i+1])] for i in range(self.natoms)]
+
+    @classmethod
+    def from_flat(cls,ids,elements,offsets,nbrids,bo):
+        ids=np.asarray(ids,dtype=np.int64)
+        rowof=np.full(max(ids.max(),np.max(nbrids,initial=0))+1,-1,dtype=np.int64)
+        rowof[ids]=np.arange(len(ids))
+        nbr=rowof[np.asarray(nbrids,dtype=np.int64)]
+        offsets=np.asarray(offsets,dtype=np.int64)
+
+        #drop bonds to atoms that are not in the structure
+        if np.any(nbr<0):
+            keep=nbr>=0
+            src=np.repeat(np.arange(len(ids)),np.diff(offsets))
+            offsets=np.concatenate([[0],np.cumsum(np.bincount(src[keep],minlength=len(ids)))])
+            nbr=nbr[keep]
+            bo=np.asarray(bo)[keep]
+        return cls(ids,elements,offsets,nbr,bo)
+
+    #build from a DataFrame with the old bonds column (index is atom id)
+    @classmethod
+    def from_df(cls,df):
+        counts=np.zeros(len(df)+1,dtype=np.int64)
+        nids=[]
+        bos=[]
+        for i, bl in enumerate(df['bonds'].tolist()):
+            if not isinstance(bl,list):
+                continue
+            counts[i+1]=len(bl)
+            for b in bl:
+                nids.append(b[0])
+                bos.append(b[1])
+        return cls.from_flat(df.index.to_numpy(),df['type'].to_numpy(),np.cumsum(counts),
+                             np.array(nids,dtype=np.int64),np.array(bos,dtype=np.float32))
+
+
+#Parse a fix reaxff/bonds output file in bulk. Each atom line is
+#   id type nb id_1...id_nb mol bo_1...bo_nb abo nlp q
+#returns (ids,types,offsets,nbrids,bo) with rows in file order.
+def read_bond_file(file):
+    with open(file,'r') as f:
+        text=' '.join(l for l in f.read().splitlines() if len(l.strip())>0 and l.lstrip()[0]!='#')
+    tok=np.array(text.split(),dtype=np.float64)
+
+    #record starts, every record is 2*nb+7 tokens long
+    starts=[]
+    s=0
+    ntok=len(tok)
+    while s<ntok:
+        starts.append(s)
+        s+=2*int(tok[s+2])+7
+    starts=np.array(starts,dtype=np.int64)
+
+    ids=tok[starts].astype(np.int64)
+    types=tok[starts+1].astype(np.int32)
+    nb=tok[starts+2].astype(np.int64)
+    offsets=np.concatenate([[0],np.cumsum(nb)])
+
+    #position of each bond inside its record
+    rec=np.repeat(starts,nb)
+    j=np.arange(offsets[-1])-np.repeat(offsets[:-1],nb)
+    nrep=np.repeat(nb,nb)
+    nbrids=tok[rec+3+j].astype(np.int64)
+    bo=tok[rec+4+nrep+j].astype(np.float32)
+
+    return (ids,types,offsets,nbrids,bo)
+
+
+#CSR topology with rows in the same order as ids (the data file order)
+def topology_from_bond_file(file,ids,elements):
+    (bids,btypes,boffsets,bnbr,bbo)=read_bond_file(file)
+    ids=np.asarray(ids,dtype=np.int64)
+
+    #reorder the bond file records onto the data file rows
+    rowof=np.full(max(ids.max(),bids.max())+1,-1,dtype=np.int64)
+    rowof[ids]=np.arange(len(ids))
+    rows=rowof[bids]
+    if np.any(rows<0):
+        print(f'{np.sum(rows<0)} atoms in {file} are not in the data file')
+
+    #move every bond onto its data file row, stable sort keeps the per-atom bond order
+    brow=np.repeat(rows,np.diff(boffsets))
+    bkeep=brow>=0
+    perm=np.argsort(brow[bkeep],kind='stable')
+    nbrids=bnbr[bkeep][perm]
+    bo=bbo[bkeep][perm]
+    offsets=np.concatenate([[0],np.cumsum(np.bincount(brow[bkeep],minlength=len(ids)))])
+
+    return BondTopology.from_flat(ids,elements,offsets,nbrids,bo)
+
+
+#CSR topology from a bond list (atom id pairs), bonds may be listed once or from both ends
+def topology_from_edges(ids,elements,ida,idb,bo):
+    ids=np.asarray(ids,dtype=np.int64)
+    ida=np.asarray(ida,dtype=np.int64)
+    idb=np.asarray(idb,dtype=np.int64)
+    bo=np.asarray(bo,dtype=np.float32)
+
+    rowof=np.full(max(ids.max(),np.max(ida,initial=0),np.max(idb,initial=0))+1,-1,dtype=np.int64)
+    rowof[ids]=np.arange(len(ids))
+    ra=rowof[ida]
+    rb=rowof[idb]
+    ok=(ra>=0)&(rb>=0)&(ra!=rb)
+
+    #both directions, then one entry per (row,neighbor) keeping the largest order
+    src=np.concatenate([ra[ok],rb[ok]])
+    dst=np.concatenate([rb[ok],ra[ok]])
+    b=np.concatenate([bo[ok],bo[ok]])
+    order=np.lexsort((-b,dst,src))
+    src=src[order]
+    dst=dst[order]
+    b=b[order]
+    first=np.ones(len(src),dtype=bool)
+    first[1:]=(src[1:]!=src[:-1])|(dst[1:]!=dst[:-1])
+    src=src[first]
+    dst=dst[first]
+    b=b[first]
+
+    offsets=np.concatenate([[0],np.cumsum(np.bincount(src,minlength=len(ids)))])
+    return BondTopology(ids,elements,offsets,dst,b)
+
+
+#topology of an atoms DataFrame with a bonds column, built once and kept in df.attrs
+#(read_file_data_bonds puts the perceived topology there already). The kept topology is
+#only used while its atom ids are the frame's index, a filtered or reordered copy gets its
+#own topology rebuilt from the bonds column. topo, when given, is checked and used instead.
+def topology_of(df,topo=None):
+    if topo is not None:
+        if not topo.matches(df.index):
+            raise ValueError(f'Topology of {topo.natoms} atoms does not match the {len(df)} atoms of the DataFrame')
+        return topo
+    topo=df.attrs.get('topology')
+    if topo is not None and topo.matches(df.index):
+        return topo
+    if 'bonds' not in df.columns:
+        raise ValueError('DataFrame has no bonds column and no topology matching its atoms')
+    topo=BondTopology.from_df(df)
+    df.attrs['topology']=topo
+    return topo
+
+
+#Batched queries, each takes arrays of atom ids and answers for all of them at once.
+#Missing atoms/answers are -1.
+
+#(owner index, edge index) of every bond of the given rows, owners in input order
+def expand_rows(topo,rows):
+    rows=np.asarray(rows,dtype=np.int64)
+    ok=rows>=0
+    deg=np.where(ok,topo.degree[np.where(ok,rows,0)],0)
+    owner=np.repeat(np.arange(len(rows)),deg)
+    start=np.repeat(topo.offsets[np.where(ok,rows,0)],deg)
+    within=np.arange(len(owner))-np.repeat(np.cumsum(deg)-deg,deg)
+    return (owner,start+within)
+
+
+#(owner index, neighbor id) of every el neighbor of the ids, e.g. the Si neighbors of these O
+def neighbors_of_type(topo,ids,el=None,bo_cut=None):
+    (owner,e)=expand_rows(topo,topo.rows(ids))
+    n=topo.nbr[e]
+    keep=np.ones(len(n),dtype=bool)
+    if el is not None:
+        keep&=topo.is_type(el)[n]
+    if bo_cut is not None:
+        keep&=topo.bo[e]>=bo_cut
+    return (owner[keep],topo.ids[n[keep]])
+
+
+#(owner index, atom id) of the second shell of the ids: el atoms bonded to a via-type
+#neighbor, the starting atom itself excluded. With bo_cut both bonds need at least that
+#order. Results come in walk order (owner, then bond order of the first and second hop).
+def second_shell(topo,ids,el=None,via=None,bo_cut=None):
+    rows=topo.rows(ids)
+    (o1,e1)=expand_rows(topo,rows)
+    n1=topo.nbr[e1]
+    k=np.ones(len(n1),dtype=bool)
+    if via is not None:
+        k&=topo.is_type(via)[n1]
+    if bo_cut is not None:
+        k&=topo.bo[e1]>=bo_cut
+    o1=o1[k]
+    n1=n1[k]
+    (o2,e2)=expand_rows(topo,n1)
+    owner=o1[o2]
+    n2=topo.nbr[e2]
+    keep=n2!=rows[owner]
+    if el is not None:
+        keep&=topo.is_type(el)[n2]
+    if bo_cut is not None:
+        keep&=topo.bo[e2]>=bo_cut
+    return (owner[keep],topo.ids[n2[keep]])
+
+
+#neighbor counts per element, shape (len(ids),len(els)), e.g. els=('Si','O','H')
+def type_counts(topo,ids,els=('Si','O','H')):
+    (owner,e)=expand_rows(topo,topo.rows(ids))
+    n=topo.nbr[e]
+    counts=np.zeros((len(np.atleast_1d(ids)),len(els)),dtype=np.int64)
+    for j, el in enumerate(els):
+        counts[:,j]=np.bincount(owner[topo.is_type(el)[n]],minlength=len(counts))
+    return counts
+
+
+#per pair the first el neighbor of a (in a's bond order) that is also bonded to b, the
+#"shared Si between mover and zapped O"
+def shared_neighbor(topo,ida,idb,el="Si"):
+    ida=np.atleast_1d(ida)
+    rb=topo.rows(idb)
+    (owner,e)=expand_rows(topo,topo.rows(ida))
+    n=topo.nbr[e]
+    hit=topo.is_type(el)[n]&topo.bonded(n,rb[owner])
+    ret=np.full(len(ida),-1,dtype=np.int64)
+    (first,idx)=np.unique(owner[hit],return_index=True)
+    ret[first]=topo.ids[n[hit][idx]]
+    return ret
+
+
+#bool per Si-Si bond pair (row a, row b): True when an O or H is bonded to both
+def bridged(topo,ra,rb):
+    if topo._bridged is None:
+        issi=topo.is_type('Si')
+        bridge=np.nonzero(topo.is_type('O')|topo.is_type('H'))[0]
+        (owner,e)=expand_rows(topo,bridge)
+        n=topo.nbr[e]
+        k=issi[n]
+        owner=owner[k]
+        n=n[k]
+        #every ordered pair of Si around the same bridge atom
+        (o2,e2)=expand_rows(topo,bridge[owner])
+        m=topo.nbr[e2]
+        k=issi[m]&(m!=n[o2])
+        topo._bridged=np.unique(n[o2][k]*topo.natoms+m[k])
+    keys=topo._bridged
+    q=np.asarray(ra,dtype=np.int64)*topo.natoms+np.asarray(rb,dtype=np.int64)
+    if len(keys)==0:
+        return np.zeros(q.shape,dtype=bool)
+    i=np.minimum(np.searchsorted(keys,q),len(keys)-1)
+    return keys[i]==q
+
+
+#(owner index, si id) of the Si neighbors of each Si id that no O/H bridges
+def unbridged_si_neighbors(topo,ids):
+    rows=topo.rows(ids)
+    (owner,e)=expand_rows(topo,rows)
+    t=topo.nbr[e]
+    keep=topo.is_type('Si')[t]&~bridged(topo,rows[owner],t)
+    return (owner[keep],topo.ids[t[keep]])
+
+
+#(owner index, si id, neighbor si id) for every Si bonded to the ids and each of its Si
+#neighbors that no O/H bridges, the bond centers an O can be moved into
+def bond_center_pairs(topo,ids):
+    (o1,si)=neighbors_of_type(topo,ids,'Si')
+    (o2,nsi)=unbridged_si_neighbors(topo,si)
+    return (o1[o2],si[o2],nsi)
+
+
+#initial, shared (mid) and final Si of each mover/zapped O pair: the last Si neighbor of
+#each O that is not the shared one, as the old find_initial_final_si picked them
+def initial_final_si(topo,movers,zapped):
+    movers=np.atleast_1d(movers)
+    zapped=np.atleast_1d(zapped)
+    mid=shared_neighbor(topo,movers,zapped,"Si")
+    ret=[]
+    for ids in (movers,zapped):
+        (owner,si)=neighbors_of_type(topo,ids,"Si")
+        #walk the matches backwards so unique picks the last one per owner
+        r=np.nonzero(si!=mid[owner])[0][::-1]
+        (u,first)=np.unique(owner[r],return_index=True)
+        out=np.full(len(ids),-1,dtype=np.int64)
+        out[u]=si[r[first]]
+        ret.append(out)
+    return (ret[0],mid,ret[1])
+
+
+#array versions of the NEBTools neighbor helpers, all take and return atom ids
+
+#the natom bonded to curatom that is also bonded to zappdatom
+def find_movers_neighbor(topo,curatom,zappdatom,natom="Si"):
+    ni=shared_neighbor(topo,[curatom],[zappdatom],natom)[0]
+    return None if ni<0 else int(ni)
+
+#bond order between curatom and the shared neighbor, 0 if there is none
+def find_suitable_neighbors(topo,curatom,zappdatom,natom="Si"):
+    ni=find_movers_neighbor(topo,curatom,zappdatom,natom)
+    if ni is None:
+        return 0
+    return topo.bond_order(topo.row(curatom),topo.row(ni))
+
+#start with an Oxygen and find all neighboring Si with BC vacancies
+#(Si-Si bonds not already bridged by an O or H)
+def find_neighboring_sibc(topo,oi):
+    (owner,si,nsi)=bond_center_pairs(topo,[oi])
+    return [[int(a),int(b)] for a, b in zip(si,nsi)]
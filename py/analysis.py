@@ -9,12 +9,15 @@ from scipy.signal import find_peaks
 from scipy.signal import lfilter
 from scipy.signal import savgol_filter
 import scipy.optimize as so
+from scipy.spatial import cKDTree
 
 from matplotlib.animation import FuncAnimation 
 from itertools import cycle
 from matplotlib.lines import Line2D
 import matplotlib.patches as mpatches
 
+import BinTraj as bt
+
 lines = ["-","-.","--","-",":"]
 colors = ["r","g","b","y","c"]
 
@@ -121,6 +124,32 @@ def coordinationTimeseries(folderList,coordList):
         
     return tsData
 
+#same output as coordinationTimeseries but read from the binary trajectory (BinTraj),
+#only the type and position columns are touched
+def coordinationTimeseriesBin(dumpList,coordList,cutoff=2,centerType=1,neighborType=2):
+    numCoordNumbers=len(coordList)
+    tsData=np.empty(len(dumpList),dtype=object)
+    for p, dumpfile in enumerate(dumpList):
+        traj=bt.open_trajectory(dumpfile)
+        numframes=len(traj)
+        vals=np.empty([numCoordNumbers,numframes])
+        t=np.arange(numframes)
+        for i in t:
+            box=traj.box(i)
+            L=box[:,1]-box[:,0]
+            pos=np.mod(np.asarray(traj.positions(i),dtype=np.float64)-box[:,0],L)
+            pos[pos>=L]=0
+            types=np.asarray(traj.types(i))
+
+            centers=pos[types==centerType]
+            tree=cKDTree(pos[types==neighborType],boxsize=L)
+            coord=tree.query_ball_point(centers,cutoff,return_length=True)
+            counts=np.bincount(coord,minlength=max(coordList)+1)
+            for n in np.arange(numCoordNumbers):
+                vals[n,i]=counts[coordList[n]]
+        tsData[p]=(t,vals)
+    return tsData
+
 def plotTimeSeries(data,coordList,reduction=0,timestepLabels=[],title=''):
     fig = plt.figure()
     linecycler = cycle(lines)